@@ -2,7 +2,7 @@
 //
 // SPDX-License-Identifier: BSD-2-Clause
 
-import { elemGenerator } from "https://javajawa.github.io/elems.js/elems.js";
+import { elem, elemGenerator } from "./elems.js";
 
 const p = elemGenerator("p");
 const li = elemGenerator("li");
@@ -10,6 +10,8 @@ const summary = elemGenerator("summary");
 const details = elemGenerator("details");
 const span = elemGenerator("code");
 
+let stream = null;
+
 function search() {
 	const term = document.getElementById("search")?.value || "";
 
@@ -21,19 +23,35 @@ function search() {
 	url.search = "?search=" + term;
 	window.history.replaceState({"search": term}, window.title, url)
 
-	fetch('predict', {method: 'POST', body: term})
-		.then(r => r.json())
-		.then(({input, output}) => details(
-			{"open": "open"},
-			summary(output.text),
-			p(input.text, " - ", input.tokens.map(token => [span(token), " "])),
-			p(output.tokens.map(token => [span(token), " "])),
-		))
-		.then(element => {
-			const list = document.getElementById("results");
-			list.firstElementChild?.removeAttribute("open");
-			list.insertBefore(element, list.firstElementChild || null);
-		});
+	// Only one prediction streams at a time; closing the old one stops it server side.
+	stream?.close();
+	stream = new EventSource("stream?prompt=" + encodeURIComponent(term));
+
+	const text = summary();
+	const input = p();
+	const output = p();
+	const element = details({"open": "open"}, text, input, output);
+
+	const list = document.getElementById("results");
+	list.firstElementChild?.removeAttribute("open");
+	list.insertBefore(element, list.firstElementChild || null);
+
+	stream.addEventListener("input", e => {
+		const data = JSON.parse(e.data);
+		input.append(elem("span", data.text, " - ", data.tokens.map(token => [span(token), " "])));
+	});
+	stream.addEventListener("token", e => {
+		const data = JSON.parse(e.data);
+		text.append(data.text);
+		output.append(span(data.token), " ");
+	});
+	stream.addEventListener("done", e => {
+		const data = JSON.parse(e.data);
+		text.replaceChildren(data.blocked ? "[blocked]" : data.text);
+		output.replaceChildren(elem("span", data.tokens.map(token => [span(token), " "])));
+		e.target.close();
+	});
+	stream.addEventListener("error", e => e.target.close());
 }
 
 const searchBox = document.getElementById("search");
@@ -0,0 +1,47 @@
+// SPDX-FileCopyrightText: 2022 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+//
+// SPDX-License-Identifier: BSD-2-Clause
+
+// A small local reimplementation of the `elem` and `elemGenerator` helpers from
+// https://javajawa.github.io/elems.js/elems.js; it is not a copy of that file,
+// and only covers what these pages use. Serving it alongside the pages means
+// they do not need a round-trip to a third party before rendering.
+
+function append(element, item) {
+	if (item === null || item === undefined) {
+		return;
+	}
+
+	if (Array.isArray(item)) {
+		item.forEach(child => append(element, child));
+		return;
+	}
+
+	if (item instanceof Node) {
+		element.appendChild(item);
+		return;
+	}
+
+	if (typeof item === "object") {
+		Object.entries(item).forEach(([key, value]) => {
+			if (typeof value === "function") {
+				element.addEventListener(key, value);
+			} else {
+				element.setAttribute(key, value);
+			}
+		});
+		return;
+	}
+
+	element.appendChild(document.createTextNode(item.toString()));
+}
+
+export function elem(tag, ...children) {
+	const element = document.createElement(tag);
+	children.forEach(child => append(element, child));
+	return element;
+}
+
+export function elemGenerator(tag) {
+	return (...children) => elem(tag, ...children);
+}
@@ -2,7 +2,7 @@
 //
 // SPDX-License-Identifier: BSD-2-Clause
 
-import { elemGenerator } from "https://javajawa.github.io/elems.js/elems.js";
+import { elemGenerator } from "./elems.js";
 
 const div = elemGenerator("div");
 const summary = elemGenerator("summary");
@@ -20,8 +20,13 @@ function search() {
 	url.search = "?search=" + term;
 	window.history.replaceState({"search": term}, window.title, url)
 
-	fetch('search', {method: 'POST', body: term})
-		.then(r => r.json())
+	// A search in double quotes looks for that exact phrase.
+	const phrase = term.match(/^"(.+)"$/);
+	const results = phrase
+		? fetch('phrase', {method: 'POST', body: phrase[1]}).then(r => r.json()).then(r => ({[phrase[1]]: r}))
+		: fetch('search', {method: 'POST', body: term}).then(r => r.json());
+
+	results
 		.then(r => Object.entries(r))
 		.then(r => r.map(([word, refs]) =>
 			details(
@@ -7,7 +7,18 @@
 
 from __future__ import annotations
 
-from .prosegen import ProseGen, Fact, GeneratedQuote
+from .index import PhraseIndex
+from .minhash import MinHashIndex
+from .prosegen import ProseGen, Fact, GeneratedQuote, Provenance
+from .shingles import ShingleSet
 
 
-__all__ = ["ProseGen", "Fact", "GeneratedQuote"]
+__all__ = [
+    "ProseGen",
+    "Fact",
+    "GeneratedQuote",
+    "MinHashIndex",
+    "PhraseIndex",
+    "Provenance",
+    "ShingleSet",
+]
@@ -6,6 +6,8 @@
 
 from __future__ import annotations
 
+from .hashing import stable_hash
+
 
 class Buffer:
     size: int
@@ -17,6 +19,13 @@ class Buffer:
         self.pos = 0
         self.data = [""] * size
 
+    def copy(self) -> Buffer:
+        clone = Buffer(self.size)
+        clone.pos = self.pos
+        clone.data = list(self.data)
+
+        return clone
+
     def push(self, item: str) -> None:
         self.data[self.pos] = item
         self.pos += 1
@@ -31,7 +40,7 @@ class Buffer:
         if items < 1:
             raise IndexError("Must hash at least one item")
 
-        return hash(tuple(self.subset(items)))
+        return stable_hash(self.subset(items))
 
     def to_str(self, items: int) -> str:
         return f"||{' '.join(self.subset(items))}||@{self.hash(items)}"
@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+
+# SPDX-FileCopyrightText: 2020 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Iterable
+
+import hashlib
+
+
+def stable_hash(items: Iterable[str]) -> int:
+    """
+    Hashes a sequence of tokens to a 64-bit integer.
+
+    Unlike hash(), this gives the same result in every process, so anything
+    keyed on it can be saved and loaded again.
+    """
+    data = "\0".join(items).encode("utf-8")
+
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+# SPDX-FileCopyrightText: 2020 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .prosegen import Fact
+
+
+class PhraseIndex:
+    """
+    Positional inverted index over facts.
+
+    For each token, this records which facts contain it and at which positions,
+    so that phrase lookups only ever look at the facts containing the rarest
+    token in the phrase.
+    """
+
+    token_ids: dict[str, int]
+    facts: list[Fact]
+    postings: list[dict[int, list[int]]]
+
+    def __init__(self) -> None:
+        self.token_ids = {}
+        self.facts = []
+        self.postings = []
+
+    def add(self, fact: Fact) -> int:
+        fact_id = len(self.facts)
+        self.facts.append(fact)
+
+        for position, token in enumerate(fact.tokens):
+            token_id = self.token_ids.setdefault(token, len(self.token_ids))
+
+            if token_id == len(self.postings):
+                self.postings.append({})
+
+            self.postings[token_id].setdefault(fact_id, []).append(position)
+
+        return fact_id
+
+    def find(self, tokens: list[str]) -> dict[int, list[int]]:
+        """
+        Finds the facts which contain the tokens as a contiguous phrase.
+
+        :return: The matching fact IDs, mapped to the positions at which
+                 the phrase starts in that fact.
+        """
+        token_ids = [self.token_ids.get(token) for token in tokens]
+
+        if not tokens or None in token_ids:
+            return {}
+
+        postings = [self.postings[token_id] for token_id in token_ids if token_id is not None]
+
+        # Check the rarest tokens first, to drop non-matching facts as early as possible.
+        offsets = sorted(range(len(postings)), key=lambda offset: len(postings[offset]))
+        rarest = offsets[0]
+        matches: dict[int, list[int]] = {}
+
+        for fact_id, positions in postings[rarest].items():
+            starts = {position - rarest for position in positions}
+
+            for offset in offsets[1:]:
+                if not starts:
+                    break
+
+                others = postings[offset].get(fact_id, [])
+                starts &= {position - offset for position in others}
+
+            if starts:
+                matches[fact_id] = sorted(starts)
+
+        return matches
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+# SPDX-FileCopyrightText: 2020 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import random
+
+from .hashing import stable_hash
+
+if TYPE_CHECKING:
+    from .prosegen import Fact
+
+
+# A Mersenne prime, for the permutations.
+PRIME = (1 << 61) - 1
+
+
+class MinHashIndex:  # pylint: disable=too-few-public-methods
+    """
+    Finds facts which are near-duplicates of each other.
+
+    Each fact is reduced to the set of pairs of consecutive words in it (ignoring
+    punctuation), and a MinHash signature of that set is split into bands. Facts
+    which share a band are candidates, which are then confirmed by comparing
+    the actual sets of word pairs.
+    """
+
+    bands: int
+    rows: int
+    threshold: float
+
+    _permutations: list[tuple[int, int]]
+    _buckets: dict[tuple[int, tuple[int, ...]], list[int]]
+    _facts: list[Fact]
+    _shingles: list[frozenset[int]]
+
+    def __init__(self, bands: int = 8, rows: int = 4, threshold: float = 0.8) -> None:
+        self.bands = bands
+        self.rows = rows
+        self.threshold = threshold
+
+        # Fixed seed, so that the same facts always give the same signatures.
+        generator = random.Random(bands * rows)
+        self._permutations = [
+            (generator.randrange(1, PRIME), generator.randrange(PRIME))
+            for _ in range(bands * rows)
+        ]
+
+        self._buckets = {}
+        self._facts = []
+        self._shingles = []
+
+    def merge(self, fact: Fact) -> Fact | None:
+        """
+        Adds the fact to the index, unless it is a near-duplicate of one already in it.
+
+        :return: The fact this one duplicates, or None if it was added.
+        """
+        shingles = _shingles(fact.tokens)
+
+        if not shingles:
+            return None
+
+        bands = self._bands(shingles)
+
+        for key in bands:
+            for fact_id in self._buckets.get(key, []):
+                other = self._shingles[fact_id]
+
+                if len(shingles & other) / len(shingles | other) >= self.threshold:
+                    return self._facts[fact_id]
+
+        fact_id = len(self._facts)
+        self._facts.append(fact)
+        self._shingles.append(shingles)
+
+        for key in bands:
+            self._buckets.setdefault(key, []).append(fact_id)
+
+        return None
+
+    def _bands(self, shingles: frozenset[int]) -> list[tuple[int, tuple[int, ...]]]:
+        signature = [
+            min((a * x + b) % PRIME for x in shingles) for a, b in self._permutations
+        ]
+
+        # Splits the signature into consecutive groups of `rows` values.
+        return list(enumerate(zip(*[iter(signature)] * self.rows)))
+
+
+def _shingles(tokens: list[str]) -> frozenset[int]:
+    words = [token for token in tokens if not token.startswith("[!")]
+
+    if len(words) < 2:
+        return frozenset(stable_hash([word]) for word in words)
+
+    return frozenset(stable_hash(pair) for pair in zip(words, words[1:]))
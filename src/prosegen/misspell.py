@@ -10,6 +10,8 @@
 
 from __future__ import annotations
 
+import hashlib
+
 
 def replace(value: str) -> str:
     return _MAP[value] if value in _MAP else value
@@ -4171,3 +4173,7 @@ _MAP = {
     "yuo": "you",
     "zeebra": "zebra",
 }
+
+
+# Changes whenever the map does, so that models built with an older map can be told apart.
+VERSION = hashlib.sha256(repr(sorted(_MAP.items())).encode("utf-8")).hexdigest()[:16]
@@ -8,16 +8,26 @@ from __future__ import annotations
 
 from collections import Counter
 from dataclasses import dataclass
+from typing import Iterator
 
-import itertools
+import copy
+import heapq
+import operator
 import random
 import re
 
 from prosegen import misspell
 
 from .buffer import Buffer
+from .index import PhraseIndex
+from .minhash import MinHashIndex
+from .shingles import ShingleSet
 
 
+# Bump this whenever the tokenisation of facts changes, so that saved models
+# built with the old tokens are not reused.
+TOKENIZER_VERSION = 1
+
 DOUBLE_QUOTE1 = re.compile(r'(?:^| )"(\S+)"(?: |$)')
 DOUBLE_QUOTE2 = re.compile(r'(?:^| )"([^"]+)"(?: |$)')
 SINGLE_QUOTE1 = re.compile(r"(?:^| )'(\S+)'(?: |$)")
@@ -87,9 +97,12 @@ class Fact:
     source: str
     original: str
     tokens: list[str]
+    # Every source this fact was seen in, including near-duplicates of it.
+    sources: list[str]
 
     def __init__(self, data: str, source: str) -> None:
         self.source = source
+        self.sources = [source]
         self.original = data
         self._tokenize()
 
@@ -132,16 +145,35 @@ class Fact:
         return hash((self.source, self.original))
 
 
-class ProseGen:
+@dataclass
+class Provenance:
+    """A span of generated tokens (start inclusive, end exclusive), and the facts containing it."""
+
+    start: int
+    end: int
+    facts: list[Fact]
+
+
+class ProseGen:  # pylint: disable=too-many-instance-attributes
     size: int
+    version: int
     dataset: dict[int, Counter[str]]
     dictionary: dict[str, set[Fact]]
+    index: PhraseIndex
+    shingles: ShingleSet
+    near_duplicates: MinHashIndex | None
+    duplicates: int
     cont_buffer: Buffer
 
-    def __init__(self, buffer_size: int):
+    def __init__(self, buffer_size: int, merge_duplicates: bool = True):
         self.size = buffer_size
+        self.version = 0
         self.dataset = {}
         self.dictionary = {"[!END]": set()}
+        self.index = PhraseIndex()
+        self.shingles = ShingleSet()
+        self.near_duplicates = MinHashIndex() if merge_duplicates else None
+        self.duplicates = 0
         self.cont_buffer = Buffer(self.size)
 
     def add_knowledge(self, data: str, source: str = "", debug: bool = False) -> None:
@@ -150,9 +182,20 @@ class ProseGen:
         if not fact.tokens:
             return
 
+        # The same quote often turns up in more than one source, with slightly
+        # different punctuation. It is only learnt once, so that it does not get
+        # extra weight in generation, but we keep track of all its sources.
+        if self.near_duplicates and (original := self.near_duplicates.merge(fact)):
+            original.sources.append(source)
+            self.duplicates += 1
+            return
+
         for token in fact.tokens:
             self.dictionary.setdefault(token, set()).add(fact)
 
+        self.index.add(fact)
+        self.shingles.add(fact.tokens)
+
         if debug:
             print(fact.tokens)
 
@@ -163,6 +206,10 @@ class ProseGen:
         self.add_words(buff, fact.tokens, debug)
         self.add_word(buff, "[!END]", debug)
 
+        # Anything derived from the model (such as cached responses) can use
+        # this to tell that it is out of date.
+        self.version += 1
+
     def add_words(self, buff: Buffer, words: list[str], debug: bool) -> None:
         for word in words:
             if word == "":
@@ -203,74 +250,206 @@ class ProseGen:
     def make_statement(self, min_len: int = 0) -> str:
         return GeneratedQuote(self, min_len).make_statement()
 
-    def get_token(self, buffer: Buffer, stack: list[str], can_end: bool) -> str:
-        options: Counter[str] = Counter()
+    def find_phrase(self, phrase: str) -> list[tuple[Fact, list[int]]]:
+        """Finds the facts containing the phrase, with the token positions it starts at."""
+        matches = self.index.find(Fact(phrase, "").tokens)
 
-        for size in range(1, buffer.size):
-            item = buffer.hash(size)
-            if item in self.dataset:
-                options += self.dataset[item]
+        return [
+            (self.index.facts[fact_id], positions) for fact_id, positions in matches.items()
+        ]
+
+    def provenance(self, tokens: list[str], orders: list[int]) -> list[Provenance]:
+        """
+        Splits generated tokens into spans which each appear verbatim in some facts.
+
+        A span is only extended while the context that picked the next token
+        reaches back to the start of the span; the phrase index then confirms
+        that the whole span is in a single fact (as contexts can cross facts).
+        """
+        spans: list[Provenance] = []
+        start = 0
+
+        while start < len(tokens):
+            end = start + 1
+            matches = self.index.find(tokens[start:end])
+
+            while end < len(tokens) and orders[end] >= min(end - start, self.size - 1):
+                longer = self.index.find(tokens[start:end] + [tokens[end]])
+
+                if not longer:
+                    break
+
+                matches = longer
+                end += 1
+
+            if matches:
+                spans.append(Provenance(start, end, [self.index.facts[x] for x in matches]))
+
+            start = end
+
+        return spans
+
+    def get_token(self, buffer: Buffer, stack: list[str], can_end: bool) -> str:
+        options = self.merged_options(buffer)
 
         if not can_end:
-            del options["[!END]"]
+            options.pop("[!END]", None)
 
         for in_block in stack:
-            del options[in_block]
+            options.pop(in_block, None)
 
         if not options:
             return "[!END_NO_OPTIONS]"
 
-        i = random.randrange(sum(options.values()))
-        return next(itertools.islice(options.elements(), i, None))
+        return random.choices(list(options), weights=list(options.values()))[0]
+
+    def merged_options(self, buffer: Buffer) -> dict[str, int]:
+        """
+        Sums the continuations seen after every length of context at the end of the buffer.
+
+        Until the buffer fills up, longer lengths give the same context as shorter
+        ones, and each of those lengths counts it again. Rather than adding the same
+        Counter many times over, each distinct context is added once, scaled by the
+        number of lengths that produced it.
+        """
+        contexts: dict[int, int] = {}
+
+        for size in range(1, buffer.size):
+            item = buffer.hash(size)
+            if item in self.dataset:
+                contexts[item] = contexts.get(item, 0) + 1
+
+        merged: dict[str, int] = {}
 
+        for item, repeats in contexts.items():
+            get = merged.get
+            for token, count in self.dataset[item].items():
+                merged[token] = get(token, 0) + count * repeats
 
-class GeneratedQuote:
+        return merged
+
+    def next_distribution(
+        self, tokens: list[str], k: int = 10, min_length: int = 0
+    ) -> list[tuple[str, float]]:
+        """The k most likely tokens to follow the given ones, with their probabilities."""
+        generator = GeneratedQuote(self, min_length)
+
+        for token in tokens:
+            generator.append_token(token)
+
+        options = generator.options()
+        total = sum(options.values())
+
+        if not total:
+            return []
+
+        return [
+            (token, weight / total)
+            for token, weight in heapq.nlargest(
+                k, options.items(), key=operator.itemgetter(1)
+            )
+        ]
+
+
+class GeneratedQuote:  # pylint: disable=too-many-instance-attributes
     prose: ProseGen
     buffer: Buffer
 
     output: str = ""
+    tokens: list[str]
+
+    # For each token, how many tokens of context it was picked with (zero for
+    # tokens which were not sampled), if record_provenance is set.
+    record_provenance: bool
+    orders: list[int]
+    _sampled_order: int = 0
 
     min_length: int
-    block_stack: list[str] = []
+    block_stack: list[str]
 
     next_token_in_title_case: bool = True
     space_before_next_token: bool = False
 
-    def __init__(self, prose: ProseGen, min_length: int) -> None:
+    def __init__(
+        self, prose: ProseGen, min_length: int, record_provenance: bool = False
+    ) -> None:
         self.prose = prose
         self.buffer = Buffer(prose.size)
         self.min_length = min_length
+        self.tokens = []
+        self.record_provenance = record_provenance
+        self.orders = []
+        self.block_stack = []
+
+    def fork(self) -> GeneratedQuote:
+        """Creates an independent copy of this quote, to continue in a different way."""
+        clone = copy.copy(self)
+        clone.buffer = self.buffer.copy()
+        clone.tokens = list(self.tokens)
+        clone.orders = list(self.orders)
+        clone.block_stack = list(self.block_stack)
+
+        return clone
 
     def make_statement(self) -> str:
+        for _ in self.generate():
+            pass
+
+        return self.output.strip()
+
+    def generate(self) -> Iterator[str]:
+        """Samples and appends tokens until the quote ends, yielding each one as it goes."""
         while True:
             token = self.get_potential_token()
 
             if token is None or token == "[!END]":
-                return self.output.strip()
+                return
+
+            if self.record_provenance:
+                self._sampled_order = self._context_order(token)
 
             self.append_token(token)
+            self._sampled_order = 0
+
+            yield token
+
+    def provenance(self) -> list[Provenance]:
+        if not self.record_provenance:
+            raise ValueError("Provenance was not recorded for this quote")
+
+        return self.prose.provenance(self.tokens, self.orders)
 
     def get_potential_token(self) -> str | None:
-        options: Counter[str] = Counter()
+        options = self.options()
+
+        if not options:
+            return None
+
+        return random.choices(list(options), weights=list(options.values()))[0]
+
+    def _context_order(self, token: str) -> int:
+        """The length of the longest context at the end of the buffer seen followed by token."""
+        order = 0
 
         for size in range(1, self.buffer.size):
-            item = self.buffer.hash(size)
-            if item in self.prose.dataset:
-                options += self.prose.dataset[item]
+            if token in self.prose.dataset.get(self.buffer.hash(size), ()):
+                order = len(self.buffer.subset(size))
+
+        return order
+
+    def options(self) -> dict[str, int]:
+        """The weighted options for the next token, with the block and ending rules applied."""
+        options = self.prose.merged_options(self.buffer)
 
         if not self._can_end:
-            del options["[!END]"]
+            options.pop("[!END]", None)
 
         for in_block in self.block_stack:
-            del options[in_block]
+            options.pop(in_block, None)
             if PUNCTUATION[in_block].block_close in options:
                 options[PUNCTUATION[in_block].block_close or ""] *= 4
 
-        if not options:
-            return None
-
-        i = random.randrange(sum(options.values()))
-        return next(itertools.islice(options.elements(), i, None))
+        return options
 
     def append_token(self, token: str) -> None:
         self.buffer.push(token)
@@ -278,8 +457,15 @@ class GeneratedQuote:
         if token in PUNCTUATION:
             self._process_punctuation_token(token)
         else:
+            self._record_token(token, self._sampled_order)
             self._append_token(token)
 
+    def _record_token(self, token: str, order: int) -> None:
+        self.tokens.append(token)
+
+        if self.record_provenance:
+            self.orders.append(order)
+
     def _append_token(self, token: str) -> None:
         if self.next_token_in_title_case:
             token = token[0].title() + token[1:] if len(token) > 1 else token.upper()
@@ -309,6 +495,7 @@ class GeneratedQuote:
                 self.next_token_in_title_case = was_title
                 return
 
+        self._record_token(token, 0 if in_block_change else self._sampled_order)
         self._append_token(punctuation.text)
 
         self.space_before_next_token = punctuation.space_after
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+
+# SPDX-FileCopyrightText: 2020 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from .hashing import stable_hash
+
+
+class ShingleSet:
+    """
+    Hashes of every run of `size` consecutive tokens in the known facts.
+
+    Used to check how much of a generated quote has been copied word for word.
+    """
+
+    size: int
+    hashes: set[int]
+
+    def __init__(self, size: int = 4) -> None:
+        self.size = size
+        self.hashes = set()
+
+    def add(self, tokens: list[str]) -> None:
+        self.hashes.update(self._shingles(tokens))
+
+    def overlap(self, tokens: list[str]) -> float:
+        """The fraction of the shingles in the tokens which also appear in a known fact."""
+        shingles = self._shingles(tokens)
+
+        return sum(1 for shingle in shingles if shingle in self.hashes) / len(shingles)
+
+    def _shingles(self, tokens: list[str]) -> list[int]:
+        # Anything shorter than a shingle is treated as one (short) shingle.
+        if len(tokens) <= self.size:
+            return [stable_hash(tokens)]
+
+        return [
+            stable_hash(tokens[start:end])
+            for start, end in enumerate(range(self.size, len(tokens) + 1))
+        ]
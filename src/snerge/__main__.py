@@ -8,11 +8,19 @@ from __future__ import annotations
 from typing import Awaitable, Callable
 
 import asyncio
+import functools
 
 from aiohttp import web
 
 import prosegen
-from snerge import bot, config as conf, log, quotes, server, token, AsyncRunner
+from snerge import bot, config as conf, log, server, token, AsyncRunner
+from snerge.blocklist import Blocklist
+from snerge.lrr import LrrScraper
+from snerge.model import ModelRef
+from snerge.refresh import CorpusRefresher
+from snerge.snapshot import ModelSnapshots
+from snerge.startup import Startup
+from snerge.twitch import TwitchClient
 
 
 def main() -> None:
@@ -26,51 +34,147 @@ def main() -> None:
     # Load our configuration
     logger = log.get_logger()
     config = conf.config()
-    data = prosegen.ProseGen(20)
+    client = TwitchClient.from_config(config)
 
-    # Get, and refresh, the app token
-    app = token.refresh_app_token()
-
-    # Create the IRC bot
-    irc_bot = bot.Bot(
-        logger=log.get_logger("bot"),
-        loop=runner.loop,
-        app=app,
-        config=config,
-        quotes=data,
-    )
+    # Everything starts once the loop is running, each part as soon as what
+    # it depends on is ready.
+    startup = build_startup(runner, config, client)
 
-    # Queue loading in the quotes database.
-    runner.create_onetime_task("quote-loader", quotes.load_data(logger, data))
+    runner.run_forever()
 
-    # Create the event subscription handle, and initialise of it.
-    event_subscription_handler = server.EventHandler(log.get_logger("webhook"), app, irc_bot)
-    register = runner.create_onetime_task(
-        "register-webhooks", event_subscription_handler.register(config.channel)
-    )
+    logger.warning("Commencing shutdown")
 
-    # Create the HTTP daemon and attack the handlers.
-    site_setup = runner.create_onetime_task(
-        "setup-httpd", create_httpd(app, data, event_subscription_handler.handle_webhook)
-    )
+    if irc_bot := startup.result("irc-bot"):
+        irc_bot.request_stop()
+    if irc := startup.result("irc"):
+        runner.gather(irc)
+    if httpd := startup.result("httpd"):
+        runner.gather(httpd.server.shutdown())
 
-    # Run the setup tasks until they are complete.
-    runner.gather(register, site_setup)
+    # These run until they are stopped.
+    for name in ("quote-refresher", "eventsub-socket"):
+        if task := startup.result(name):
+            task.cancel()
+            runner.gather(asyncio.gather(task, return_exceptions=True))
 
-    # Run the bot
-    _irc = runner.create_main_task("twitch-irc-bot", irc_bot.queue_quote())
+    if events := startup.result("webhook-handler"):
+        runner.gather(events.stop())
 
-    runner.run_forever()
+    runner.gather(client.close())
 
-    logger.warning("Commencing shutdown")
-    irc_bot.request_stop()
-    runner.gather(_irc, site_setup.result().server.shutdown())
 
+def build_startup(runner: AsyncRunner, config: conf.Config, client: TwitchClient) -> Startup:
+    """Creates everything the bot is made of, as stages of its startup."""
+    logger = log.get_logger()
+    data = ModelRef(prosegen.ProseGen(20))
+    blocklist = Blocklist(log.get_logger("blocklist"), config.blocklist)
+    scraper = LrrScraper.from_config(log.get_logger("lrr"), config)
+    snapshots = ModelSnapshots(log.get_logger("snapshot"), config.model_cache)
+    refresher = CorpusRefresher(
+        log.get_logger("refresh"),
+        data,
+        scraper,
+        interval=config.refresh_interval,
+        snapshots=snapshots,
+        downloads=config.model_cache,
+    )
+
+    startup = Startup(log.get_logger("startup"), runner)
 
-async def create_httpd(
+    # Build the model, which needs nothing else, while everything else starts.
+    # Generating anything waits on the model being published.
+    startup.stage("model", refresher.rebuild)
+    startup.stage(
+        "ready", lambda _: logger.info("Time to ready: %.2fs", startup.elapsed), "model"
+    )
+    startup.stage(
+        "quote-refresher",
+        lambda _: runner.create_onetime_task("quote-refresher", refresher.refresh_forever()),
+        "model",
+    )
+
+    # Get, and refresh, the app token
+    startup.stage("app-token", lambda: token.refresh_app_token(client))
+
+    # Create the IRC bot, and start it sending quotes.
+    startup.stage(
+        "irc-bot",
+        lambda app: bot.Bot(
+            logger=log.get_logger("bot"),
+            loop=runner.loop,
+            app=app,
+            config=config,
+            quotes=data,
+            blocklist=blocklist,
+        ),
+        "app-token",
+    )
+    startup.stage(
+        "irc",
+        lambda irc_bot: runner.create_main_task("twitch-irc-bot", irc_bot.queue_quote()),
+        "irc-bot",
+    )
+
+    # Create the event subscription handle, and the HTTP daemon with the handlers
+    # attached. The webhooks can only be registered once the daemon can answer
+    # the verification request; a WebSocket registers each session it opens.
+    startup.stage(
+        "webhook-handler",
+        lambda app, irc_bot: server.EventHandler(
+            log.get_logger("webhook"), app, irc_bot, client
+        ),
+        "app-token",
+        "irc-bot",
+    )
+    startup.stage("webhook-workers", lambda events: events.start(), "webhook-handler")
+    startup.stage(
+        "httpd",
+        lambda app, events: create_httpd(
+            app,
+            client,
+            data,
+            blocklist=blocklist,
+            event_handler=events.handle_webhook,
+            control=server.ControlHandler(log.get_logger("control"), app, data, refresher),
+        ),
+        "app-token",
+        "webhook-handler",
+    )
+
+    if config.eventsub_transport == "websocket":
+        startup.stage(
+            "eventsub-socket",
+            lambda events: runner.create_onetime_task(
+                "eventsub-socket",
+                server.EventSubSocket(
+                    log.get_logger("eventsub"),
+                    events,
+                    client,
+                    config.channel,
+                    config.eventsub_ws_url,
+                ).run(),
+            ),
+            "webhook-handler",
+        )
+    else:
+        startup.stage(
+            "register-webhooks",
+            lambda events, _: events.register(config.channel),
+            "webhook-handler",
+            "httpd",
+        )
+
+    return startup
+
+
+async def create_httpd(  # pylint: disable=too-many-arguments
     app: token.App,
-    data: prosegen.ProseGen,
+    client: TwitchClient,
+    data: ModelRef,
+    *,
+    blocklist: Blocklist,
     event_handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    control: server.ControlHandler,
 ) -> web.AppRunner:
     # Create the web UI controller
     servlet = web.Application()
@@ -78,18 +182,27 @@ async def create_httpd(
     # Add the handlers to the website
     servlet.router.add_route("POST", "/webhook", event_handler)
 
+    # Anything using the model is unavailable until it has been built.
+    ready = functools.partial(server.when_ready, data)
+
     whence = server.WhenceHandler(data)
     servlet.router.add_route("GET", "/whence/", whence.handle_static)
     servlet.router.add_route("GET", "/whence/{path:.+}", whence.handle_static)
-    servlet.router.add_route("POST", "/whence/search", whence.handle_search)
+    servlet.router.add_route("POST", "/whence/search", ready(whence.handle_search))
+    servlet.router.add_route("POST", "/whence/phrase", ready(whence.handle_phrase))
 
-    predict = server.PredictHandler(data)
+    predict = server.PredictHandler(data, blocklist)
     servlet.router.add_route("GET", "/predict/", predict.handle_static)
     servlet.router.add_route("GET", "/predict/{path:.+}", predict.handle_static)
-    servlet.router.add_route("GET", "/predict/dictionary", predict.get_dictionary)
-    servlet.router.add_route("POST", "/predict/predict", predict.make_prediction)
+    servlet.router.add_route("GET", "/predict/dictionary", ready(predict.get_dictionary))
+    servlet.router.add_route("POST", "/predict/predict", ready(predict.make_prediction))
+    servlet.router.add_route("GET", "/predict/stream", ready(predict.stream_prediction))
+    servlet.router.add_route("POST", "/predict/next", ready(predict.next_tokens))
+
+    servlet.router.add_route("GET", "/control/version", control.get_version)
+    servlet.router.add_route("POST", "/control/rebuild", control.rebuild)
 
-    handler1 = server.OAuthHandler(log.get_logger("oauth"), app)
+    handler1 = server.OAuthHandler(log.get_logger("oauth"), app, client)
     servlet.router.add_route("GET", "/", handler1.handle)
 
     # Create the website container
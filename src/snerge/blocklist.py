@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from collections import Counter, deque
+from typing import Dict, List
+
+import os
+import re
+import time
+
+from snerge import log
+
+
+SPACE = re.compile(r"\s+")
+
+# How often (in seconds) to check whether the blocklist file has changed.
+RELOAD_INTERVAL = 5.0
+
+
+class Blocklist:  # pylint: disable=too-many-instance-attributes
+    """
+    Words and phrases which must never appear in anything the bot says.
+
+    The patterns are compiled into an Aho-Corasick automaton, so checking a
+    quote takes time linear in its length however many patterns there are.
+    The file is reloaded whenever it changes.
+    """
+
+    logger: log.Logger
+    path: str
+    patterns: List[str]
+    hits: Counter[str]
+
+    _goto: List[Dict[str, int]]
+    _fail: List[int]
+    _output: List[List[int]]
+    _mtime: float = 0.0
+    _checked: float = 0.0
+
+    def __init__(self, logger: log.Logger, path: str) -> None:
+        self.logger = logger
+        self.path = path
+        self.hits = Counter()
+        self.load()
+
+    def load(self) -> None:
+        patterns: List[str] = []
+
+        if os.path.exists(self.path):
+            self._mtime = os.stat(self.path).st_mtime
+
+            with open(self.path, "rt", encoding="utf-8") as handle:
+                for line in handle:
+                    line = normalise(line)
+
+                    if line and not line.startswith("#"):
+                        patterns.append(line)
+
+        self.patterns = patterns
+        self._compile()
+
+        self.logger.info("Loaded %d patterns into the blocklist", len(patterns))
+
+    def reload_if_changed(self) -> None:
+        now = time.monotonic()
+
+        if now - self._checked < RELOAD_INTERVAL:
+            return
+
+        self._checked = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = 0.0
+
+        if mtime != self._mtime:
+            self.load()
+
+    def is_blocked(self, text: str) -> bool:
+        self.reload_if_changed()
+
+        matches = self.matches(text)
+
+        for pattern in matches:
+            self.hits[pattern] += 1
+            self.logger.info("Blocked quote containing %r: %s", pattern, text)
+
+        return bool(matches)
+
+    def matches(self, text: str) -> List[str]:
+        text = normalise(text)
+        state = 0
+        found: List[str] = []
+
+        for end, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+
+            state = self._goto[state].get(char, 0)
+
+            for pattern_id in self._output[state]:
+                pattern = self.patterns[pattern_id]
+                start = end - len(pattern) + 1
+
+                # Only match whole words, so that blocking a word does not
+                # also block every longer word that happens to contain it.
+                if _is_boundary(text, start - 1) and _is_boundary(text, end + 1):
+                    found.append(pattern)
+
+        return found
+
+    def _compile(self) -> None:
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+
+                state = self._goto[state][char]
+
+            self._output[state].append(pattern_id)
+
+        # Breadth first, so that the fail link of a state's parent is always known.
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+
+                if state:
+                    self._fail[child] = self._goto[fallback].get(char, 0)
+
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+
+def normalise(text: str) -> str:
+    return SPACE.sub(" ", text.lower()).strip()
+
+
+def _is_boundary(text: str, position: int) -> bool:
+    return position < 0 or position >= len(text) or not text[position].isalnum()
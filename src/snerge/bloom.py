@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Callable, List
+
+import hashlib
+import math
+import time
+
+
+class RotatingBloomFilter:
+    """
+    Remembers (approximately) which items were added in the last `window` seconds.
+
+    The window is split into a number of generations, each with its own Bloom
+    filter. Items are added to the current generation, and looked up in all of
+    them; when a generation's time is up, the oldest filter is cleared and
+    reused. Items are therefore remembered for between (generations - 1) and
+    generations slices of the window, and memory use never grows.
+    """
+
+    window: float
+    size: int
+    hashes: int
+
+    _filters: List[bytearray]
+    _current: int
+    _started: float
+    _clock: Callable[[], float]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        capacity: int,
+        error_rate: float,
+        window: float,
+        generations: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window = window
+
+        # An item is checked against every generation, so each one needs a
+        # proportionally lower error rate to keep the overall rate.
+        rate = error_rate / generations
+        self.size = max(8, math.ceil(-capacity * math.log(rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+
+        self._filters = [bytearray((self.size + 7) // 8) for _ in range(generations)]
+        self._current = 0
+        self._clock = clock
+        self._started = clock()
+
+    def add(self, item: str) -> None:
+        self._rotate()
+
+        current = self._filters[self._current]
+
+        for bit in self._bits(item):
+            current[bit >> 3] |= 1 << (bit & 7)
+
+    def __contains__(self, item: str) -> bool:
+        self._rotate()
+
+        bits = self._bits(item)
+
+        return any(
+            all(bloom[bit >> 3] & (1 << (bit & 7)) for bit in bits) for bloom in self._filters
+        )
+
+    def _bits(self, item: str) -> List[int]:
+        # Double hashing: k hash functions from the two halves of one digest.
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def _rotate(self) -> None:
+        generation = self.window / len(self._filters)
+        now = self._clock()
+
+        if now - self._started >= self.window:
+            for bloom in self._filters:
+                bloom[:] = bytes(len(bloom))
+
+            self._started = now
+            return
+
+        while now - self._started >= generation:
+            self._current = (self._current + 1) % len(self._filters)
+            self._filters[self._current][:] = bytes(len(self._filters[self._current]))
+            self._started += generation
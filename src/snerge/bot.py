@@ -5,6 +5,7 @@
 
 from __future__ import annotations
 
+from time import monotonic
 from typing import Awaitable, Callable
 
 import asyncio
@@ -15,34 +16,59 @@ from twitchio import Client, Channel, Chatter, Message, User  # type: ignore
 import twitchio.client  # type: ignore
 
 from snerge import log
+from snerge.blocklist import Blocklist
+from snerge.bloom import RotatingBloomFilter
 from snerge.config import Config
 from snerge.token import App
 from snerge.guessmessagehandler import GuessMessageHandler
+from snerge.model import ModelRef
+from snerge.outbox import Outbox, Priority
 from prosegen import ProseGen, Fact, GeneratedQuote
 
 
-class Bot(Client):  # type: ignore
+# What the bot says if it cannot come up with anything better.
+FALLBACK_QUOTE = "I don't like coffee."
+# The most quotes expected to be sent in the window for avoiding repeats.
+RECENT_QUOTE_CAPACITY = 1000
+# How long (in seconds) to wait for queued messages to be sent when closing.
+CLOSE_TIMEOUT = 5.0
+
+
+class Bot(Client):  # type: ignore # pylint: disable=too-many-instance-attributes
     config: Config
-    quotes: ProseGen
+    quotes: ModelRef
+    blocklist: Blocklist
+    recent_quotes: RotatingBloomFilter
     guess_handler: GuessMessageHandler
-    commands: dict[str, Callable[[Channel, str], Awaitable[None]]]
+    commands: dict[str, Callable[[Outbox, str], Awaitable[None]]]
+    outboxes: dict[str, Outbox]
 
     last_message: int = 0
+    last_quote: GeneratedQuote | None = None
+    quotes_sent: int = 0
     _stop: bool = False
 
     def __init__(  # pylint: disable=too-many-arguments
         self,
+        *,
         logger: log.Logger,
         loop: asyncio.AbstractEventLoop,
         config: Config,
         app: App,
-        quotes: ProseGen,
+        quotes: ModelRef,
+        blocklist: Blocklist,
     ) -> None:
         super().__init__(token=app.irc_token, loop=loop)
 
         self.logger = logger
         self.config = config
         self.quotes = quotes
+        self.blocklist = blocklist
+        self.recent_quotes = RotatingBloomFilter(
+            RECENT_QUOTE_CAPACITY,
+            self.config.recent_quote_error_rate,
+            self.config.recent_quote_window,
+        )
         self.guess_handler = GuessMessageHandler(
             self.config.use_latest_reply,
             self.config.stopguess_delay,
@@ -59,8 +85,11 @@ class Bot(Client):  # type: ignore
             "!snuwuge": lambda _, prompt: self.send_quote(prompt, force_owo=True),
             "!subscribe": self.subscribe,
             "!unsubscribe": self.subscribe,
+            "!whence": self.explain_quote,
         }
 
+        self.outboxes = {}
+
         twitchio.client.logger = logger.getChild("client")
 
     async def _start(self) -> None:
@@ -91,7 +120,7 @@ class Bot(Client):  # type: ignore
             return
 
         self.logger.info("Connected to channel %s", self.config.channel)
-        await channel.send("Never fear, Snerge is here!")
+        self.outbox(channel).send("Never fear, Snerge is here!")
 
     async def event_message(self, message: Message) -> None:
         # Ignore loop-back messages
@@ -109,8 +138,10 @@ class Bot(Client):  # type: ignore
         if not isinstance(chatter, Chatter):
             return
 
+        outbox = self.outbox(message.channel)
+
         # Run the guess handler,
-        await self.guess_handler.message_process(message, chatter)
+        await self.guess_handler.message_process(message, chatter, outbox)
 
         # Commands can only be processed by mods, when we can reply.
         if not (chatter.is_mod or chatter.is_broadcaster):
@@ -123,9 +154,18 @@ class Bot(Client):  # type: ignore
             return
 
         self.logger.info("Command %s from %s", command, chatter.display_name)
-        await call(message.channel, content)
+        await call(outbox, content)
+
+    def outbox(self, channel: Channel) -> Outbox:
+        """The queue of messages to send to a channel, which is started on first use."""
+        if not (outbox := self.outboxes.get(channel.name)):
+            outbox = Outbox.from_config(self.logger.getChild("outbox"), channel, self.config)
+            outbox.start()
+            self.outboxes[channel.name] = outbox
+
+        return outbox
 
-    async def subscribe(self, chatter: Chatter, topic: str) -> None:
+    async def subscribe(self, outbox: Outbox, topic: str) -> None:
         if topic not in [
             "snerge",
             "snerge facts",
@@ -135,21 +175,18 @@ class Bot(Client):  # type: ignore
         ]:
             return
 
-        if os.path.exists(os.path.join("subscribed", chatter.name)):
-            await chatter.send("You are already subscribed to SnergeFacts.")
-            return
+        name = outbox.channel.name
 
-        if not (target := self.get_channel(self.config.channel)):
+        if os.path.exists(os.path.join("subscribed", name)):
+            outbox.send("You are already subscribed to SnergeFacts.")
             return
 
-        with open(os.path.join("subscribed", chatter.name), "w", encoding="utf-8"):
+        with open(os.path.join("subscribed", name), "w", encoding="utf-8"):
             pass
 
-        await target.send(
-            (
-                f"Thank you {chatter.name} for subscribing to SnergeFacts! "
-                "Here's a special SnergeFact for you!"
-            )
+        outbox.send(
+            f"Thank you {name} for subscribing to SnergeFacts! "
+            "Here's a special SnergeFact for you!"
         )
         await self.send_quote()
 
@@ -162,6 +199,11 @@ class Bot(Client):  # type: ignore
                 next_call = random.randint(*self.config.startup_probe)
                 self.logger.info("No target initialised, waiting %d seconds", next_call)
 
+            # If the model has not been built yet, there is nothing to say.
+            elif not self.quotes.ready.is_set():
+                next_call = random.randint(*self.config.startup_probe)
+                self.logger.info("Model not ready, waiting %d seconds", next_call)
+
             # If we haven't heard from chat in a while, assume the stream is down
             elif self.loop.time() - self.last_message > self.config.chat_active_probe[0]:
                 next_call = random.randint(*self.config.chat_active_probe)
@@ -195,47 +237,109 @@ class Bot(Client):  # type: ignore
         if not (target := self.get_channel(self.config.channel)):
             return
 
-        quote = get_quote(self.quotes, *self.config.quote_length, prompt)
+        if not self.quotes.ready.is_set():
+            self.logger.info("Model not ready, not sending a quote")
+            return
+
+        generator = generate_quote(
+            self.quotes.current,
+            *self.config.quote_length,
+            prompt,
+            max_copy_ratio=self.config.max_copy_ratio,
+            blocklist=self.blocklist,
+            recent=self.recent_quotes,
+            record_provenance=True,
+        )
+        quote = generator.output.strip() if generator else FALLBACK_QUOTE
+        self.last_quote = generator
+        self.recent_quotes.add(quote.lower())
 
         self.logger.info("Sending quote %s", quote)
 
         # There is a 0.5% chance of Snerge going UwU!
         if force_owo or random.randint(0, 200) == 0:
-            await target.send("~UωU~ " + owo_magic(quote) + " ~UωU~")
+            self.outbox(target).send("~UωU~ " + owo_magic(quote) + " ~UωU~", Priority.FACT)
         else:
-            await target.send("sergeSnerge " + quote + " sergeSnerge")
+            self.outbox(target).send("sergeSnerge " + quote + " sergeSnerge", Priority.FACT)
+
+        if not self.quotes_sent:
+            self.logger.info("Time to first quote: %.2fs", monotonic() - self.quotes.created)
+
+        self.quotes_sent += 1
+
+    async def explain_quote(self, outbox: Outbox, _: str) -> None:
+        if not self.last_quote:
+            outbox.send("I haven't made up anything since I woke up!")
+            return
+
+        spans = [
+            f"tokens {span.start + 1}–{span.end} from {span.facts[0].source}"
+            + (f" (+{len(span.facts) - 1})" if len(span.facts) > 1 else "")
+            for span in self.last_quote.provenance()
+        ]
+
+        # Twitch will not accept messages over 500 characters.
+        outbox.send("; ".join(spans)[:500])
 
     def request_stop(self) -> None:
         self._stop = True
 
     async def close(self) -> None:
         if target := self.get_channel(self.config.channel):
-            await target.send("sergeSnerge Sleepy time!")
+            self.outbox(target).send("sergeSnerge Sleepy time!")
 
         self._closing.set()
-        await asyncio.sleep(2)
+
+        # Anything still queued (including the goodbye) is sent before leaving.
+        outboxes = list(self.outboxes.values())
+        await asyncio.gather(*(outbox.drain(CLOSE_TIMEOUT) for outbox in outboxes))
+
+        for outbox in outboxes:
+            await outbox.stop()
+
         await super().close()
 
 
-def get_quote(
-    quotes: ProseGen, min_length: int, max_length: int, prompt: str | None = None
-) -> str:
+def generate_quote(  # pylint: disable=too-many-arguments
+    quotes: ProseGen,
+    min_length: int,
+    max_length: int,
+    prompt: str | None = None,
+    *,
+    max_copy_ratio: float = 1.0,
+    blocklist: Blocklist | None = None,
+    recent: RotatingBloomFilter | None = None,
+    record_provenance: bool = False,
+) -> GeneratedQuote | None:
     initial_tokens = [
         x for x in Fact(prompt or "", "chat").tokens if x and x in quotes.dictionary
     ]
 
     # Max 100 attempts to generate a quote
     for _ in range(100):
-        generator = GeneratedQuote(quotes, min_length)
+        generator = GeneratedQuote(quotes, min_length, record_provenance)
         for token in initial_tokens:
             generator.append_token(token)
 
         wisdom = generator.make_statement()
 
-        if min_length < len(wisdom) < max_length:
-            return wisdom
+        if not min_length < len(wisdom) < max_length:
+            continue
+
+        # Re-roll anything that is mostly just repeating one of the source quotes.
+        if quotes.shingles.overlap(generator.tokens) > max_copy_ratio:
+            continue
+
+        if blocklist and blocklist.is_blocked(wisdom):
+            continue
+
+        # Avoid repeating something that has been said recently.
+        if recent and wisdom.lower() in recent:
+            continue
+
+        return generator
 
-    return "I don't like coffee."
+    return None
 
 
 def owo_magic(non_owo_string: str) -> str:
@@ -258,20 +362,27 @@ def owo_magic(non_owo_string: str) -> str:
 
 async def main() -> None:
     from snerge import config, token, quotes  # pylint: disable=import-outside-toplevel
+    from snerge.snapshot import ModelSnapshots  # pylint: disable=import-outside-toplevel
+    from snerge.twitch import TwitchClient  # pylint: disable=import-outside-toplevel
 
     log.init()
     logger = log.get_logger()
 
-    app = token.refresh_app_token()
-    data = await quotes.load_data(logger, ProseGen(20))
+    settings = config.config()
+    client = TwitchClient.from_config(settings)
+    app = await token.refresh_app_token(client)
+    snapshots = ModelSnapshots(log.get_logger("snapshot"), settings.model_cache)
+    data = ModelRef(ProseGen(20))
+    data.publish(await quotes.load_data(logger, data.current, snapshots=snapshots))
 
     # Create the IRC bot
     bot = Bot(
         logger=logger,
         loop=asyncio.get_event_loop(),
         app=app,
-        config=config.config(),
+        config=settings,
         quotes=data,
+        blocklist=Blocklist(log.get_logger("blocklist"), settings.blocklist),
     )
 
     await bot.start()
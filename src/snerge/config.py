@@ -20,9 +20,30 @@ class Config:  # pylint: disable=too-many-instance-attributes
     use_latest_reply: bool
     stopguess_delay: int
     closest_without_going_over: bool
+    max_copy_ratio: float
+    blocklist: str
+    recent_quote_window: int
+    recent_quote_error_rate: float
+    lrr_host: str
+    lrr_concurrency: int
+    lrr_retries: int
+    lrr_timeout: float
+    lrr_parser: str
+    http_cache: str
+    http_cache_max_age: int
+    http_cache_stale: int
+    offline: bool
+    refresh_interval: int
+    model_cache: str
+    twitch_id_host: str
+    twitch_api_host: str
+    eventsub_transport: str
+    eventsub_ws_url: str
+    chat_rate_limit: Tuple[int, int]
+    chat_burst: int
 
 
-def config() -> Config:
+def config() -> Config:  # pylint: disable=too-many-locals
     # The time until retry after when we lack a functional connection to Twitch
     backoff_startup = (10, 10)
     # How recently someone must have messaged for the channel to be considered active.
@@ -33,6 +54,50 @@ def config() -> Config:
     # How long a quote should be (to prevent one word quotes and sentences that
     # fill the entire screen).
     message_length = (24, 100)
+    # The largest fraction of a quote which can have been copied word-for-word from
+    # the source quotes (measured in runs of four tokens) before it is re-rolled.
+    max_copy_ratio = 0.5
+    # File of words and phrases which generated quotes must never contain.
+    blocklist = "blocklist.txt"
+    # How long (in seconds) to avoid repeating a quote for, and how often a new
+    # quote may be wrongly thought of as a repeat.
+    recent_quote_window = 6 * 60 * 60
+    recent_quote_error_rate = 0.001
+    # Where to fetch the LRR quotes from (can be pointed at snerge.standin).
+    lrr_host = "https://lrrbot.com"
+    # How many LRR quote pages to fetch at once, how many times to retry a page
+    # that failed to load, and how long (in seconds) to wait for each attempt.
+    lrr_concurrency = 4
+    lrr_retries = 3
+    lrr_timeout = 30.0
+    # How to read the LRR quote pages (one of snerge.lrrparse.PARSERS), or blank
+    # for the fastest one available.
+    lrr_parser = ""
+    # Directory to keep fetched pages in, how long (in seconds) they are used
+    # without checking for changes, and how long after that they are still used
+    # while being checked in the background.
+    http_cache = "http_cache"
+    http_cache_max_age = 24 * 60 * 60
+    http_cache_stale = 7 * 24 * 60 * 60
+    # Only use pages already in the cache, never the network.
+    offline = False
+    # How often (in seconds) to check for new quotes while running.
+    refresh_interval = 60 * 60
+    # Directory to save built models in, so that they are only rebuilt when
+    # something they are built from changes, along with the latest download of
+    # the Uno quote list.
+    model_cache = "model_cache"
+    # Where to reach the Twitch OAuth and Helix APIs (can be pointed at snerge.standin).
+    twitch_id_host = "https://id.twitch.tv"
+    twitch_api_host = "https://api.twitch.tv"
+    # How to receive EventSub notifications: "webhook", or "websocket" to hold
+    # one connection open to eventsub_ws_url (which can be pointed at snerge.standin).
+    eventsub_transport = "webhook"
+    eventsub_ws_url = "wss://eventsub.wss.twitch.tv/ws"
+    # Twitch allows this many messages in this many seconds (100 if the bot is a
+    # moderator), of which up to chat_burst are sent at once.
+    chat_rate_limit = (20, 30)
+    chat_burst = 5
     # GUESSBOT
     # Use the latest reply someone uses
     use_latest_reply = True
@@ -50,4 +115,25 @@ def config() -> Config:
         use_latest_reply,
         stopguess_delay,
         closest_without_going_over,
+        max_copy_ratio,
+        blocklist,
+        recent_quote_window,
+        recent_quote_error_rate,
+        lrr_host,
+        lrr_concurrency,
+        lrr_retries,
+        lrr_timeout,
+        lrr_parser,
+        http_cache,
+        http_cache_max_age,
+        http_cache_stale,
+        offline,
+        refresh_interval,
+        model_cache,
+        twitch_id_host,
+        twitch_api_host,
+        eventsub_transport,
+        eventsub_ws_url,
+        chat_rate_limit,
+        chat_burst,
     )
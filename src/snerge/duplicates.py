@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Reports the near-duplicate quotes that are merged when loading the corpus."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+
+from prosegen import ProseGen
+
+from snerge import log
+from snerge.quotes import load_data, load_sergisms, load_uno_quotes
+
+
+async def main() -> None:
+    log.init()
+    logger = log.get_logger()
+
+    prosegen = ProseGen(20)
+
+    # The LRR quotes have to be fetched, so are only included when asked for.
+    if "--lrr" in sys.argv:
+        await load_data(logger, prosegen)
+    else:
+        for source in (load_uno_quotes(logger), load_sergisms(logger)):
+            async for quote_id, quote in source:
+                prosegen.add_knowledge(quote, source=quote_id)
+
+    groups = [fact for fact in prosegen.index.facts if len(fact.sources) > 1]
+
+    for fact in groups:
+        print(", ".join(fact.sources), "-", fact.original)
+
+    print(
+        f"{prosegen.duplicates} duplicates merged into {len(groups)} facts,"
+        f" out of {len(prosegen.index.facts) + prosegen.duplicates} quotes"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
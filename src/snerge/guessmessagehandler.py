@@ -9,9 +9,10 @@ import asyncio
 import re
 from enum import Enum
 
-from twitchio import Message, Chatter, Channel  # type: ignore
+from twitchio import Message, Chatter  # type: ignore
 
 from .guessstore import GuessStore
+from .outbox import Outbox, Priority
 
 
 class GuessHandlerBotState(Enum):
@@ -41,18 +42,20 @@ class GuessMessageHandler:
         self.bot_state = GuessHandlerBotState.NOT_PROCESSING
         self.reset_guesses()
 
-    async def message_process(self, message: Message, chatter: Chatter) -> None:
+    async def message_process(
+        self, message: Message, chatter: Chatter, outbox: Outbox
+    ) -> None:
         if self.bot_state != GuessHandlerBotState.COLLECTING_VALS:
             return
 
         if self.is_guess(message.content):
-            return await self.record_guess(chatter, message.content, message.channel)
+            return await self.record_guess(chatter, message.content, outbox)
 
         command, _, content = message.content.partition(" ")
         command = command.lower()
 
         if command == "!guess":
-            await self.record_guess(chatter, content, message.channel)
+            await self.record_guess(chatter, content, outbox)
 
     def is_guess(self, message: str) -> bool:
         # Is this a number?
@@ -61,51 +64,52 @@ class GuessMessageHandler:
     def reset_guesses(self) -> None:
         self.guesses = GuessStore(self.use_latest_reply)
 
-    async def record_guess(self, name: Chatter, message: str, channel: Channel) -> None:
+    async def record_guess(self, name: Chatter, message: str, outbox: Outbox) -> None:
         """
         Check the value from "message" is a positive integer; report back if not.
         Two checks: Integer, and Positive
         Then hand over to guess handler.
+        Replies to everyone who got it wrong are combined while waiting to be sent.
         """
 
         if not (match := self.regexp_pattern.match(message)):
-            await channel.send(f"{name.mention} Positive whole numbers only please")
+            outbox.mention(name.mention, "Positive whole numbers only please", Priority.GUESS)
             return
 
         try:
             value_int = int(match[0])
         except ValueError:
-            await channel.send(f"{name.mention} Positive whole numbers only please")
+            outbox.mention(name.mention, "Positive whole numbers only please", Priority.GUESS)
             return
 
         if value_int < 0:
-            await channel.send(f"{name.mention} Positive whole numbers only please")
+            outbox.mention(name.mention, "Positive whole numbers only please", Priority.GUESS)
             return
 
         # Feed to guess handler
         self.guesses.accept_guess(name.display_name, value_int)
 
     # Commands
-    async def start_guessing(self, channel: Channel, _: str) -> None:
+    async def start_guessing(self, outbox: Outbox, _: str) -> None:
         if self.bot_state == GuessHandlerBotState.NOT_PROCESSING:
             self.reset_guesses()
             self.bot_state = GuessHandlerBotState.COLLECTING_VALS
-            await channel.send("Give guesses now! Positive integers only!")
+            outbox.send("Give guesses now! Positive integers only!")
         elif self.bot_state == GuessHandlerBotState.HOLDING_FOR_ANSWER:
-            await channel.send("Still waiting to give an answer!")
+            outbox.send("Still waiting to give an answer!")
 
-    async def stop_guessing(self, channel: Channel, _: str) -> None:
+    async def stop_guessing(self, outbox: Outbox, _: str) -> None:
         if self.bot_state != GuessHandlerBotState.COLLECTING_VALS:
             return
 
-        await channel.send("Guessing window closed")
+        outbox.send("Guessing window closed")
         await asyncio.sleep(self.stopguess_delay)
         self.bot_state = GuessHandlerBotState.HOLDING_FOR_ANSWER
-        await self.stats(channel, _)
+        await self.stats(outbox, _)
 
-    async def score(self, channel: Channel, scoreval: str) -> None:
+    async def score(self, outbox: Outbox, scoreval: str) -> None:
         if self.bot_state == GuessHandlerBotState.COLLECTING_VALS:
-            await channel.send("Please call !stopguessing before asking for a score")
+            outbox.send("Please call !stopguessing before asking for a score")
             return
 
         # Convert
@@ -137,20 +141,20 @@ class GuessMessageHandler:
             + ". Guesses of: "
             + ", ".join(map(str, result_values))
         )
-        await channel.send(message)
+        outbox.send(message, Priority.GUESS)
 
-    async def stats(self, channel: Channel, _: str) -> None:
+    async def stats(self, outbox: Outbox, _: str) -> None:
         stats = self.guesses.stats()
         message = (
             f"{stats['count']} results between {stats['min']}-{stats['max']}. "
             f"Mean:{stats['mean']}, StDev:{stats['stdev']:.1f}. Median:{stats['median']}"
         )
 
-        await channel.send(message)
+        outbox.send(message, Priority.GUESS)
 
     @staticmethod
-    async def guess_commands(channel: Channel, _: str) -> None:
+    async def guess_commands(outbox: Outbox, _: str) -> None:
         prefix = "!"
-        await channel.send(
+        outbox.send(
             f"{prefix}startguessing, {prefix}stopguessing, {prefix}score (result), {prefix}stats."
         )
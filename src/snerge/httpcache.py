@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Set
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import aiohttp
+
+from snerge import log
+
+
+class CacheMiss(Exception):
+    """Raised when a URL is requested in offline mode, and it has never been fetched."""
+
+
+class HttpCache:
+    """
+    Keeps a copy of fetched pages on disk, so they do not have to be fetched again.
+
+    Responses younger than `max_age` are served without touching the network.
+    Older responses are served as they are for up to `stale_while_revalidate`
+    more seconds, while a conditional request (using the ETag/Last-Modified
+    headers) checks for a newer version in the background. Anything older still
+    is revalidated before being served. If the network request fails, the
+    stored copy is served regardless of age.
+
+    In offline mode, only the stored copies are used.
+    """
+
+    logger: log.Logger
+    directory: str
+    max_age: float
+    stale_while_revalidate: float
+    offline: bool
+    timeout: float
+
+    _revalidating: Set[asyncio.Task[None]]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        logger: log.Logger,
+        directory: str,
+        *,
+        max_age: float,
+        stale_while_revalidate: float,
+        offline: bool = False,
+        timeout: float = 30.0,
+    ) -> None:
+        self.logger = logger
+        self.directory = directory
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.offline = offline
+        self.timeout = timeout
+        self._revalidating = set()
+
+        os.makedirs(directory, exist_ok=True)
+
+    async def get(
+        self, session: aiohttp.ClientSession, url: str, *, revalidate: bool = False
+    ) -> str:
+        """
+        Gets the body of a page, from the cache if possible.
+
+        If `revalidate` is set, a stored copy is only used if the server
+        confirms it is still current (or cannot be reached).
+        """
+        entry = self.load(url)
+
+        if self.offline:
+            if not entry:
+                raise CacheMiss(url)
+
+            return str(entry["body"])
+
+        if entry and not revalidate and self._can_serve(url, entry):
+            return str(entry["body"])
+
+        try:
+            return await self.fetch(session, url, entry)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if not entry:
+                raise
+
+            self.logger.warning(
+                "Failed to fetch %s, using the stored copy", url, exc_info=True
+            )
+            return str(entry["body"])
+
+    async def fetch(
+        self, session: aiohttp.ClientSession, url: str, entry: Dict[str, Any] | None
+    ) -> str:
+        headers: Dict[str, str] = {}
+
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and entry:
+                self.logger.debug("%s has not changed", url)
+                entry["fetched"] = time.time()
+                self.store(entry)
+
+                return str(entry["body"])
+
+            response.raise_for_status()
+            body = await response.text()
+
+            self.store(
+                {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched": time.time(),
+                    "body": body,
+                }
+            )
+
+            return body
+
+    async def wait(self) -> None:
+        """Waits for any background revalidation to complete."""
+        if self._revalidating:
+            await asyncio.wait(self._revalidating)
+
+    def load(self, url: str) -> Dict[str, Any] | None:
+        try:
+            with open(self.path(url), "rt", encoding="utf-8") as handle:
+                entry: Dict[str, Any] = json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+        # Guard against the (very unlikely) case of two URLs with the same hash.
+        return entry if entry.get("url") == url else None
+
+    def store(self, entry: Dict[str, Any]) -> None:
+        path = self.path(entry["url"])
+
+        # Write then rename, so an interrupted write never leaves a broken entry.
+        with open(path + ".tmp", "wt", encoding="utf-8") as handle:
+            json.dump(entry, handle)
+
+        os.replace(path + ".tmp", path)
+
+    def path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+        return os.path.join(self.directory, f"{name}.json")
+
+    @staticmethod
+    def entries_in(directory: str) -> List[Dict[str, Any]]:
+        """All the responses stored in a cache directory, in no particular order."""
+        found: List[Dict[str, Any]] = []
+
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+
+            try:
+                with open(os.path.join(directory, name), "rt", encoding="utf-8") as handle:
+                    found.append(json.load(handle))
+            except (OSError, ValueError):
+                continue
+
+        return found
+
+    def _can_serve(self, url: str, entry: Dict[str, Any]) -> bool:
+        age = time.time() - entry["fetched"]
+
+        if age < self.max_age:
+            return True
+
+        if age >= self.max_age + self.stale_while_revalidate:
+            return False
+
+        self.logger.info("Revalidating %s in the background", url)
+        task = asyncio.create_task(self._revalidate(url, entry))
+        self._revalidating.add(task)
+        task.add_done_callback(self._revalidating.discard)
+
+        return True
+
+    async def _revalidate(self, url: str, entry: Dict[str, Any]) -> None:
+        # The session the page was requested through may well be closed by the
+        # time this runs, so the revalidation uses one of its own, with
+        # `timeout` so that a server which never answers cannot keep it open.
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                await self.fetch(session, url, entry)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.logger.warning("Failed to revalidate %s", url, exc_info=True)
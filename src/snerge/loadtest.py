@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Load tests for the bot, with stand-ins for everything outside it.
+
+    python -m snerge.loadtest webhook [redemptions] [repeat fraction]
+
+fires a burst of channel points redemptions at the EventSub webhook, with a
+fraction of them sent a second time (as Twitch does when it thinks a message
+was not received), and reports how quickly they were acknowledged, and
+whether each redemption got exactly one quote.
+
+    python -m snerge.loadtest socket [redemptions] [repeat fraction]
+
+sends the same burst over an EventSub WebSocket session, which is asked to
+move to a new connection halfway through.
+
+    python -m snerge.loadtest latency [redemptions]
+
+sends redemptions one at a time over each, and compares how long each takes
+to go from Twitch sending it to the bot acting on it.
+
+    python -m snerge.loadtest chat [startguessing | mixed | IRC log] [messages]
+
+replays chat through the bot's message handling as fast as it can, and reports
+how many messages a second it keeps up with. The chat is either a flood of
+guesses after a `!startguessing`, a mix of chatter and commands, or a recorded
+log of raw IRC lines (of which the PRIVMSGs are replayed). The model is built
+from the quote files first (and any LRR pages in the HTTP cache), so that
+commands like `!snerge` generate quotes as they would live.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Dict, Iterable, List, Set, Tuple, Type, TypeVar
+
+import asyncio
+import dataclasses
+import hashlib
+import hmac
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from twitchio import Channel, Chatter, Message  # type: ignore
+from twitchio.parse import parser  # type: ignore
+
+from prosegen import ProseGen
+from snerge.blocklist import Blocklist
+from snerge.bot import Bot
+from snerge.config import Config, config
+from snerge.lrr import LrrScraper
+from snerge.model import ModelRef
+from snerge.quotes import load_data
+from snerge.server.eventsocket import EventSubSocket
+from snerge.server.eventsub import EVENT_TYPES, SNERGE_REWARD, EventHandler, TwitchEvent
+from snerge.snapshot import ModelSnapshots
+from snerge.standin import STANDIN_USER, STANDIN_USER_ID, EventSubSessions
+from snerge.standin import create_eventsub_app, create_twitch_app
+from snerge.token import App, Token
+from snerge.twitch import TwitchClient
+
+
+SECRET = b"loadtest-secret"
+# How long (in seconds) sending a message to chat is taken to take.
+SEND_TIME = 0.05
+# How often (in seconds) the event loop is checked for being blocked.
+LAG_INTERVAL = 0.01
+# How far apart (in seconds) redemptions are sent when measuring latency, so
+# that none of them wait for another to be acted on.
+LATENCY_INTERVAL = 0.1
+
+REDEMPTION = "channel.channel_points_custom_reward_redemption.add"
+
+# The bot's name in replayed chat.
+REPLAY_NICK = "snergebot"
+# How many different people are chatting in the generated chat.
+CHATTERS = 500
+
+BotT = TypeVar("BotT", bound=Bot)
+
+
+class _CountingBot(Bot):
+    """A bot which only counts the quotes it is asked to send."""
+
+    sent: int = 0
+
+    async def send_quote(self, prompt: str | None = None, force_owo: bool = False) -> None:
+        await asyncio.sleep(SEND_TIME)
+        self.sent += 1
+
+
+class _TimingHandler(EventHandler):
+    """
+    An event handler which records how long after being sent each redemption
+    was acted on, and which subscribes with a stand-in token.
+    """
+
+    latencies: List[float]
+
+    def __init__(
+        self, logger: logging.Logger, app: App, _bot: Bot, client: TwitchClient
+    ) -> None:
+        super().__init__(logger, app, _bot, client)
+        self.latencies = []
+
+    async def handle_reward_event(self, event: TwitchEvent) -> None:
+        reward_event = event.content.get("event", {})
+
+        if isinstance(reward_event, dict) and "sent" in reward_event:
+            self.latencies.append(time.perf_counter() - float(reward_event["sent"]))
+
+        await super().handle_reward_event(event)
+
+    async def register(self, username: str, session_id: str | None = None) -> None:
+        user = Token(int(STANDIN_USER_ID), username, "standin-access-0", "standin-refresh-0")
+
+        await asyncio.gather(
+            *(self.subscribe(user, event_type, session_id) for event_type in EVENT_TYPES)
+        )
+
+
+class _ReplayConnection:
+    """
+    Stands in for twitchio's connection to chat, keeping the chatters it has
+    seen (as twitchio does) and everything the bot sends.
+    """
+
+    nick: str
+    sent: List[str]
+    _cache: Dict[str, Set[Chatter]]
+
+    def __init__(self, nick: str) -> None:
+        self.nick = nick
+        self.sent = []
+        self._cache = {}
+
+    async def send(self, message: str) -> None:
+        self.sent.append(message)
+
+    def receive(self, line: str) -> Message | None:
+        """Turns a line of IRC into the message twitchio would dispatch, if it is one."""
+        parsed = parser(line, self.nick)
+
+        if parsed["action"] != "PRIVMSG" or not parsed["channel"]:
+            return None
+
+        channel = Channel(name=parsed["channel"], websocket=self)
+        chatter = Chatter(
+            tags=parsed["badges"], name=parsed["user"], channel=channel, websocket=self
+        )
+
+        chatters = self._cache.setdefault(channel.name, set())
+        chatters.discard(chatter)
+        chatters.add(chatter)
+
+        return Message(
+            raw_data=parsed["data"],
+            content=parsed["message"],
+            author=chatter,
+            channel=channel,
+            tags=parsed["badges"],
+        )
+
+
+class _ReplayBot(Bot):
+    """A bot connected to replayed chat instead of Twitch."""
+
+    replay: _ReplayConnection
+
+    def get_channel(self, name: str) -> Channel | None:
+        if name not in self.replay._cache:  # pylint: disable=protected-access
+            return None
+
+        return Channel(name=name, websocket=self.replay)
+
+
+class LagMonitor:
+    """Measures how late the event loop is in waking a task that sleeps repeatedly."""
+
+    lags: List[float]
+
+    _task: asyncio.Task[None] | None = None
+    _sleeping: float | None = None
+
+    def __init__(self) -> None:
+        self.lags = []
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="lag-monitor")
+
+    async def stop(self) -> None:
+        # A stall that has not ended by the time the monitor is stopped would
+        # never be measured, so if the task is overdue, it is measured here.
+        if self._sleeping is not None:
+            if (late := time.perf_counter() - self._sleeping - LAG_INTERVAL) > 0:
+                self.lags.append(late)
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            self._sleeping = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lags.append(max(0.0, time.perf_counter() - self._sleeping - LAG_INTERVAL))
+            self._sleeping = None
+
+
+def create_bot(bot_type: Type[BotT], app: App, settings: Config | None = None) -> BotT:
+    """Creates a bot with an empty model, which never connects to Twitch."""
+    logger = logging.getLogger("loadtest.bot")
+
+    return bot_type(
+        logger=logger,
+        loop=asyncio.get_running_loop(),
+        config=settings or config(),
+        app=app,
+        quotes=ModelRef(ProseGen(20)),
+        blocklist=Blocklist(logger, "blocklist.txt"),
+    )
+
+
+async def corpus_model(settings: Config) -> ProseGen:
+    """
+    Builds a model from the quote files in the repository, and any LRR pages
+    recorded in the HTTP cache, without going to the network.
+    """
+    logger = logging.getLogger("loadtest.model")
+    scraper = LrrScraper.from_config(logger, dataclasses.replace(settings, offline=True))
+    snapshots = ModelSnapshots(logger, settings.model_cache)
+
+    return await load_data(logger, ProseGen(20), scraper=scraper, snapshots=snapshots)
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "no samples"
+
+    ordered = sorted(values)
+    points = {
+        name: ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+        for name, fraction in [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]
+    }
+    points["max"] = ordered[-1]
+
+    return ", ".join(f"{name} {value * 1000:.1f}ms" for name, value in points.items())
+
+
+async def paced(coroutines: Iterable[Awaitable[Any]], interval: float) -> None:
+    """Runs the coroutines, all at once or starting one every `interval` seconds."""
+    tasks = []
+
+    for coroutine in coroutines:
+        tasks.append(asyncio.ensure_future(coroutine))
+
+        if interval:
+            await asyncio.sleep(interval)
+
+    await asyncio.gather(*tasks)
+
+
+def redemption_event() -> Dict[str, Any]:
+    """A redemption of the Snerge reward, marked with when it was sent."""
+    return {
+        "id": str(uuid.uuid4()),
+        "reward": {"id": SNERGE_REWARD},
+        "sent": str(time.perf_counter()),
+    }
+
+
+def redemption(message_id: str) -> Tuple[Dict[str, str], bytes]:
+    """The headers and body of a signed redemption notification."""
+    payload: Dict[str, Any] = {
+        "subscription": {"type": REDEMPTION, "version": "1"},
+        "event": redemption_event(),
+    }
+    body = json.dumps(payload).encode("utf-8")
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    mac = hmac.new(SECRET, digestmod=hashlib.sha256)
+    mac.update(message_id.encode("utf-8") + timestamp.encode("utf-8") + body)
+
+    headers = {
+        "Twitch-Eventsub-Message-Id": message_id,
+        "Twitch-Eventsub-Message-Signature": "sha256=" + mac.hexdigest(),
+        "Twitch-Eventsub-Message-Timestamp": timestamp,
+        "Twitch-Eventsub-Message-Type": "notification",
+        "Twitch-Eventsub-Subscription-Type": REDEMPTION,
+    }
+
+    return headers, body
+
+
+def message_ids(redemptions: int, repeat_fraction: float) -> Tuple[List[str], int]:
+    """The IDs of each message to send, in a random order, and how many are repeats."""
+    unique = [str(uuid.uuid4()) for _ in range(redemptions)]
+    repeats = random.sample(unique, int(redemptions * repeat_fraction))
+    messages = unique + repeats
+    random.shuffle(messages)
+
+    return messages, len(repeats)
+
+
+async def webhook_burst(  # pylint: disable=too-many-locals
+    redemptions: int, repeat_fraction: float, interval: float = 0.0
+) -> None:
+    app = App("loadtest", "loadtest", "oauth:loadtest", "", "", SECRET)
+    quote_bot = create_bot(_CountingBot, app)
+    events = _TimingHandler(
+        logging.getLogger("loadtest.webhook"), app, quote_bot, TwitchClient()
+    )
+    servlet = web.Application()
+    servlet.router.add_route("POST", "/webhook", events.handle_webhook)
+
+    ids, repeats = message_ids(redemptions, repeat_fraction)
+
+    statuses: Dict[int, int] = {}
+    acks: List[float] = []
+    monitor = LagMonitor()
+
+    async def send(session: aiohttp.ClientSession, url: str, message_id: str) -> None:
+        headers, body = redemption(message_id)
+        start = time.perf_counter()
+
+        async with session.post(url, data=body, headers=headers) as response:
+            await response.read()
+
+        acks.append(time.perf_counter() - start)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    async with TestServer(servlet) as httpd:
+        events.start()
+        monitor.start()
+        start = time.perf_counter()
+
+        async with aiohttp.ClientSession() as session:
+            url = str(httpd.make_url("/webhook"))
+            await paced((send(session, url, message_id) for message_id in ids), interval)
+
+        acknowledged = time.perf_counter() - start
+        await events.queue.join()
+        processed = time.perf_counter() - start
+
+        await monitor.stop()
+        await events.stop()
+
+    responses = ", ".join(f"{count} x {status}" for status, count in statuses.items())
+
+    print(f"Sent {len(ids)} notifications ({repeats} repeats)")
+    print(f"Responses: {responses}")
+    print(f"Acknowledged all in {acknowledged:.2f}s; {percentiles(acks)}")
+    print(f"Processed all in {processed:.2f}s")
+    print(f"Redemption to quote: {percentiles(events.latencies)}")
+    print(
+        f"Sent {quote_bot.sent} quotes for {redemptions} redemptions "
+        f"({statuses.get(503, 0)} notifications deferred for Twitch to send again)"
+    )
+    print(f"Event loop lag: {percentiles(monitor.lags)}")
+
+
+async def socket_burst(  # pylint: disable=too-many-locals
+    redemptions: int, repeat_fraction: float, interval: float = 0.0
+) -> None:
+    app = App("loadtest", "loadtest", "oauth:loadtest", "", "", SECRET)
+    quote_bot = create_bot(_CountingBot, app)
+    sessions = EventSubSessions()
+    logger = logging.getLogger("loadtest.socket")
+
+    ids, repeats = message_ids(redemptions, repeat_fraction)
+    monitor = LagMonitor()
+
+    async with TestServer(create_eventsub_app(create_twitch_app(), sessions)) as twitch:
+        host = f"{twitch.host}:{twitch.port}"
+        client = TwitchClient(id_host=f"http://{host}", api_host=f"http://{host}")
+        events = _TimingHandler(logger, app, quote_bot, client)
+        socket = EventSubSocket(logger, events, client, STANDIN_USER, f"ws://{host}/ws")
+
+        events.start()
+        connection = asyncio.create_task(socket.run())
+
+        while not sessions.sockets:
+            await asyncio.sleep(LAG_INTERVAL)
+
+        monitor.start()
+        start = time.perf_counter()
+
+        async def send(number: int, message_id: str) -> None:
+            await sessions.notify(REDEMPTION, redemption_event(), message_id)
+
+            if number == len(ids) // 2:
+                await sessions.reconnect(f"ws://{host}/ws")
+
+        await paced((send(*message) for message in enumerate(ids)), interval)
+        sent = time.perf_counter() - start
+
+        while len(events.latencies) < redemptions:
+            await asyncio.sleep(LAG_INTERVAL)
+
+        await events.queue.join()
+        processed = time.perf_counter() - start
+
+        await monitor.stop()
+        connection.cancel()
+        await events.stop()
+        await client.close()
+
+    print(f"Sent {len(ids)} notifications ({repeats} repeats) in {sent:.2f}s")
+    print(f"Moved to a new connection after {len(ids) // 2 + 1}")
+    print(f"Processed all in {processed:.2f}s")
+    print(f"Redemption to quote: {percentiles(events.latencies)}")
+    print(f"Sent {quote_bot.sent} quotes for {redemptions} redemptions")
+    print(f"Event loop lag: {percentiles(monitor.lags)}")
+
+
+async def compare_latency(redemptions: int) -> None:
+    print("== Webhook ==")
+    await webhook_burst(redemptions, 0.0, LATENCY_INTERVAL)
+    print("== WebSocket ==")
+    await socket_burst(redemptions, 0.0, LATENCY_INTERVAL)
+
+
+def privmsg(channel: str, user: str, content: str, moderator: bool = False) -> str:
+    """A chat message, as Twitch sends it over IRC."""
+    tags = {
+        "badge-info": "",
+        "badges": "moderator/1" if moderator else "",
+        "color": "",
+        "display-name": user,
+        "emotes": "",
+        "first-msg": "0",
+        "id": str(uuid.uuid4()),
+        "mod": "1" if moderator else "0",
+        "subscriber": "0",
+        "tmi-sent-ts": str(int(time.time() * 1000)),
+        "turbo": "0",
+        "user-id": str(abs(hash(user))),
+        "user-type": "mod" if moderator else "",
+    }
+    tag_string = ";".join(f"{key}={value}" for key, value in tags.items())
+    login = user.lower()
+    sender = f"{login}!{login}@{login}.tmi.twitch.tv"
+
+    return f"@{tag_string} :{sender} PRIVMSG #{channel} :{content}"
+
+
+def guessing_flood(channel: str, messages: int) -> List[str]:
+    """A round of guessing, with chat flooded with guesses (a fifth of them bad)."""
+    guesses = [
+        random.choice(
+            [str(random.randint(0, 1000))] * 7
+            + [f"!guess {random.randint(0, 1000)}", "-5", "!guess lots"]
+        )
+        for _ in range(messages)
+    ]
+    users = [f"Chatter{random.randrange(CHATTERS)}" for _ in guesses]
+
+    return [
+        privmsg(channel, "Moderator", "!startguessing", moderator=True),
+        *(privmsg(channel, user, guess) for user, guess in zip(users, guesses)),
+        privmsg(channel, "Moderator", "!stopguessing", moderator=True),
+        privmsg(channel, "Moderator", "!score 500", moderator=True),
+    ]
+
+
+def mixed_chat(channel: str, messages: int) -> List[str]:
+    """Chat, guesses, and commands from moderators and everyone else, in rounds of guessing."""
+    chatter = ["sergeHype", "lol", "Is this the one with the dog?", "KEKW", "12 out of 10"]
+    commands = ["!guesscommands", "!whence", "!stats", "!snerge", "!snerge coffee"]
+    rounds = ["!startguessing", "!stopguessing", "!score 10"]
+
+    lines = []
+
+    for number in range(messages):
+        moderator = random.random() < 0.1
+        user = "Moderator" if moderator else f"Chatter{random.randrange(CHATTERS)}"
+
+        if number % (messages // 10 or 1) == 0:
+            content, moderator, user = rounds[number % 3], True, "Moderator"
+        elif random.random() < 0.1:
+            content = random.choice(commands)
+        elif random.random() < 0.3:
+            content = str(random.randint(-10, 100))
+        else:
+            content = random.choice(chatter)
+
+        lines.append(privmsg(channel, user, content, moderator))
+
+    return lines
+
+
+def chat_lines(source: str, channel: str, messages: int) -> List[str]:
+    if source == "startguessing":
+        return guessing_flood(channel, messages)
+
+    if source == "mixed":
+        return mixed_chat(channel, messages)
+
+    with open(source, "r", encoding="utf-8") as handle:
+        return [line.rstrip("\r\n") for line in handle if " PRIVMSG #" in line]
+
+
+async def chat_flood(source: str, messages: int) -> None:  # pylint: disable=too-many-locals
+    app = App("loadtest", "loadtest", "oauth:loadtest", "", "", SECRET)
+    # The wait before scoring is a pause for the stream, not work being measured.
+    settings = dataclasses.replace(config(), stopguess_delay=0)
+    quote_bot = create_bot(_ReplayBot, app, settings)
+    quote_bot.replay = _ReplayConnection(REPLAY_NICK)
+
+    # !snerge and !whence only generate anything once there is a model.
+    built = time.perf_counter()
+    quote_bot.quotes.publish(await corpus_model(settings))
+    print(f"Built the model in {time.perf_counter() - built:.2f}s")
+
+    lines = chat_lines(source, settings.channel, messages)
+    latencies: List[float] = []
+    monitor = LagMonitor()
+
+    async def handle(received: float, message: Message) -> None:
+        await quote_bot.event_message(message)
+        latencies.append(time.perf_counter() - received)
+
+    monitor.start()
+    start = time.perf_counter()
+    tasks = []
+
+    # twitchio acts on each message in a task of its own, as it is read.
+    for line in lines:
+        received = time.perf_counter()
+
+        if message := quote_bot.replay.receive(line):
+            tasks.append(asyncio.create_task(handle(received, message)))
+
+        await asyncio.sleep(0)
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    await monitor.stop()
+    queued = sum(outbox.queue.qsize() for outbox in quote_bot.outboxes.values())
+
+    for outbox in quote_bot.outboxes.values():
+        await outbox.stop()
+
+    print(f"Replayed {len(tasks)} messages in {elapsed:.2f}s ({len(tasks) / elapsed:.0f}/s)")
+    print(f"Handling latency: {percentiles(latencies)}")
+    print(f"Replies: {len(quote_bot.replay.sent)} sent, {queued} waiting on the rate limit")
+    print(f"Event loop lag: {percentiles(monitor.lags)}")
+
+
+def burst_arguments() -> Tuple[int, float]:
+    redemptions = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    repeat_fraction = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+    return redemptions, repeat_fraction
+
+
+def chat_arguments() -> Tuple[str, int]:
+    source = sys.argv[2] if len(sys.argv) > 2 else "startguessing"
+    messages = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+
+    return source, messages
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.ERROR)
+
+    scenario = sys.argv[1] if len(sys.argv) > 1 else "webhook"
+
+    if scenario == "webhook":
+        asyncio.run(webhook_burst(*burst_arguments()))
+    elif scenario == "socket":
+        asyncio.run(socket_burst(*burst_arguments()))
+    elif scenario == "latency":
+        asyncio.run(compare_latency(int(sys.argv[2]) if len(sys.argv) > 2 else 50))
+    elif scenario == "chat":
+        asyncio.run(chat_flood(*chat_arguments()))
+    else:
+        print(f"Unknown scenario {scenario}")
+
+
+if __name__ == "__main__":
+    main()
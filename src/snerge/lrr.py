@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import AsyncGenerator, Container, List, Tuple
+
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from snerge import log
+from snerge.config import Config
+from snerge.httpcache import CacheMiss, HttpCache
+from snerge.lrrparse import DEFAULT_PARSER, PARSERS, Parser
+
+
+LRR_HOST = "https://lrrbot.com"
+
+# How long (in seconds) to wait before the first retry; doubled for each one after.
+RETRY_DELAY = 0.5
+
+
+class LrrScraper:  # pylint: disable=too-many-instance-attributes
+    """
+    Fetches Serge's quotes from LRRbot's quote search.
+
+    The first page is fetched on its own, to find the pagination links; every
+    other page is then fetched by a fixed number of workers, following any
+    further links the pages contain. Failed requests are retried with backoff.
+
+    The search lists the newest quotes first, so once a page contains a quote
+    that is already known, later pages only contain known quotes and are not
+    fetched.
+
+    A page which still cannot be loaded is skipped, so the other pages' quotes
+    are still used, but `complete` is cleared to show that some are missing.
+    """
+
+    logger: log.Logger
+    host: str
+    cache: HttpCache | None
+    concurrency: int
+    retries: int
+    timeout: float
+    parser: Parser
+    complete: bool = True
+
+    _queue: asyncio.Queue[int]
+    _output: asyncio.Queue[Tuple[str, str] | None]
+    _queued: int
+    _last_page: int | None
+    _revalidate: bool
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        logger: log.Logger,
+        *,
+        host: str = LRR_HOST,
+        cache: HttpCache | None = None,
+        concurrency: int = 4,
+        retries: int = 3,
+        timeout: float = 30.0,
+        parser: Parser = PARSERS[DEFAULT_PARSER],
+    ) -> None:
+        self.logger = logger
+        self.host = host
+        self.cache = cache
+        self.concurrency = concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.parser = parser
+
+    @classmethod
+    def from_config(cls, logger: log.Logger, settings: Config) -> LrrScraper:
+        cache = HttpCache(
+            logger,
+            settings.http_cache,
+            max_age=settings.http_cache_max_age,
+            stale_while_revalidate=settings.http_cache_stale,
+            offline=settings.offline,
+            timeout=settings.lrr_timeout,
+        )
+
+        return cls(
+            logger,
+            host=settings.lrr_host,
+            cache=cache,
+            concurrency=settings.lrr_concurrency,
+            retries=settings.lrr_retries,
+            timeout=settings.lrr_timeout,
+            parser=PARSERS[settings.lrr_parser or DEFAULT_PARSER],
+        )
+
+    async def quotes(
+        self, known: Container[str] = frozenset(), *, revalidate: bool = False
+    ) -> AsyncGenerator[Tuple[str, str], None]:
+        """
+        Yields the ID (e.g. "LRR #27") and text of each quote that is not already known.
+
+        Quotes arrive in no particular order. If `revalidate` is set, cached
+        pages are always checked for changes before being used.
+        """
+        self._revalidate = revalidate
+        self.complete = True
+        self._queue = asyncio.Queue()
+        self._output = asyncio.Queue()
+        self._queued = 1
+        self._last_page = None
+
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            # The first page is loaded on its own, so that the workers have the
+            # pagination links to start from.
+            await self._try_page(session, 1, known)
+
+            workers = [
+                asyncio.create_task(self._worker(session, known))
+                for _ in range(self.concurrency)
+            ]
+            finished = asyncio.create_task(self._finish(workers))
+
+            try:
+                while quote := await self._output.get():
+                    yield quote
+            finally:
+                finished.cancel()
+
+                for worker in workers:
+                    worker.cancel()
+
+            # Workers only ever stop early if something unexpected went wrong.
+            for worker in workers:
+                if worker.done() and not worker.cancelled() and (error := worker.exception()):
+                    raise error
+
+    async def _finish(self, workers: List[asyncio.Task[None]]) -> None:
+        join = asyncio.create_task(self._queue.join())
+        await asyncio.wait([join, *workers], return_when=asyncio.FIRST_COMPLETED)
+        join.cancel()
+
+        for worker in workers:
+            worker.cancel()
+
+        await self._output.put(None)
+
+    async def _worker(self, session: aiohttp.ClientSession, known: Container[str]) -> None:
+        while True:
+            page = await self._queue.get()
+
+            try:
+                await self._try_page(session, page, known)
+            finally:
+                self._queue.task_done()
+
+    async def _try_page(
+        self, session: aiohttp.ClientSession, page: int, known: Container[str]
+    ) -> None:
+        try:
+            await self._load_page(session, page, known)
+        except (aiohttp.ClientError, asyncio.TimeoutError, CacheMiss):
+            self.complete = False
+            self.logger.warning("Unable to load LRR quote page %d", page, exc_info=True)
+
+    async def _load_page(
+        self, session: aiohttp.ClientSession, page: int, known: Container[str]
+    ) -> None:
+        # An earlier page may have already shown this one will be empty or known.
+        if self._last_page is not None and page > self._last_page:
+            return
+
+        start = time.perf_counter()
+        html = await self._fetch(session, page)
+        fetched = time.perf_counter()
+        results = self.parser(html)
+        parsed = time.perf_counter()
+
+        self.logger.info(
+            "Loaded LRR quote page %d: %d quotes, fetched in %.0fms, parsed in %.0fms",
+            page,
+            len(results.quotes),
+            (fetched - start) * 1000,
+            (parsed - fetched) * 1000,
+        )
+
+        # An empty page means we are past the end.
+        if not results.items:
+            self._stop_after(page - 1)
+            return
+
+        quotes = [(f"LRR {quote_id}", quote) for quote_id, quote in results.quotes]
+        new = [(quote_id, quote) for quote_id, quote in quotes if quote_id not in known]
+
+        for quote in new:
+            await self._output.put(quote)
+
+        # A page with known quotes means everything after it has been seen before.
+        if len(new) < len(quotes):
+            self._stop_after(page)
+            return
+
+        # Queue up every page we now know about, plus the one after the last
+        # of them, in case the links only cover nearby pages.
+        for next_page in range(self._queued + 1, max(results.links, default=page) + 2):
+            if self._last_page is None or next_page <= self._last_page:
+                self._queue.put_nowait(next_page)
+                self._queued = next_page
+
+    def _stop_after(self, page: int) -> None:
+        if self._last_page is None or page < self._last_page:
+            self.logger.info("No more LRR quote pages needed after page %d", page)
+            self._last_page = page
+
+    async def _fetch(self, session: aiohttp.ClientSession, page: int) -> str:
+        url = f"{self.host}/quotes/search?q=serge&mode=name&page={page}"
+
+        for attempt in range(self.retries):
+            try:
+                return await self._request(session, url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if not _is_transient(error):
+                    raise
+
+                delay = RETRY_DELAY * 2**attempt * random.uniform(0.5, 1.5)
+                self.logger.info(
+                    "Retrying LRR quote page %d in %.1fs: %r", page, delay, error
+                )
+                await asyncio.sleep(delay)
+
+        # The last attempt's errors are left for the caller.
+        return await self._request(session, url)
+
+    async def _request(self, session: aiohttp.ClientSession, url: str) -> str:
+        if self.cache:
+            return await self.cache.get(session, url, revalidate=self._revalidate)
+
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.text()
+
+
+def _is_transient(error: Exception) -> bool:
+    # Client errors (other than being rate limited) will not fix themselves.
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+
+    return True
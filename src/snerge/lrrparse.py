@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Ways of pulling Serge's quotes out of a page of LRRbot's quote search.
+
+Every parser gives the same results; BeautifulSoup is the reference they are
+tested against, the streaming parser only looks at the parts of the page it
+needs, and lxml is used when it is installed. To check they agree on the pages
+recorded in the HTTP cache, and time them, run
+
+    python -m snerge.lrrparse [cache directory] [repeats]
+"""
+
+from __future__ import annotations
+
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Set, Tuple
+
+import dataclasses
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+from snerge.httpcache import HttpCache
+
+try:
+    import lxml.html  # type: ignore # pylint: disable=import-error
+except ImportError:
+    lxml = None  # pylint: disable=invalid-name
+
+
+# Links to other pages of the search results.
+PAGE_LINK = re.compile(r"[?&;]page=(\d+)")
+
+# Elements which never have any content, or an end tag.
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+# Elements whose children are list items.
+LIST_ELEMENTS = {"menu", "ol", "ul"}
+
+Quotes = List[Tuple[str, str]]
+
+
+@dataclasses.dataclass
+class Page:
+    """What was found on one page of search results."""
+
+    # The ID (e.g. "#27") and text of each of Serge's quotes.
+    quotes: Quotes
+    # The numbers of the other pages it links to.
+    links: Set[int]
+    # How many quotes there were in total, including other people's.
+    items: int
+
+
+Parser = Callable[[str], Page]
+
+
+def parse_soup(html: str) -> Page:
+    page = Page([], _links(html), 0)
+
+    soup = BeautifulSoup(html, "html.parser")
+    quotes = soup.find("ol", class_="quotes")
+
+    if not quotes or not isinstance(quotes, Tag):
+        return page
+
+    for quote in quotes.find_all("li"):
+        page.items += 1
+        quote_id = quote.find(class_="num").text
+        quote_text = quote.find("blockquote").text
+
+        attrib = quote.find("div", class_="attrib")
+        attrib_text = "".join(
+            element for element in attrib if isinstance(element, NavigableString)
+        )
+
+        if _is_serge(attrib_text):
+            page.quotes.append((quote_id, quote_text))
+
+    return page
+
+
+def parse_stream(html: str) -> Page:
+    parser = _QuoteParser(_links(html))
+    parser.feed(html)
+    parser.close()
+
+    return parser.page
+
+
+def parse_lxml(html: str) -> Page:
+    page = Page([], _links(html), 0)
+
+    if not html.strip():
+        return page
+
+    root = lxml.html.fromstring(html)
+    lists = root.xpath(f"//ol[{_has_class('quotes')}]")
+
+    if not lists:
+        return page
+
+    for quote in lists[0].iter("li"):
+        page.items += 1
+        quote_id = quote.xpath(f".//*[{_has_class('num')}]")[0].text_content()
+        quote_text = quote.find(".//blockquote").text_content()
+
+        attrib = quote.xpath(f".//div[{_has_class('attrib')}]")[0]
+        attrib_text = attrib.text or ""
+
+        # The text directly in the element is its own text, plus the text
+        # after each child (and comments, which BeautifulSoup counts as text).
+        for child in attrib:
+            if isinstance(child, lxml.html.HtmlComment):
+                attrib_text += child.text or ""
+
+            attrib_text += child.tail or ""
+
+        if _is_serge(attrib_text):
+            page.quotes.append((str(quote_id), str(quote_text)))
+
+    return page
+
+
+PARSERS: Dict[str, Parser] = {"soup": parse_soup, "stream": parse_stream}
+
+if lxml:
+    PARSERS["lxml"] = parse_lxml
+
+# The fastest parser available; the others can be picked with `lrr_parser`.
+DEFAULT_PARSER = "lxml" if lxml else "stream"
+
+
+class _Field:  # pylint: disable=too-few-public-methods
+    """Text being collected from one element (and its children) in a quote."""
+
+    depth: int = 0
+    parts: List[str] | None = None
+
+    def open(self, depth: int) -> None:
+        self.depth = depth
+        self.parts = []
+
+
+class _QuoteParser(HTMLParser):  # pylint: disable=too-many-instance-attributes
+    """
+    Picks the quotes out of the first `ol.quotes` in a single pass.
+
+    Only the elements inside that list are tracked, by a stack of their names;
+    each field of a quote is collected until the element it started in is closed.
+    """
+
+    page: Page
+
+    _stack: List[str] | None
+    _finished: bool
+    _item: int
+    _num: _Field
+    _quote: _Field
+    _attrib: _Field
+
+    def __init__(self, links: Set[int]) -> None:
+        super().__init__(convert_charrefs=True)
+
+        self.page = Page([], links, 0)
+        self._stack = None
+        self._finished = False
+        self._item = 0
+        self._num = _Field()
+        self._quote = _Field()
+        self._attrib = _Field()
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, str | None]]) -> None:
+        if self._finished or tag in VOID_ELEMENTS:
+            return
+
+        classes = (dict(attrs).get("class") or "").split()
+
+        if self._stack is None:
+            if tag == "ol" and "quotes" in classes:
+                self._stack = [tag]
+
+            return
+
+        # A list item's end tag can be left out, in which case the next item
+        # closes it (unless the new item is in a list of its own).
+        if tag == "li" and (item := self._item):
+            if not LIST_ELEMENTS.intersection(self._stack[item:]):
+                self.handle_endtag("li")
+
+        self._stack.append(tag)
+        depth = len(self._stack)
+
+        if self._item:
+            self._open_fields(tag, classes, depth)
+
+        elif tag == "li":
+            self._item = depth
+            self._num, self._quote, self._attrib = _Field(), _Field(), _Field()
+
+    def _open_fields(self, tag: str, classes: List[str], depth: int) -> None:
+        # Like BeautifulSoup's find(), only the first matching element counts.
+        if "num" in classes and self._num.parts is None:
+            self._num.open(depth)
+
+        if tag == "blockquote" and self._quote.parts is None:
+            self._quote.open(depth)
+
+        if tag == "div" and "attrib" in classes and self._attrib.parts is None:
+            self._attrib.open(depth)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._finished or not self._stack or tag not in self._stack:
+            return
+
+        # Anything left open inside this element is closed along with it.
+        while self._stack.pop() != tag:
+            self._closed()
+
+        self._closed()
+
+    def handle_data(self, data: str) -> None:
+        if not self._item:
+            return
+
+        for field in (self._num, self._quote):
+            if field.depth and field.parts is not None:
+                field.parts.append(data)
+
+        self._direct_text(data)
+
+    def handle_comment(self, data: str) -> None:
+        # BeautifulSoup counts comments as text when looking at an element's children.
+        if self._item:
+            self._direct_text(data)
+
+    def close(self) -> None:
+        super().close()
+
+        if self._item:
+            self._finish_item()
+
+    def _direct_text(self, data: str) -> None:
+        # Only the text directly inside the attribution is wanted.
+        if not self._attrib.depth or self._attrib.depth != len(self._stack or []):
+            return
+
+        if self._attrib.parts is not None:
+            self._attrib.parts.append(data)
+
+    def _closed(self) -> None:
+        depth = len(self._stack or [])
+
+        for field in (self._num, self._quote, self._attrib):
+            if field.depth > depth:
+                field.depth = 0
+
+        if self._item > depth:
+            self._finish_item()
+
+        if not depth:
+            self._finished = True
+
+    def _finish_item(self) -> None:
+        self._item = 0
+        self.page.items += 1
+
+        num, quote, attrib = self._num.parts, self._quote.parts, self._attrib.parts
+
+        if num is None or quote is None or attrib is None:
+            return
+
+        if _is_serge("".join(attrib)):
+            self.page.quotes.append(("".join(num), "".join(quote)))
+
+
+def _links(html: str) -> Set[int]:
+    return {int(number) for number in PAGE_LINK.findall(html)}
+
+
+def _has_class(name: str) -> str:
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+def _is_serge(attrib_text: str) -> bool:
+    attrib_text = attrib_text.strip("—").strip()
+
+    return attrib_text == "Serge" or attrib_text.startswith("Serge, ")
+
+
+def main() -> None:
+    directory = sys.argv[1] if len(sys.argv) > 1 else "http_cache"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    pages = [entry["body"] for entry in HttpCache.entries_in(directory)]
+
+    if not pages:
+        print(f"No recorded pages in {directory}")
+        return
+
+    expected = [parse_soup(html) for html in pages]
+
+    print(f"Parsing {len(pages)} recorded pages {repeats} times")
+
+    for name, parser in PARSERS.items():
+        results = [parser(html) for html in pages]
+        mismatches = sum(1 for result, page in zip(results, expected) if result != page)
+
+        start = time.perf_counter()
+
+        for _ in range(repeats):
+            for html in pages:
+                parser(html)
+
+        taken = (time.perf_counter() - start) / repeats / len(pages)
+
+        print(f"{name:>8}: {taken * 1000:7.2f}ms per page, {mismatches} pages differ")
+
+
+if __name__ == "__main__":
+    main()
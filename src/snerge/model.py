@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from prosegen import ProseGen
+
+
+class ModelRef:
+    """
+    The live model, which can be replaced by a new one in a single step.
+
+    Anything using the model should read `current` once and use that for the
+    whole of whatever it is doing, so that a swap part way through does not
+    mix the two models; generation that has already started carries on with
+    the model it started with.
+
+    The first model is only a placeholder; `ready` is set once a real one
+    has been published, and nothing should be generated before then.
+    """
+
+    current: ProseGen
+    generation: int
+    created: float
+    ready: asyncio.Event
+
+    def __init__(self, model: ProseGen) -> None:
+        self.current = model
+        self.generation = 0
+        self.created = time.monotonic()
+        self.ready = asyncio.Event()
+
+    @property
+    def version(self) -> str:
+        """Which model is live and how much it has learnt, as "<generation>.<version>"."""
+        return f"{self.generation}.{self.current.version}"
+
+    def publish(self, model: ProseGen) -> None:
+        self.current = model
+        self.generation += 1
+        self.ready.set()
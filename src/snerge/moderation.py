@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Set
+
+import hashlib
+import re
+
+
+# A quote ID, optionally qualified with its source (e.g. "Uno #12").
+# IDs without a source are LRR quotes, from before other sources could be moderated.
+QUOTE_ID = re.compile(r"^(?:(?P<source>[A-Za-z]+) )?#(?P<number>\d+)(?:\s|$)")
+SOURCES = {"lrr": "LRR", "uno": "Uno", "sergisms": "Sergisms"}
+NOT_WORDS = re.compile(r"[^\w\s]+")
+SPACE = re.compile(r"\s+")
+
+
+class ModerationIndex:
+    """
+    Quotes which must never be learnt from, whichever source they come from.
+
+    Entries in the moderation file are one per line, and can be any of:
+
+      - a quote ID, as `#27` (for LRR quotes) or `Uno #12` / `Sergisms #3` / `LRR #27`,
+        optionally followed by the text of the quote as a reminder;
+      - `sha256:<hex>`, the content hash of the normalised text of a quote;
+      - `text: <quote>`, which is hashed when loading.
+
+    Blank lines and lines starting with "# " are ignored.
+    """
+
+    ids: Set[str]
+    hashes: Set[str]
+
+    def __init__(self) -> None:
+        self.ids = set()
+        self.hashes = set()
+
+    @classmethod
+    def load(cls, path: str) -> ModerationIndex:
+        index = cls()
+
+        with open(path, "rt", encoding="utf-8") as handle:
+            for line in handle:
+                index.add_entry(line.strip())
+
+        return index
+
+    def add_entry(self, line: str) -> None:
+        if line.startswith("sha256:"):
+            self.hashes.add(line[7:].strip().lower())
+
+        elif line.startswith("text:"):
+            self.hashes.add(content_hash(line[5:]))
+
+        elif match := QUOTE_ID.match(line):
+            source = match.group("source") or "LRR"
+            source = SOURCES.get(source.lower(), source)
+
+            self.ids.add(f"{source} #{match.group('number')}")
+
+    def is_moderated(self, quote_id: str, quote: str) -> bool:
+        if quote_id in self.ids:
+            return True
+
+        return bool(self.hashes) and content_hash(quote) in self.hashes
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.hashes)
+
+
+def content_hash(quote: str) -> str:
+    """Hashes the text of a quote, ignoring case, punctuation, and spacing."""
+    normalised = SPACE.sub(" ", NOT_WORDS.sub("", quote.lower())).strip()
+
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
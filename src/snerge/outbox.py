@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from enum import IntEnum
+from typing import Callable, Dict, List, Tuple
+
+import asyncio
+import dataclasses
+import itertools
+import time
+
+from twitchio import Channel  # type: ignore
+
+from snerge import log
+from snerge.config import Config
+
+
+# Twitch will not accept messages over 500 characters.
+MAX_MESSAGE_LENGTH = 500
+
+
+class Priority(IntEnum):
+    """The order waiting messages are sent in; lower values go first."""
+
+    # Replies to moderators' commands.
+    REPLY = 0
+    # Guesses being accepted, rejected, and scored.
+    GUESS = 1
+    # SnergeFacts.
+    FACT = 2
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """
+    Allows `capacity` actions at once, and `rate` more each second after that.
+
+    Each action takes a token from the bucket, and the bucket is refilled at a
+    steady rate, up to its capacity; with no tokens left, taking one waits.
+    """
+
+    capacity: float
+    rate: float
+    tokens: float
+
+    _clock: Callable[[], float]
+    _updated: float
+
+    def __init__(
+        self, capacity: float, rate: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    async def take(self) -> None:
+        while True:
+            now = self._clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclasses.dataclass
+class _Pending:
+    text: str
+    mentions: List[str]
+
+    def render(self) -> str:
+        return " ".join([*self.mentions, self.text])
+
+
+class Outbox:
+    """
+    The messages waiting to be sent to a channel.
+
+    Messages are queued without waiting, and sent by a background task as fast
+    as Twitch's rate limit allows, most important first. While a reply is
+    waiting, the same reply to someone else is folded into it, so a flood of
+    bad guesses gets one "Positive whole numbers only" rather than one each.
+
+    `limit` is the (messages, seconds) Twitch allows in any window; the bucket
+    holds `burst` of them, and refills slowly enough that a full bucket plus a
+    window's worth of refills never goes over the limit.
+    """
+
+    logger: log.Logger
+    channel: Channel
+    bucket: TokenBucket
+    queue: asyncio.PriorityQueue[Tuple[int, int, _Pending]]
+
+    _coalescing: Dict[str, List[_Pending]]
+    _sequence: itertools.count[int]
+    _task: asyncio.Task[None] | None = None
+
+    def __init__(
+        self, logger: log.Logger, channel: Channel, limit: Tuple[int, int], burst: int
+    ) -> None:
+        messages, window = limit
+
+        self.logger = logger
+        self.channel = channel
+        self.bucket = TokenBucket(burst, (messages - burst) / window)
+        self.queue = asyncio.PriorityQueue()
+        self._coalescing = {}
+        self._sequence = itertools.count()
+
+    @classmethod
+    def from_config(cls, logger: log.Logger, channel: Channel, settings: Config) -> Outbox:
+        return cls(logger, channel, settings.chat_rate_limit, settings.chat_burst)
+
+    def send(self, text: str, priority: Priority = Priority.REPLY) -> None:
+        self._put(priority, _Pending(text, []))
+
+    def mention(self, mention: str, text: str, priority: Priority = Priority.REPLY) -> None:
+        """Queues a reply to someone, folded into the same reply if one is still waiting."""
+        waiting = self._coalescing.setdefault(text, [])
+
+        if any(mention in pending.mentions for pending in waiting):
+            return
+
+        if waiting and len(waiting[-1].render()) + len(mention) < MAX_MESSAGE_LENGTH:
+            waiting[-1].mentions.append(mention)
+            return
+
+        pending = _Pending(text, [mention])
+        waiting.append(pending)
+        self._put(priority, pending)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run(), name=f"outbox-{self.channel.name}")
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for every queued message to be sent.
+
+        :return: Whether the queue was emptied in time.
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(
+                "Gave up waiting to send %d messages to %s",
+                self.queue.qsize(),
+                self.channel.name,
+            )
+            return False
+
+        return True
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self) -> None:
+        while True:
+            # Waiting for the rate limit first means the message is picked (and
+            # stops collecting mentions) only once it can actually be sent.
+            await self.bucket.take()
+            _, _, pending = await self.queue.get()
+
+            if pending.mentions:
+                self._stop_coalescing(pending)
+
+            try:
+                await self.channel.send(pending.render())
+            except Exception:  # pylint: disable=broad-except
+                self.logger.exception("Failed to send to %s", self.channel.name)
+            finally:
+                self.queue.task_done()
+
+    def _stop_coalescing(self, pending: _Pending) -> None:
+        waiting = self._coalescing[pending.text]
+        waiting.remove(pending)
+
+        if not waiting:
+            del self._coalescing[pending.text]
+
+    def _put(self, priority: Priority, pending: _Pending) -> None:
+        self.queue.put_nowait((priority, next(self._sequence), pending))
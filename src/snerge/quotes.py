@@ -5,44 +5,188 @@
 
 from __future__ import annotations
 
-from typing import AsyncGenerator, List, Tuple
+from typing import AsyncGenerator, Container, Dict, List, Tuple
 
 import asyncio
 import csv
+import dataclasses
 import json
+import os
 import re
 
 import aiohttp
 
 from aiostream import stream
-from bs4 import BeautifulSoup, NavigableString, Tag
 
 from prosegen import ProseGen
 from snerge import log
+from snerge.config import config
+from snerge.lrr import LrrScraper
+from snerge.moderation import QUOTE_ID, ModerationIndex
+from snerge.snapshot import ModelSnapshots, build_key
 from snerge.util import SetEncoder
 
 
 StringGen = AsyncGenerator[Tuple[str, str], None]
+Quotes = List[Tuple[str, str]]
+
+# The files (tracked in the repository) each local source is loaded from by default.
+SOURCE_FILES = {"Uno": "quotes.csv", "Sergisms": "sergisms.csv"}
+# The order the sources are taught to the model in, so that builds are repeatable.
+SOURCE_ORDER = ["Sergisms", "Uno", "LRR"]
+
+UNO_QUOTES = "https://raw.githubusercontent.com/RebelliousUno/BrewCrewQuoteDB/main/quotes.csv"
+UNO_FIELDS = ["id", "date", "author", "quote"]
+
+
+async def load_data(  # pylint: disable=too-many-arguments
+    logger: log.Logger,
+    instance: ProseGen,
+    moderation_file: str = "moderate.txt",
+    *,
+    scraper: LrrScraper | None = None,
+    marks: Dict[str, int] | None = None,
+    snapshots: ModelSnapshots | None = None,
+    sources: Dict[str, str] | None = None,
+) -> ProseGen:
+    """
+    Teaches an empty model every quote, in a fixed order.
+
+    The model is built in a worker thread, so the loop carries on while it
+    is; nothing else may use `instance` until it is returned.
+
+    If `snapshots` is given and a model has already been built from exactly
+    the same inputs, that model is returned in place of `instance`. A model
+    built without some of the LRR pages is not saved as a snapshot, so that
+    the next build tries for the whole corpus again.
+
+    `sources` overrides where the local sources are read from (by default,
+    `SOURCE_FILES`).
+    """
+    moderation = ModerationIndex.load(moderation_file)
+    logger.info("Loaded %d entries into the moderation index", len(moderation))
+
+    marks = {} if marks is None else marks
+    sources = sources or SOURCE_FILES
+    scraper = scraper or LrrScraper(logger)
+    quotes = await load_quotes(logger, scraper, sources)
+
+    for quote_id, _ in quotes:
+        _mark(marks, quote_id)
+
+    files = [*sources.values(), moderation_file]
+    lrr = [(quote_id, quote) for quote_id, quote in quotes if _source(quote_id) == "LRR"]
+    key = build_key(instance, files, lrr)
+
+    if snapshots and (snapshot := await snapshots.load(key)):
+        return snapshot
+
+    skipped = await asyncio.get_running_loop().run_in_executor(
+        None, teach, instance, moderation, marks, quotes
+    )
+
+    logger.info("Skipped %d moderated quotes", skipped)
+    logger.info("Merged %d near-duplicate quotes", instance.duplicates)
+    logger.info("Built model %s", key)
+
+    if not scraper.complete:
+        logger.warning("Some LRR quote pages could not be loaded; not saving a snapshot")
+    elif snapshots:
+        await snapshots.save(key, instance)
+
+    return instance
 
 
-async def load_data(logger: log.Logger, instance: ProseGen) -> ProseGen:
+async def load_quotes(
+    logger: log.Logger,
+    scraper: LrrScraper | None = None,
+    sources: Dict[str, str] | None = None,
+) -> Quotes:
+    """
+    Loads every quote from every source.
+
+    The sources are loaded at the same time, so the quotes arrive in whatever
+    order the network gives; they are sorted into source and then quote number
+    order before being returned.
+    """
+    quotes: Quotes = []
+    sources = sources or SOURCE_FILES
     combined = stream.merge(
-        load_sergisms(logger), load_uno_quotes(logger), load_lrr_quotes(logger)
+        load_sergisms(logger, sources["Sergisms"]),
+        load_uno_quotes(logger, sources["Uno"]),
+        load_lrr_quotes(logger, scraper),
     )
 
     async with combined.stream() as streamer:
         async for quote_id, quote in streamer:
-            instance.add_knowledge(quote, source=quote_id)
+            quotes.append((quote_id, quote))
 
-    return instance
+    quotes.sort(key=lambda item: (_order(item[0]), item[1]))
+
+    return quotes
+
+
+def teach(
+    instance: ProseGen, moderation: ModerationIndex, marks: Dict[str, int], quotes: Quotes
+) -> int:
+    """Teaches the model each of the quotes in turn, returning how many were moderated."""
+    return sum(
+        not ingest(instance, moderation, marks, quote_id, quote) for quote_id, quote in quotes
+    )
+
+
+def ingest(
+    instance: ProseGen,
+    moderation: ModerationIndex,
+    marks: Dict[str, int],
+    quote_id: str,
+    quote: str,
+) -> bool:
+    """
+    Teaches the model a quote, unless it has been moderated.
+
+    `marks` is updated with the highest quote number seen from each source,
+    whether or not the quote was learnt.
+    """
+    _mark(marks, quote_id)
+
+    if moderation.is_moderated(quote_id, quote):
+        return False
+
+    instance.add_knowledge(quote, source=quote_id)
+
+    return True
+
+
+def _mark(marks: Dict[str, int], quote_id: str) -> None:
+    if match := QUOTE_ID.match(quote_id):
+        source, number = match.group("source") or "LRR", int(match.group("number"))
+        marks[source] = max(marks.get(source, 0), number)
 
 
-async def load_uno_quotes(logger: log.Logger) -> StringGen:
+def _source(quote_id: str) -> str | None:
+    match = QUOTE_ID.match(quote_id)
+
+    return (match.group("source") or "LRR") if match else None
+
+
+def _order(quote_id: str) -> Tuple[int, int, str]:
+    # Anything from an unknown source goes after the known ones.
+    if not (match := QUOTE_ID.match(quote_id)):
+        return (len(SOURCE_ORDER), 0, quote_id)
+
+    source = match.group("source") or "LRR"
+    rank = SOURCE_ORDER.index(source) if source in SOURCE_ORDER else len(SOURCE_ORDER)
+
+    return (rank, int(match.group("number")), quote_id)
+
+
+async def load_uno_quotes(logger: log.Logger, path: str = SOURCE_FILES["Uno"]) -> StringGen:
     logger.info("Loading quotes from Uno-db")
     line: dict[str, str]
     count = 0
 
-    with open("quotes.csv", "r", encoding="utf-8") as quotes:
+    with open(path, "r", encoding="utf-8") as quotes:
         reader = csv.DictReader(quotes)
 
         for line in reader:
@@ -52,12 +196,14 @@ async def load_uno_quotes(logger: log.Logger) -> StringGen:
     logger.info("Added %d Uno quotes", count)
 
 
-async def load_sergisms(logger: log.Logger) -> StringGen:
+async def load_sergisms(
+    logger: log.Logger, path: str = SOURCE_FILES["Sergisms"]
+) -> StringGen:
     logger.info("Loading quotes from Sergisms")
     line: dict[str, str]
     count = 0
 
-    with open("sergisms.csv", "r", encoding="utf-8") as quotes:
+    with open(path, "r", encoding="utf-8") as quotes:
         reader = csv.DictReader(quotes)
 
         for line in reader:
@@ -67,103 +213,201 @@ async def load_sergisms(logger: log.Logger) -> StringGen:
     logger.info("Added %d Sergisms", count)
 
 
-async def load_lrr_quotes(logger: log.Logger) -> StringGen:
-    exclude = []
+async def load_lrr_quotes(
+    logger: log.Logger,
+    scraper: LrrScraper | None = None,
+    known: Container[str] = frozenset(),
+    *,
+    revalidate: bool = False,
+) -> StringGen:
     count = 0
+    scraper = scraper or LrrScraper(logger)
 
-    with open("moderate.txt", "rt", encoding="utf-8") as handle:
-        for line in handle:
-            line = line.strip()
-            _id, _ = line.split(" ", 1)
-            exclude.append(_id)
+    async for quote_id, quote in scraper.quotes(known, revalidate=revalidate):
+        count += 1
+        yield quote_id, quote
 
-    logger.info("Added %d quotes to the LRR exclude list", len(exclude))
+    logger.info("Added %d LRR quotes", count)
 
-    async with aiohttp.ClientSession() as session:
-        combined = stream.merge(
-            *[load_lrr_quote_page(logger, session, page, exclude) for page in range(1, 18)]
-        )
-        async with combined.stream() as streamer:
-            async for quote_id, quote in streamer:
-                count += 1
-                yield f"LRR {quote_id}", quote
 
-    logger.info("Added %d LRR quotes", count)
+@dataclasses.dataclass
+class QuoteListChanges:
+    """The IDs (e.g. "Uno #12") of quotes which changed in a sync of the Uno quote list."""
 
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
 
-async def load_lrr_quote_page(
-    logger: log.Logger, session: aiohttp.ClientSession, page: int, exclude: List[str]
-) -> StringGen:
-    logger.info("Loading LRR quote page %d", page)
-    html = await session.get(
-        f"https://lrrbot.com/quotes/search?q=serge&mode=name&page={page}"
-    )
-    soup = BeautifulSoup(await html.text(), "html.parser")
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
 
-    quotes = soup.find("ol", class_="quotes")
 
-    if not quotes or not isinstance(quotes, Tag):
-        return
+async def download_new_quote_list(
+    session: aiohttp.ClientSession,
+    path: str = "quotes.csv",
+    validators: Dict[str, str] | None = None,
+) -> QuoteListChanges:
+    """
+    Updates the local copy of the Uno quote list, one row at a time.
 
-    for quote in quotes.find_all("li"):
-        quote_id = quote.find(class_="num").text
+    Only Serge's quotes are kept. The file is only replaced (atomically) if
+    something in it has changed.
 
-        if quote_id in exclude:
-            continue
+    If `validators` is given, it holds the ETag/Last-Modified headers of the
+    last download, and they are sent so that an unchanged list is not
+    downloaded again; it is updated after each download.
+    """
+    existing = {}
 
-        quote_text = quote.find("blockquote").text
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8", newline="") as quotes:
+            existing = {line["id"]: line for line in csv.DictReader(quotes)}
 
-        attrib = quote.find("div", class_="attrib")
-        attrib_text = "".join(
-            element for element in attrib if isinstance(element, NavigableString)
-        )
-        attrib_text = attrib_text.strip("—").strip()
+    headers = _conditional_headers(validators) if existing and validators else {}
 
-        if attrib_text == "Serge" or attrib_text.startswith("Serge, "):
-            yield quote_id, quote_text
+    async with session.get(UNO_QUOTES, headers=headers) as response:
+        if response.status == 304:
+            return QuoteListChanges([], [], [])
 
+        response.raise_for_status()
 
-async def download_new_quote_list(session: aiohttp.ClientSession) -> None:
-    response = await session.get(
-        "https://raw.githubusercontent.com/RebelliousUno/BrewCrewQuoteDB/main/quotes.csv"
-    )
+        # The new list is written alongside the old one, and only moved into
+        # place once it is complete; if anything goes wrong, it is thrown away.
+        try:
+            changes = await _write_quote_list(response, path + ".tmp", existing)
 
-    data = (await response.text(encoding="utf-8")).split("\n")
+            if changes:
+                os.replace(path + ".tmp", path)
+        finally:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
 
-    line: dict[str, str]
-    reader = csv.DictReader(data[1:], next(csv.reader([data[0]])), escapechar=None)
-    matcher = re.compile(r'"\\s*-\\s*[^,]+,')
+        if validators is not None:
+            validators.clear()
+            validators.update(
+                {
+                    name: response.headers[name]
+                    for name in ("ETag", "Last-Modified")
+                    if name in response.headers
+                }
+            )
+
+    return changes
 
-    with open("quotes.csv", "w", encoding="utf-8") as quotes:
-        writer = csv.DictWriter(quotes, ["id", "date", "author", "quote"])
+
+async def _write_quote_list(
+    response: aiohttp.ClientResponse, path: str, existing: Dict[str, Dict[str, str]]
+) -> QuoteListChanges:
+    changes = QuoteListChanges([], [], [])
+    seen = set()
+
+    with open(path, "w", encoding="utf-8", newline="") as quotes:
+        writer = csv.DictWriter(quotes, UNO_FIELDS)
         writer.writeheader()
-        for line in reader:
-            if line["id"] == "'-1":
+
+        async for upstream in _stream_csv(response.content):
+            line = _filter_uno_line(upstream)
+
+            if not line:
                 continue
 
-            # Fix up double CSV-quoting by reparsing the fields.
-            line = {k: next(csv.reader([v], escapechar=None))[0] for k, v in line.items()}
+            writer.writerow(line)
+            seen.add(line["id"])
 
-            author = line["author"].lower()
+            if line["id"] not in existing:
+                changes.added.append(f"Uno #{line['id']}")
+            elif existing[line["id"]] != line:
+                changes.changed.append(f"Uno #{line['id']}")
 
-            # ignore anything with multiple attributions.
-            if " and " in author or matcher.match(line["quote"]):
-                continue
+    changes.removed = [f"Uno #{quote_id}" for quote_id in existing if quote_id not in seen]
 
-            # Ignore anything not from Serge (or feedback from Snerge)
-            if not author.startswith(("serge", "snerge")):
-                continue
+    return changes
 
-            # Ignore purely action lines
-            if '"' not in line["quote"]:
-                continue
 
-            # Sometimes people use fancy quotes
-            line["quote"] = line["quote"].replace("’", "'")
-            line["quote"] = clean_quote(line["quote"]) or ""
+def _conditional_headers(validators: Dict[str, str]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+
+    if "ETag" in validators:
+        headers["If-None-Match"] = validators["ETag"]
+    if "Last-Modified" in validators:
+        headers["If-Modified-Since"] = validators["Last-Modified"]
+
+    return headers
+
+
+async def _stream_csv(content: aiohttp.StreamReader) -> AsyncGenerator[Dict[str, str], None]:
+    header: List[str] | None = None
+    record = ""
+
+    async for raw in content:
+        record += raw.decode("utf-8")
+
+        # A record can span lines, if there is a newline inside a quoted field.
+        if _is_incomplete(record):
+            continue
+
+        values = next(csv.reader([record], escapechar=None), [])
+        record = ""
+
+        if header is None:
+            header = values
+        elif values:
+            yield dict(zip(header, values))
+
+    if header and record:
+        yield dict(zip(header, next(csv.reader([record], escapechar=None), [])))
 
-            if line["quote"]:
-                writer.writerow(line)
+
+def _is_incomplete(record: str) -> bool:
+    # An even number of quotes can not leave a quoted field open, which saves
+    # checking most records properly.
+    if not record.count('"') % 2:
+        return False
+
+    try:
+        next(csv.reader([record], escapechar=None, strict=True), None)
+    except csv.Error:
+        return True
+
+    return False
+
+
+def _filter_uno_line(line: Dict[str, str]) -> Dict[str, str] | None:
+    matcher = re.compile(r'"\\s*-\\s*[^,]+,')
+
+    if line.get("id") == "'-1":
+        return None
+
+    # Fix up double CSV-quoting by reparsing the fields.
+    line = {k: _unquote(v or "") for k, v in line.items() if k in UNO_FIELDS}
+
+    author = line["author"].lower()
+
+    # ignore anything with multiple attributions.
+    if " and " in author or matcher.match(line["quote"]):
+        return None
+
+    # Ignore anything not from Serge (or feedback from Snerge)
+    if not author.startswith(("serge", "snerge")):
+        return None
+
+    # Ignore purely action lines
+    if '"' not in line["quote"]:
+        return None
+
+    # Sometimes people use fancy quotes
+    line["quote"] = line["quote"].replace("’", "'")
+    line["quote"] = clean_quote(line["quote"]) or ""
+
+    return line if line["quote"] else None
+
+
+def _unquote(value: str) -> str:
+    # Reparsing a field is only needed if it has quotes (or commas) in it.
+    if '"' not in value and "," not in value:
+        return value
+
+    return next(csv.reader([value], escapechar=None), [""])[0]
 
 
 def clean_quote(quote: str) -> str | None:
@@ -185,13 +429,17 @@ def clean_quote(quote: str) -> str | None:
 async def main() -> None:
     log.init()
     logger = log.get_logger()
+    scraper = LrrScraper.from_config(logger, config())
 
     with open("loaded_lrr_quotes.txt", "wt", encoding="utf-8") as handle:
-        async for quote_id, quote in load_lrr_quotes(logger):
+        async for quote_id, quote in load_lrr_quotes(logger, scraper):
             handle.write(f"{quote_id}, {quote}\n")
 
     dataset = ProseGen(20)
-    await load_data(logger, dataset)
+    await load_data(logger, dataset, scraper=scraper)
+
+    if scraper.cache:
+        await scraper.cache.wait()
 
     with open("parsed_state.json", "wt", encoding="utf-8") as handle:
         json.dump(dataset.dictionary, handle, cls=SetEncoder, indent=2)
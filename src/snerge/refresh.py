@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Dict, List
+
+import asyncio
+import csv
+import os
+import shutil
+
+import aiohttp
+
+from aiostream import stream
+
+from prosegen import ProseGen
+from snerge import log
+from snerge.lrr import LrrScraper
+from snerge.model import ModelRef
+from snerge.moderation import QUOTE_ID, ModerationIndex
+from snerge.quotes import (
+    SOURCE_FILES,
+    QuoteListChanges,
+    StringGen,
+    download_new_quote_list,
+    ingest,
+    load_data,
+    load_lrr_quotes,
+    load_sergisms,
+    load_uno_quotes,
+)
+from snerge.snapshot import ModelSnapshots
+
+
+class CorpusRefresher:  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps the model up to date with new quotes while the bot is running.
+
+    The highest quote number seen from each source is remembered, and each
+    refresh only teaches the model quotes with higher numbers. The local CSV
+    files are only re-read if they have changed, and the LRR search stops at
+    the first page with a quote that has been seen before, so (after the first)
+    a refresh with nothing new costs a single conditional request to each
+    remote source. The Uno quote list is fetched through one session, kept
+    open between refreshes.
+
+    The downloaded Uno quote list is kept in `downloads`, and read from there
+    from then on; the copy of it tracked in the repository is never rewritten.
+
+    Anything derived from the model is keyed on its version, which adding
+    quotes moves on, so nothing else needs to be told about the new quotes.
+
+    The model can also be rebuilt from scratch (for example, to forget newly
+    moderated quotes) without stopping the bot: the new model is built on its
+    own, and then published in place of the old one. Builds from unchanged
+    inputs are loaded from `snapshots`, if given, rather than being rebuilt.
+    """
+
+    logger: log.Logger
+    model: ModelRef
+    scraper: LrrScraper
+    moderation_file: str
+    interval: float
+    snapshots: ModelSnapshots | None
+    downloads: str
+    marks: Dict[str, int]
+
+    _mtimes: Dict[str, float]
+    _lock: asyncio.Lock
+    _uno_validators: Dict[str, str]
+    _session: aiohttp.ClientSession | None = None
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        logger: log.Logger,
+        model: ModelRef,
+        scraper: LrrScraper,
+        *,
+        moderation_file: str = "moderate.txt",
+        interval: float = 3600.0,
+        snapshots: ModelSnapshots | None = None,
+        downloads: str = "model_cache",
+    ) -> None:
+        self.logger = logger
+        self.model = model
+        self.scraper = scraper
+        self.moderation_file = moderation_file
+        self.interval = interval
+        self.snapshots = snapshots
+        self.downloads = downloads
+        self.marks = {}
+        self._mtimes = {}
+        self._lock = asyncio.Lock()
+        self._uno_validators = {}
+
+    async def run(self) -> None:
+        """Builds the model from the whole corpus, then refreshes it every `interval` seconds."""
+        await self.rebuild()
+        await self.refresh_forever()
+
+    async def refresh_forever(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+
+                try:
+                    await self.refresh()
+                except (OSError, csv.Error, aiohttp.ClientError, asyncio.TimeoutError):
+                    self.logger.warning("Failed to refresh the quotes", exc_info=True)
+        finally:
+            await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if not self._session or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.scraper.timeout)
+            )
+
+        return self._session
+
+    @property
+    def sources(self) -> Dict[str, str]:
+        """Where each local source is currently read from."""
+        uno = os.path.join(self.downloads, SOURCE_FILES["Uno"])
+
+        return {**SOURCE_FILES, "Uno": uno} if os.path.exists(uno) else SOURCE_FILES
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+
+    async def rebuild(self) -> str:
+        """
+        Builds a new model from the whole corpus, and makes it the live one.
+
+        :return: The version of the new model.
+        """
+        async with self._lock:
+            old = self.model.current
+            model = ProseGen(old.size, merge_duplicates=bool(old.near_duplicates))
+            marks: Dict[str, int] = {}
+            sources = self.sources
+            mtimes = {source: _mtime(path) for source, path in sources.items()}
+
+            self.logger.info("Rebuilding the model")
+            model = await load_data(
+                self.logger,
+                model,
+                self.moderation_file,
+                scraper=self.scraper,
+                marks=marks,
+                snapshots=self.snapshots,
+                sources=sources,
+            )
+
+            self.model.publish(model)
+            self.marks, self._mtimes = marks, mtimes
+
+        self.logger.info("Published model version %s", self.model.version)
+
+        return self.model.version
+
+    async def refresh(self) -> int:
+        """
+        Teaches the model any quotes added since the last refresh.
+
+        The model can not forget what it has been taught, so if any Uno quotes
+        were edited or removed upstream, it is rebuilt instead.
+        """
+        async with self._lock:
+            changes = await self._sync_uno()
+
+            if not (changes.changed or changes.removed):
+                return await self._refresh()
+
+        await self.rebuild()
+
+        return len(changes.added)
+
+    async def _refresh(self) -> int:
+        moderation = ModerationIndex.load(self.moderation_file)
+        model = self.model.current
+
+        # The marks move as quotes are learnt, so what counts as seen is fixed first.
+        seen = _Seen(dict(self.marks))
+        added = 0
+
+        sources: List[StringGen] = [
+            load_lrr_quotes(self.logger, self.scraper, seen, revalidate=True)
+        ]
+
+        if self._changed("Uno"):
+            sources.append(load_uno_quotes(self.logger, self.sources["Uno"]))
+        if self._changed("Sergisms"):
+            sources.append(load_sergisms(self.logger, self.sources["Sergisms"]))
+
+        async with stream.merge(*sources).stream() as streamer:
+            async for quote_id, quote in streamer:
+                if quote_id in seen:
+                    continue
+
+                if ingest(model, moderation, self.marks, quote_id, quote):
+                    added += 1
+                    self.logger.info("Learnt new quote %s: %s", quote_id, quote)
+
+        self.logger.info(
+            "Refreshed quotes: %d new, model version %s", added, self.model.version
+        )
+
+        return added
+
+    async def _sync_uno(self) -> QuoteListChanges:
+        path = os.path.join(self.downloads, SOURCE_FILES["Uno"])
+
+        # The first download is compared with the tracked list, so that quotes
+        # edited or removed upstream since it was committed are still noticed.
+        if not os.path.exists(path):
+            os.makedirs(self.downloads, exist_ok=True)
+            shutil.copyfile(SOURCE_FILES["Uno"], path)
+
+        try:
+            changes = await download_new_quote_list(
+                self.session, path, validators=self._uno_validators
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.logger.warning("Failed to download the Uno quotes", exc_info=True)
+            return QuoteListChanges([], [], [])
+
+        if changes.changed or changes.removed:
+            self.logger.info(
+                "Uno quotes changed upstream: %s, removed upstream: %s; rebuilding the model",
+                ", ".join(changes.changed) or "none",
+                ", ".join(changes.removed) or "none",
+            )
+
+        return changes
+
+    def _changed(self, source: str) -> bool:
+        mtime = _mtime(self.sources[source])
+
+        if mtime == self._mtimes.get(source):
+            return False
+
+        self._mtimes[source] = mtime
+        return True
+
+
+class _Seen:  # pylint: disable=too-few-public-methods
+    """Quote IDs at or below the high-water mark of their source."""
+
+    marks: Dict[str, int]
+
+    def __init__(self, marks: Dict[str, int]) -> None:
+        self.marks = marks
+
+    def __contains__(self, quote_id: object) -> bool:
+        if not isinstance(quote_id, str) or not (match := QUOTE_ID.match(quote_id)):
+            return False
+
+        source = match.group("source") or "LRR"
+
+        return int(match.group("number")) <= self.marks.get(source, 0)
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
@@ -5,10 +5,20 @@
 
 from __future__ import annotations
 
+from .control import ControlHandler, when_ready
 from .oauth import OAuthHandler
 from .eventsub import EventHandler
+from .eventsocket import EventSubSocket
 from .predict import PredictHandler
 from .whence import WhenceHandler
 
 
-__all__ = ["OAuthHandler", "EventHandler", "PredictHandler", "WhenceHandler"]
+__all__ = [
+    "ControlHandler",
+    "OAuthHandler",
+    "EventHandler",
+    "EventSubSocket",
+    "PredictHandler",
+    "WhenceHandler",
+    "when_ready",
+]
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Dict
+
+import dataclasses
+import gzip
+import hashlib
+
+from aiohttp.web import Request, Response
+
+try:
+    import brotli  # type: ignore # pylint: disable=import-error
+except ImportError:
+    brotli = None
+
+
+# Preferred order of content encodings, if the client accepts more than one.
+ENCODINGS = ["br", "gzip"]
+
+
+@dataclasses.dataclass
+class CachedBody:
+    """A response body, encoded once and then served any number of times."""
+
+    content_type: str
+    body: bytes
+    etag: str
+    encoded: Dict[str, bytes]
+
+    @classmethod
+    def build(cls, content_type: str, body: bytes) -> CachedBody:
+        encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+
+        if brotli:
+            encoded["br"] = brotli.compress(body)
+
+        # Only keep the encodings that actually save us something.
+        encoded = {name: data for name, data in encoded.items() if len(data) < len(body)}
+
+        return cls(content_type, body, hashlib.sha256(body).hexdigest()[:32], encoded)
+
+    def respond(self, request: Request, cache_control: str = "no-cache") -> Response:
+        encoding = self.negotiate(request.headers.get("Accept-Encoding", ""))
+
+        # Each encoding is a different representation, so needs its own strong tag.
+        etag = f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if request.if_none_match and any(
+            tag.value == "*" or f'"{tag.value}"' == etag for tag in request.if_none_match
+        ):
+            return Response(status=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        return Response(
+            status=200,
+            headers=headers,
+            content_type=self.content_type,
+            body=self.encoded[encoding] if encoding else self.body,
+        )
+
+    def negotiate(self, accept_encoding: str) -> str:
+        accepted: Dict[str, float] = {}
+
+        for item in accept_encoding.split(","):
+            name, _, params = item.strip().partition(";")
+            quality = 1.0
+
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+
+            accepted[name.strip().lower()] = quality
+
+        for encoding in ENCODINGS:
+            if encoding in self.encoded and accepted.get(encoding, 0.0) > 0:
+                return encoding
+
+        return ""
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Awaitable, Callable, Optional
+
+import asyncio
+import hmac
+import json
+
+from aiohttp.web import Request, Response, StreamResponse
+
+from snerge import log
+from snerge.model import ModelRef
+from snerge.refresh import CorpusRefresher
+from snerge.token import App
+
+
+Handler = Callable[[Request], Awaitable[StreamResponse]]
+
+
+def when_ready(model: ModelRef, handler: Handler) -> Handler:
+    """Wraps a handler which uses the model, so that it is unavailable until the model is built."""
+
+    async def handle(request: Request) -> StreamResponse:
+        if not model.ready.is_set():
+            return Response(
+                status=503,
+                headers={"Retry-After": "10"},
+                content_type="text/plain",
+                text="Snerge is still waking up",
+            )
+
+        return await handler(request)
+
+    return handle
+
+
+class ControlHandler:
+    """
+    Lets the operator rebuild the model without restarting the bot.
+
+    Requests must carry the webhook secret as a bearer token.
+    """
+
+    logger: log.Logger
+    app: App
+    model: ModelRef
+    refresher: CorpusRefresher
+
+    _rebuild: Optional[asyncio.Task[str]] = None
+
+    def __init__(
+        self, logger: log.Logger, app: App, model: ModelRef, refresher: CorpusRefresher
+    ) -> None:
+        self.logger = logger
+        self.app = app
+        self.model = model
+        self.refresher = refresher
+
+    async def get_version(self, request: Request) -> Response:
+        if not self.authorised(request):
+            return Response(status=401, content_type="text/plain", text="Unauthorised")
+
+        return self.status(200)
+
+    async def rebuild(self, request: Request) -> Response:
+        """Starts building a new model, which replaces the live one once it is ready."""
+        if not self.authorised(request):
+            return Response(status=401, content_type="text/plain", text="Unauthorised")
+
+        if self._rebuild and not self._rebuild.done():
+            return self.status(409)
+
+        self.logger.info("Model rebuild requested")
+        self._rebuild = asyncio.create_task(self.refresher.rebuild())
+        self._rebuild.add_done_callback(self._rebuilt)
+
+        return self.status(202)
+
+    def status(self, code: int) -> Response:
+        return Response(
+            status=code,
+            headers={"X-Model-Version": self.model.version},
+            content_type="application/json",
+            text=json.dumps(
+                {
+                    "version": self.model.version,
+                    "rebuilding": bool(self._rebuild and not self._rebuild.done()),
+                }
+            ),
+        )
+
+    def authorised(self, request: Request) -> bool:
+        expected = b"Bearer " + self.app.webhook_secret
+        given = request.headers.get("Authorization", "").encode("utf-8")
+
+        return bool(self.app.webhook_secret) and hmac.compare_digest(given, expected)
+
+    def _rebuilt(self, task: asyncio.Task[str]) -> None:
+        if not task.cancelled() and (error := task.exception()):
+            self.logger.error("Model rebuild failed", exc_info=error)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+import asyncio
+import json
+
+import aiohttp
+
+from snerge import log
+from snerge.twitch import TwitchClient
+
+from .eventsub import EventHandler, TwitchEvent
+
+
+EVENTSUB_WS_URL = "wss://eventsub.wss.twitch.tv/ws"
+
+# How long (in seconds) to wait for the welcome message on a new connection.
+WELCOME_TIMEOUT = 10.0
+# How much longer than the keepalive interval to wait before giving up on a connection.
+KEEPALIVE_GRACE = 5.0
+# How long (in seconds) to read what is left on an old connection after moving to a new one.
+DRAIN_TIMEOUT = 1.0
+# The shortest and longest waits (in seconds) before connecting again after losing the connection.
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 120.0
+
+
+class SessionLost(Exception):
+    """Raised when the connection to Twitch closes, or goes quiet, without warning."""
+
+
+Message = Dict[str, Any]
+Socket = aiohttp.ClientWebSocketResponse
+
+
+class EventSubSocket:
+    """
+    Receives EventSub notifications over one long-lived WebSocket, in place of the webhook.
+
+    On connecting, Twitch sends a welcome with a session ID, and the events are
+    subscribed to for that session. Twitch then sends a keepalive whenever the
+    connection has been quiet for the interval given in the welcome; if nothing
+    arrives for longer than that, the connection is dropped and a new session
+    started. When Twitch asks the bot to move to a new URL, the new connection
+    is opened (keeping the session, and its subscriptions) before the old one is
+    closed, so nothing is lost in between.
+
+    Notifications are passed to the EventHandler, and so processed (and
+    de-duplicated) exactly as those arriving at the webhook are.
+    """
+
+    logger: log.Logger
+    handler: EventHandler
+    client: TwitchClient
+    username: str
+    url: str
+
+    session_id: Optional[str] = None
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        logger: log.Logger,
+        handler: EventHandler,
+        client: TwitchClient,
+        username: str,
+        url: str = EVENTSUB_WS_URL,
+    ) -> None:
+        self.logger = logger
+        self.handler = handler
+        self.client = client
+        self.username = username
+        self.url = url
+
+    async def run(self) -> None:
+        delay = RETRY_DELAY
+
+        while True:
+            try:
+                await self.connect()
+            except (aiohttp.ClientError, asyncio.TimeoutError, SessionLost) as error:
+                self.logger.warning("EventSub connection lost: %s", error)
+            except Exception:  # pylint: disable=broad-except
+                self.logger.exception("EventSub connection failed")
+
+            # Only back off further if the last attempt never got as far as a session.
+            if self.session_id:
+                delay = RETRY_DELAY
+
+            self.session_id = None
+            self.logger.info("Connecting to EventSub again in %.0f seconds", delay)
+            await asyncio.sleep(delay)
+
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def connect(self) -> None:
+        """Starts a new session, and receives events until the connection is lost."""
+        socket, keepalive = await self._open(self.url)
+
+        try:
+            await self._register()
+
+            while reconnect_url := await self._listen(socket, keepalive):
+                self.logger.info("Moving EventSub connection to %s", reconnect_url)
+                old = socket
+                socket, keepalive = await self._open(reconnect_url)
+
+                await self._drain(old)
+        finally:
+            await socket.close()
+
+    async def _register(self) -> None:
+        try:
+            await self.handler.register(self.username, self.session_id)
+        except Exception as error:
+            # A session that was never subscribed to does not count as connecting.
+            self.session_id = None
+            raise SessionLost(f"Unable to subscribe to events: {error!r}") from error
+
+    async def _open(self, url: str) -> Tuple[Socket, float]:
+        socket = await self.client.session.ws_connect(url)
+
+        try:
+            welcome = await self._receive(socket, WELCOME_TIMEOUT)
+            self.session_id, keepalive = _welcome(welcome)
+        except BaseException:
+            await socket.close()
+            raise
+
+        self.logger.info("EventSub session %s connected", self.session_id)
+
+        return socket, keepalive + KEEPALIVE_GRACE
+
+    async def _listen(self, socket: Socket, timeout: float) -> str:
+        """Receives messages until Twitch asks for a new connection, returning its URL."""
+        while True:
+            message = await self._receive(socket, timeout)
+
+            if reconnect_url := await self._handle(message):
+                return reconnect_url
+
+    async def _drain(self, socket: Socket) -> None:
+        # Anything sent on the old connection before Twitch closed it is still wanted.
+        try:
+            while True:
+                await self._handle(await self._receive(socket, DRAIN_TIMEOUT))
+        except SessionLost:
+            pass
+        finally:
+            await socket.close()
+
+    async def _handle(self, message: Message) -> str | None:
+        metadata = message["metadata"]
+        message_type = metadata.get("message_type")
+
+        try:
+            if message_type in ("notification", "revocation"):
+                await self.handler.submit(_event(message))
+            elif message_type == "session_reconnect":
+                return str(message["payload"]["session"]["reconnect_url"])
+            elif message_type != "session_keepalive":
+                self.logger.info("Unexpected EventSub message %s", metadata)
+        except (KeyError, TypeError) as error:
+            self.logger.warning("Skipping malformed EventSub message %s: %r", metadata, error)
+
+        return None
+
+    async def _receive(self, socket: Socket, timeout: float) -> Message:
+        """Receives the next message, skipping anything which is not one."""
+        while True:
+            try:
+                received = await asyncio.wait_for(socket.receive(), timeout)
+            except asyncio.TimeoutError as error:
+                raise SessionLost(f"Nothing received for {timeout:.0f} seconds") from error
+
+            if received.type != aiohttp.WSMsgType.TEXT:
+                raise SessionLost(f"Received {received.type.name} ({received.extra})")
+
+            try:
+                message = json.loads(received.data)
+            except ValueError:
+                message = None
+
+            if isinstance(message, dict) and isinstance(message.get("metadata"), dict):
+                return message
+
+            self.logger.warning("Skipping malformed EventSub frame %r", received.data[:200])
+
+
+def _welcome(message: Message) -> Tuple[str, float]:
+    """The session ID and keepalive interval from a welcome message."""
+    if message["metadata"].get("message_type") != "session_welcome":
+        raise SessionLost(f"Expected a welcome, got {message['metadata']}")
+
+    try:
+        session = message["payload"]["session"]
+        return str(session["id"]), float(session.get("keepalive_timeout_seconds") or 10)
+    except (KeyError, TypeError, ValueError) as error:
+        raise SessionLost(f"Malformed welcome {message}") from error
+
+
+def _event(message: Message) -> TwitchEvent:
+    """Converts a WebSocket message into the form the webhook receives it in."""
+    metadata = message["metadata"]
+    payload = message["payload"]
+
+    return TwitchEvent(
+        message_id=metadata["message_id"],
+        timestamp=metadata["message_timestamp"],
+        signature="",
+        subscription_type=metadata.get("subscription_type", ""),
+        message_type=metadata["message_type"],
+        payload=json.dumps(payload).encode("utf-8"),
+        content=payload,
+    )
@@ -5,17 +5,23 @@
 
 from __future__ import annotations
 
-from typing import Dict, Optional, Union
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Union
 
+import asyncio
 import dataclasses
 import hashlib
 import hmac
 import json
-import requests
+import math
+import re
+import time
 
 from aiohttp.web import Request, Response
 
 from snerge import bot, log, token
+from snerge.twitch import TwitchClient
 
 
 REQUIRED_HEADERS = [
@@ -26,6 +32,24 @@ REQUIRED_HEADERS = [
     "Twitch-Eventsub-Subscription-Type",
 ]
 
+# The events the bot subscribes to; each is registered at the same time.
+EVENT_TYPES = [
+    "channel.channel_points_custom_reward_redemption.add",
+]
+
+# The channel points reward which makes Snerge say something.
+SNERGE_REWARD = "03979e28-d8c5-4985-8a32-fc27da71b3c1"
+
+# How many notifications can be waiting to be acted on, and how many are acted on at once.
+EVENT_QUEUE_SIZE = 100
+EVENT_WORKERS = 2
+# How long (in seconds) message IDs are remembered for; Twitch recommends
+# rejecting anything older than this.
+MESSAGE_TTL = 10 * 60
+
+# An RFC 3339 timestamp in UTC, split into the part up to the seconds, and the fraction.
+TIMESTAMP = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?Z$")
+
 
 @dataclasses.dataclass
 class TwitchEvent:
@@ -39,31 +63,111 @@ class TwitchEvent:
     payload: bytes
     content: Dict[str, Union[Dict[str, str], str]]
 
-    def signature_valid(self, secret: bytes) -> bool:
-        mode, signature = self.signature.split("=", 1)
+    def signature_valid(self, signer: hmac.HMAC) -> bool:
+        """Checks the signature, given an HMAC already keyed with the webhook secret."""
+        mac = signer.copy()
+        mac.update(self.message_id.encode("utf-8"))
+        mac.update(self.timestamp.encode("utf-8"))
+        mac.update(self.payload)
 
-        if mode != "sha256":
-            return False
+        return hmac.compare_digest("sha256=" + mac.hexdigest(), self.signature)
 
-        payload = (
-            self.message_id.encode("utf-8") + self.timestamp.encode("utf-8") + self.payload
-        )
+    @property
+    def age(self) -> float:
+        """How long ago (in seconds) Twitch sent the message, or infinity if unknown."""
+        if not (match := TIMESTAMP.match(self.timestamp)):
+            return math.inf
+
+        # Twitch sends nanoseconds, but Python can only parse microseconds.
+        sent = datetime.fromisoformat(match.group(1) + (match.group(2) or "")[:7] + "+00:00")
+
+        return (datetime.now(timezone.utc) - sent).total_seconds()
+
+
+class RecentMessages:
+    """
+    The IDs of the messages received in the last `ttl` seconds.
+
+    Twitch resends a message if it is not acknowledged quickly enough, with
+    the same ID, so these are used to drop the repeats.
+    """
+
+    ttl: float
+
+    _clock: Callable[[], float]
+    _expiry: OrderedDict[str, float]
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self._clock = clock
+        self._expiry = OrderedDict()
 
-        sig = hmac.new(secret, msg=payload, digestmod=hashlib.sha256).hexdigest()
+    def add(self, message_id: str) -> None:
+        self._expire()
+        self._expiry[message_id] = self._clock() + self.ttl
 
-        return sig == signature
+    def __contains__(self, message_id: object) -> bool:
+        self._expire()
 
+        return message_id in self._expiry
+
+    def __len__(self) -> int:
+        self._expire()
+
+        return len(self._expiry)
+
+    def _expire(self) -> None:
+        now = self._clock()
+
+        # The IDs were added in the order they expire, so the expired ones are at the front.
+        while self._expiry and next(iter(self._expiry.values())) <= now:
+            self._expiry.popitem(last=False)
+
+
+class EventHandler:  # pylint: disable=too-many-instance-attributes
+    """
+    Receives EventSub notifications from Twitch.
+
+    Notifications are checked and acknowledged straight away, and then acted
+    on by `workers` background tasks, so Twitch never waits on (for example)
+    a quote being sent and never has reason to send the notification again.
+    """
 
-class EventHandler:
     logger: log.Logger
+    recent: RecentMessages
+    queue: asyncio.Queue[TwitchEvent]
 
     _app: token.App
     _bot: bot.Bot
+    _client: TwitchClient
+    _signer: hmac.HMAC
+    _workers: List[asyncio.Task[None]]
 
-    def __init__(self, logger: log.Logger, app: token.App, _bot: bot.Bot) -> None:
+    def __init__(
+        self, logger: log.Logger, app: token.App, _bot: bot.Bot, client: TwitchClient
+    ) -> None:
         self.logger = logger
+        self.recent = RecentMessages(MESSAGE_TTL)
+        self.queue = asyncio.Queue(EVENT_QUEUE_SIZE)
         self._app = app
         self._bot = _bot
+        self._client = client
+        self._signer = hmac.new(app.webhook_secret, digestmod=hashlib.sha256)
+        self._workers = []
+
+    def start(self, workers: int = EVENT_WORKERS) -> None:
+        """Starts the tasks which act on the notifications."""
+        for number in range(workers):
+            self._workers.append(
+                asyncio.create_task(self.process_events(), name=f"eventsub-worker-{number}")
+            )
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
 
     async def handle_webhook(self, request: Request) -> Response:
         event = await self.load_event(request)
@@ -72,23 +176,70 @@ class EventHandler:
             self.logger.warning("Received invalid event")
             return Response(status=400, content_type="text/plain", text="Invalid event")
 
-        if not any(map(event.signature_valid, [b"hello_i_am_snerge", b"hello_my_world"])):
+        if not event.signature_valid(self._signer):
             self.logger.warning("Received event with invalid signature")
             return Response(status=400, content_type="text/plain", text="Incorrect Signature")
 
+        # Anything older than the dedupe window could be a repeat we have forgotten.
+        if event.age > MESSAGE_TTL:
+            self.logger.warning("Received stale event %s", event.message_id)
+            return Response(status=400, content_type="text/plain", text="Stale event")
+
         self.logger.debug("%s web-hook event %s", event.subscription_type, event.message_type)
 
         if event.message_type == "webhook_callback_verification":
             return self.handle_verification_event(event)
 
+        return self.enqueue(event)
+
+    def enqueue(self, event: TwitchEvent) -> Response:
+        if event.message_id in self.recent:
+            self.logger.info("Dropping repeated event %s", event.message_id)
+            return Response(status=204, content_type="text/plain", body=b"")
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Not acknowledging the event means Twitch will send it again later.
+            self.logger.warning("Event queue full, deferring %s", event.message_id)
+            return Response(status=503, content_type="text/plain", text="Busy")
+
+        self.recent.add(event.message_id)
+
+        return Response(status=204, content_type="text/plain", body=b"")
+
+    async def submit(self, event: TwitchEvent) -> None:
+        """Queues an event from a source that can wait for room in the queue."""
+        if event.message_id in self.recent:
+            self.logger.info("Dropping repeated event %s", event.message_id)
+            return
+
+        self.recent.add(event.message_id)
+        await self.queue.put(event)
+
+    async def process_events(self) -> None:
+        while True:
+            event = await self.queue.get()
+
+            try:
+                await self.process_event(event)
+            except Exception:  # pylint: disable=broad-except
+                self.logger.exception("Failed to process event %s", event.message_id)
+            finally:
+                self.queue.task_done()
+
+    async def process_event(self, event: TwitchEvent) -> None:
+        if event.message_type == "revocation":
+            self.logger.warning("Subscription to %s revoked", event.subscription_type)
+            return
+
         if event.subscription_type == "channel.channel_points_custom_reward_redemption.add":
-            return await self.handle_reward_event(event)
+            await self.handle_reward_event(event)
+            return
 
         if event.subscription_type != "channel.follow":
             self.logger.info(json.dumps(event.content, indent="  "))
 
-        return Response(status=204, content_type="text/plain", body=b"")
-
     def handle_verification_event(self, event: TwitchEvent) -> Response:
         challenge = event.content.get("challenge", None)
 
@@ -104,12 +255,12 @@ class EventHandler:
             self.logger.info("Callback complete for %s %s", data.get("type"), data.get("id"))
         return Response(status=200, content_type="text/plain", text=challenge)
 
-    async def handle_reward_event(self, event: TwitchEvent) -> Response:
+    async def handle_reward_event(self, event: TwitchEvent) -> None:
         reward_event = event.content.get("event", {})
 
         if not isinstance(reward_event, dict) or "reward" not in reward_event:
             self.logger.warning("No reward in redemption event")
-            return Response(status=204, content_type="text/plain", body=b"")
+            return
 
         reward: Union[str, Dict[str, Union[Dict[str, str], str]]] = reward_event.get(
             "reward", {}
@@ -117,17 +268,15 @@ class EventHandler:
 
         if not isinstance(reward, dict) or "id" not in reward:
             self.logger.warning("No id in redemption event reward")
-            return Response(status=204, content_type="text/plain", body=b"")
+            return
 
-        if reward["id"] != "03979e28-d8c5-4985-8a32-fc27da71b3c1":
+        if reward["id"] != SNERGE_REWARD:
             self.logger.debug("Skipping non-Snerge reward")
-            return Response(status=204, content_type="text/plain", body=b"")
+            return
 
         self.logger.info("Sending quote for reward")
         await self._bot.send_quote()
 
-        return Response(status=204, content_type="text/plain", body=b"")
-
     async def load_event(self, request: Request) -> Optional[TwitchEvent]:
         # Check that we have all the data to load an event
         missing = [key for key in REQUIRED_HEADERS if key not in request.headers]
@@ -160,66 +309,77 @@ class EventHandler:
             content=content,
         )
 
-    async def register(self, username: str) -> None:
+    async def register(self, username: str, session_id: str | None = None) -> None:
+        """
+        Subscribes to the events for a user's channel.
+
+        They are delivered to the webhook, or to the EventSub WebSocket
+        session with the given ID.
+        """
         self.logger.info("Loading token for %s", username)
         user = token.Token.load(username)
 
         if not user:
             self.logger.error("No token available for %s", username)
 
-        user.renew(self._app)
-
-        for event_type in [
-            "channel.channel_points_custom_reward_redemption.add",
-        ]:
-            data = {
-                "type": event_type,
-                "version": "1",
-                "condition": {
-                    "broadcaster_user_id": str(user.user_id),
-                },
-                "transport": {
-                    "method": "webhook",
-                    "callback": "https://snerge.tea-cats.co.uk/webhook",
-                    "secret": self._app.webhook_secret.decode("utf-8"),
-                },
-            }
-
-            self.logger.info("Registering %s webhook for %s", event_type, username)
-
-            response = requests.post(
-                "https://api.twitch.tv/helix/eventsub/subscriptions",
-                json=data,
-                headers={
-                    "Content-type": "application/json",
-                    "Client-ID": self._app.client_id,
-                    "Authorization": "Bearer " + self._app.app_token,
-                },
-                timeout=15,
-            )
+        await user.renew(self._app, self._client)
 
-            subscription = response.json()
+        await asyncio.gather(
+            *(self.subscribe(user, event_type, session_id) for event_type in EVENT_TYPES)
+        )
 
-            if not isinstance(subscription, dict):
-                self.logger.error("Unable to parse subscription response %s", subscription)
-                continue
+    async def subscribe(
+        self, user: token.Token, event_type: str, session_id: str | None = None
+    ) -> None:
+        transport: Dict[str, str] = {
+            "method": "webhook",
+            "callback": "https://snerge.tea-cats.co.uk/webhook",
+            "secret": self._app.webhook_secret.decode("utf-8"),
+        }
+        # Subscriptions for a WebSocket have to be made with the user's token.
+        access_token = self._app.app_token
+
+        if session_id:
+            transport = {"method": "websocket", "session_id": session_id}
+            access_token = user.access_token
+
+        data = {
+            "type": event_type,
+            "version": "1",
+            "condition": {
+                "broadcaster_user_id": str(user.user_id),
+            },
+            "transport": transport,
+        }
+
+        self.logger.info(
+            "Registering %s %s for %s", event_type, transport["method"], user.user
+        )
+
+        subscription = await self._client.helix(
+            "POST",
+            "eventsub/subscriptions",
+            self._app.client_id,
+            access_token,
+            data,
+        )
 
-            if "data" in subscription:
-                self.logger.info(
-                    "Subscribe to %s for %s: %s",
-                    event_type,
-                    username,
-                    subscription["data"][0]["id"],
-                )
-                continue
+        if "data" in subscription:
+            self.logger.info(
+                "Subscribe to %s for %s: %s",
+                event_type,
+                user.user,
+                subscription["data"][0]["id"],
+            )
+            return
 
-            error = subscription.get("error", "")
-            message = subscription.get("message", "")
+        error = subscription.get("error", "")
+        message = subscription.get("message", "")
 
-            if error == "Conflict" and message == "subscription already exists":
-                self.logger.info("Using old subscription for %s for %s", event_type, username)
-                continue
+        if error == "Conflict" and message == "subscription already exists":
+            self.logger.info("Using old subscription for %s for %s", event_type, user.user)
+            return
 
-            self.logger.warning(
-                "Error subscribing to %s for %s: %s", event_type, username, message
-            )
+        self.logger.warning(
+            "Error subscribing to %s for %s: %s", event_type, user.user, message
+        )
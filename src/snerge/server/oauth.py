@@ -9,12 +9,12 @@ from typing import List
 
 import dataclasses
 import random
-import requests
 
 from aiohttp.web import Request, Response
 
 from snerge import log
 from snerge.token import App, Token
+from snerge.twitch import TwitchClient
 
 
 @dataclasses.dataclass
@@ -30,11 +30,13 @@ class UserFetchError(Exception):
 class OAuthHandler:
     logger: log.Logger
     app: App
+    client: TwitchClient
     pending_auth_nonces: List[str]
 
-    def __init__(self, logger: log.Logger, app: App) -> None:
+    def __init__(self, logger: log.Logger, app: App, client: TwitchClient) -> None:
         self.logger = logger
         self.app = app
+        self.client = client
         self.pending_auth_nonces = []
 
     async def handle(self, request: Request) -> Response:
@@ -49,7 +51,7 @@ class OAuthHandler:
         state = hex(random.randrange(16**24)).zfill(24)
 
         destination = (
-            "https://id.twitch.tv/oauth2/authorize"
+            f"{self.client.id_host}/oauth2/authorize"
             "?response_type=code"
             f"&client_id={self.app.client_id}"
             f"&redirect_uri={self.app.redirect_url}"
@@ -87,20 +89,16 @@ class OAuthHandler:
 
         self.pending_auth_nonces.remove(our_nonce)
 
-        token_request = requests.post(
-            "https://id.twitch.tv/oauth2/token",
+        token_json = await self.client.oauth_token(
             {
                 "client_id": self.app.client_id,
                 "client_secret": self.app.client_secret,
                 "code": their_nonce,
                 "grant_type": "authorization_code",
                 "redirect_uri": self.app.redirect_url,
-            },
-            timeout=15,
+            }
         )
 
-        token_json = token_request.json()
-
         if "access_token" not in token_json:
             self.logger.warning("Unable to get token: %s", str(token_json))
             return Response(
@@ -110,7 +108,7 @@ class OAuthHandler:
             )
 
         try:
-            user = self.fetch_user_data(token_json["access_token"])
+            user = await self.fetch_user_data(token_json["access_token"])
         except UserFetchError as error:
             return Response(status=500, content_type="text/plain", text=str(error))
 
@@ -128,17 +126,8 @@ class OAuthHandler:
 
         return Response(status=200, content_type="text/plain", text=message)
 
-    def fetch_user_data(self, access_token: str) -> TwitchUser:
-        user_request = requests.get(
-            "https://api.twitch.tv/helix/users",
-            headers={
-                "Authorization": "Bearer " + access_token,
-                "Client-ID": self.app.client_id,
-            },
-            timeout=15,
-        )
-
-        user_json = user_request.json()
+    async def fetch_user_data(self, access_token: str) -> TwitchUser:
+        user_json = await self.client.helix("GET", "users", self.app.client_id, access_token)
 
         if "data" not in user_json or len(user_json["data"]) != 1:
             self.logger.warning("Unable to get user: %s", str(user_json))
@@ -5,92 +5,244 @@
 
 from __future__ import annotations
 
-from typing import Any, List
+from typing import Any, Dict, List, Optional, Tuple
 
+import asyncio
 import json
 
-from aiohttp.web import Request, Response, FileResponse, StreamResponse
+from aiohttp.web import Request, Response, StreamResponse
 
-import prosegen.prosegen
-from prosegen import ProseGen
+from prosegen import ProseGen, Fact, GeneratedQuote
 
+from snerge.blocklist import Blocklist
+from snerge.model import ModelRef
 from snerge.util import SetEncoder
 
+from .cached import CachedBody
+from .static import StaticAssets
+
+
+# The most continuations that can be requested in one prediction.
+MAX_CANDIDATES = 10
+# The most options that can be requested from the next token distribution.
+MAX_NEXT_TOKENS = 100
+# How many times to re-roll a prediction which hits the blocklist.
+MAX_ATTEMPTS = 10
+
 
 class PredictHandler:
-    quotes: ProseGen
+    quotes: ModelRef
+    blocklist: Blocklist
+    assets: StaticAssets
     mapping: List[Any] = []
 
-    def __init__(self, quotes: ProseGen) -> None:
+    _dictionary: Optional[CachedBody] = None
+    _dictionary_version: str = ""
+
+    def __init__(self, quotes: ModelRef, blocklist: Blocklist) -> None:
         self.quotes = quotes
+        self.blocklist = blocklist
+        self.assets = StaticAssets("html/predict", "html/shared", index="predict.html")
 
-    @staticmethod
-    async def handle_static(request: Request) -> StreamResponse:
-        path = request.match_info.get("path", "")
-
-        if path == "predict.js":
-            return FileResponse(
-                status=200,
-                headers={"Content-Type": "text/javascript"},
-                path="html/predict/predict.js",
-            )
+    async def handle_static(self, request: Request) -> Response:
+        return await self.assets.handle(request)
 
-        if path == "predict.css":
-            return FileResponse(
-                status=200,
-                headers={"Content-Type": "text/css"},
-                path="html/predict/predict.css",
-            )
+    async def get_dictionary(self, request: Request) -> Response:
+        # The dictionary only changes when the model learns something new (or
+        # is replaced), so the encoded body is only rebuilt when the version moves.
+        model, version = self.quotes.current, self.quotes.version
 
-        if path == "":
-            return FileResponse(
-                status=200,
-                headers={"Content-Type": "text/html"},
-                path="html/predict/predict.html",
-            )
+        if not self._dictionary or self._dictionary_version != version:
+            tokens = sorted(model.dictionary.keys())
 
-        return Response(status=200, text=path)
+            self._dictionary = CachedBody.build(
+                "application/json", json.dumps(tokens).encode("utf-8")
+            )
+            self._dictionary_version = version
 
-    async def get_dictionary(self, _: Request) -> Response:
-        tokens: set[str] = set(self.quotes.dictionary.keys())
+        response = self._dictionary.respond(request)
+        response.headers["X-Model-Version"] = self._dictionary_version
 
-        return Response(
-            status=200,
-            content_type="application/json",
-            text=json.dumps(tokens, cls=SetEncoder),
-        )
+        return response
 
     async def make_prediction(self, request: Request) -> Response:
         words = await request.text()
 
-        initial_tokens = prosegen.prosegen.Fact(words, "")
-        parsed_tokens: list[str] = []
-        generator = prosegen.prosegen.GeneratedQuote(self.quotes, 30)
+        try:
+            count = min(max(int(request.query.get("n", "1")), 1), MAX_CANDIDATES)
+        except ValueError:
+            return Response(status=400, content_type="text/plain", text="Invalid n")
+
+        model, version = self.quotes.current, self.quotes.version
+        parsed_tokens, primed = self._prime(model, words, "provenance" in request.query)
+        outputs = []
 
-        for token in initial_tokens.tokens:
-            if token not in self.quotes.dictionary:
+        for _ in range(count):
+            if not (candidate := self._generate(primed)):
                 continue
 
-            parsed_tokens.append(token)
-            generator.append_token(token)
+            generator, _ = candidate
+
+            output: Dict[str, Any] = {
+                "text": generator.output.strip(),
+                "tokens": generator.tokens,
+            }
 
-        statement = generator.make_statement()
-        tokenised = prosegen.prosegen.Fact(statement, "")
+            if generator.record_provenance:
+                output["provenance"] = [
+                    {
+                        "start": span.start,
+                        "end": span.end,
+                        "sources": [fact.source for fact in span.facts],
+                    }
+                    for span in generator.provenance()
+                ]
+
+            outputs.append(output)
 
         return Response(
             status=200,
+            headers={"X-Model-Version": version},
             content_type="application/json",
             text=json.dumps(
                 {
+                    "version": version,
                     "input": {
                         "text": words,
                         "tokens": parsed_tokens,
                     },
-                    "output": {
-                        "text": tokenised.original,
-                        "tokens": tokenised.tokens,
-                    },
+                    "output": outputs[0] if outputs else None,
+                    "outputs": outputs,
                 },
                 cls=SetEncoder,
             ),
         )
+
+    async def stream_prediction(self, request: Request) -> StreamResponse:
+        words = request.query.get("prompt", "")
+        model, version = self.quotes.current, self.quotes.version
+        parsed_tokens, primed = self._prime(model, words)
+
+        response = StreamResponse(
+            status=200,
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "X-Model-Version": version,
+            },
+        )
+        await response.prepare(request)
+
+        try:
+            await _send_event(
+                response,
+                "input",
+                {"version": version, "text": words, "tokens": parsed_tokens},
+            )
+
+            # The whole continuation is generated (and re-rolled if it is
+            # blocked) before any of it is sent, so blocked text never is.
+            if not (candidate := self._generate(primed)):
+                await _send_event(
+                    response, "done", {"text": "", "tokens": [], "blocked": True}
+                )
+                return response
+
+            generator, steps = candidate
+
+            for token, text in steps:
+                # Stop sending as soon as nobody is listening any more.
+                if not request.transport or request.transport.is_closing():
+                    return response
+
+                await _send_event(response, "token", {"token": token, "text": text})
+
+            await _send_event(
+                response,
+                "done",
+                {
+                    "text": generator.output.strip(),
+                    "tokens": generator.tokens,
+                    "blocked": False,
+                },
+            )
+        except ConnectionResetError:
+            pass
+
+        return response
+
+    async def next_tokens(self, request: Request) -> Response:
+        words = await request.text()
+
+        try:
+            count = min(max(int(request.query.get("k", "10")), 1), MAX_NEXT_TOKENS)
+        except ValueError:
+            return Response(status=400, content_type="text/plain", text="Invalid k")
+
+        model, version = self.quotes.current, self.quotes.version
+        parsed_tokens = self._parse(model, words)
+        distribution = model.next_distribution(parsed_tokens, count, 30)
+
+        return Response(
+            status=200,
+            headers={"X-Model-Version": version},
+            content_type="application/json",
+            text=json.dumps(
+                {
+                    "version": version,
+                    "input": {
+                        "text": words,
+                        "tokens": parsed_tokens,
+                    },
+                    "next": [
+                        {"token": token, "weight": weight} for token, weight in distribution
+                    ],
+                }
+            ),
+        )
+
+    def _generate(
+        self, primed: GeneratedQuote
+    ) -> Optional[Tuple[GeneratedQuote, List[Tuple[str, str]]]]:
+        """
+        Continues a primed quote, re-rolling any continuation that is blocked.
+
+        Along with the finished quote, each token is returned with the text it
+        added to the output; the first also carries the rendered prompt.
+        """
+        for _ in range(MAX_ATTEMPTS):
+            generator = primed.fork()
+            steps = []
+            rendered = 0
+
+            for token in generator.generate():
+                steps.append((token, generator.output[rendered:]))
+                rendered = len(generator.output)
+
+            if not self.blocklist.is_blocked(generator.output.strip()):
+                return generator, steps
+
+        return None
+
+    @staticmethod
+    def _parse(model: ProseGen, words: str) -> List[str]:
+        return [token for token in Fact(words, "").tokens if token in model.dictionary]
+
+    def _prime(
+        self, model: ProseGen, words: str, record_provenance: bool = False
+    ) -> Tuple[List[str], GeneratedQuote]:
+        parsed_tokens = self._parse(model, words)
+        generator = GeneratedQuote(model, 30, record_provenance)
+
+        for token in parsed_tokens:
+            generator.append_token(token)
+
+        return parsed_tokens, generator
+
+
+async def _send_event(response: StreamResponse, event: str, data: Dict[str, Any]) -> None:
+    await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+
+    # Give the loop a chance to run, so that other requests are not starved
+    # and a disconnected client is noticed before the next token.
+    await asyncio.sleep(0)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Dict
+
+import hashlib
+import os.path
+import re
+
+from aiohttp.web import Request, Response
+
+from .cached import CachedBody
+
+
+CONTENT_TYPES = {
+    ".css": "text/css",
+    ".html": "text/html",
+    ".js": "text/javascript",
+}
+
+# Used for assets requested with their current content hash, which can
+# therefore never change underneath the client.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class StaticAssets:  # pylint: disable=too-few-public-methods
+    """
+    The static files for one page, loaded into memory and encoded at startup.
+
+    References between the files (such as the page loading its script) are
+    rewritten to include the content hash of the referenced file, so that
+    those files can be cached by the browser forever.
+    """
+
+    index: str
+    assets: Dict[str, CachedBody]
+    versions: Dict[str, str]
+
+    def __init__(self, *directories: str, index: str) -> None:
+        self.index = index
+        self.assets = {}
+        self.versions = {}
+
+        raw: Dict[str, bytes] = {}
+
+        for directory in directories:
+            for name in sorted(os.listdir(directory)):
+                if os.path.splitext(name)[1] not in CONTENT_TYPES:
+                    continue
+
+                with open(os.path.join(directory, name), "rb") as handle:
+                    raw[name] = handle.read()
+
+        self._link(raw)
+
+    def _link(self, raw: Dict[str, bytes]) -> None:
+        pending = dict(raw)
+
+        # A file can only be hashed once everything it refers to has been,
+        # as the hashes of those files end up in its content.
+        while pending:
+            ready = [
+                name
+                for name, body in pending.items()
+                if not any(
+                    _reference(other).search(body) for other in pending if other != name
+                )
+            ]
+
+            if not ready:
+                raise ValueError(f"Circular references between static files {list(pending)}")
+
+            for name in ready:
+                body = pending.pop(name)
+
+                for other, version in self.versions.items():
+                    body = _reference(other).sub(
+                        rb"\1\2" + other.encode("utf-8") + b"?v=" + version.encode() + rb"\1",
+                        body,
+                    )
+
+                self.versions[name] = hashlib.sha256(body).hexdigest()[:12]
+                self.assets[name] = CachedBody.build(
+                    CONTENT_TYPES[os.path.splitext(name)[1]], body
+                )
+
+    async def handle(self, request: Request) -> Response:
+        path = request.match_info.get("path", "")
+
+        if path == "":
+            return self.assets[self.index].respond(request)
+
+        if path not in self.assets:
+            return Response(status=404, content_type="text/plain", text="Not Found")
+
+        if request.query.get("v") == self.versions[path]:
+            return self.assets[path].respond(request, IMMUTABLE)
+
+        return self.assets[path].respond(request)
+
+
+def _reference(name: str) -> re.Pattern[bytes]:
+    return re.compile(rb"([\"'])(\./)?" + re.escape(name.encode("utf-8")) + rb"\1")
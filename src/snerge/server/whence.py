@@ -7,62 +7,71 @@ from __future__ import annotations
 
 import json
 
-from aiohttp.web import Request, Response, FileResponse, StreamResponse
-from prosegen import ProseGen
+from aiohttp.web import Request, Response
 
+from snerge.model import ModelRef
 from snerge.util import SetEncoder
 
+from .static import StaticAssets
+
 
 class WhenceHandler:
-    quotes: ProseGen
+    quotes: ModelRef
+    assets: StaticAssets
 
-    def __init__(self, quotes: ProseGen) -> None:
+    def __init__(self, quotes: ModelRef) -> None:
         self.quotes = quotes
+        self.assets = StaticAssets("html/whence", "html/shared", index="whence.html")
 
-    @staticmethod
-    async def handle_static(request: Request) -> StreamResponse:
-        path = request.match_info.get("path", "")
-
-        if path == "":
-            return FileResponse(
-                status=200,
-                headers={"Content-Type": "text/html"},
-                path="html/whence/whence.html",
-            )
-
-        if path == "whence.js":
-            return FileResponse(
-                status=200,
-                headers={"Content-Type": "text/javascript"},
-                path="html/whence/whence.js",
-            )
-
-        if path == "whence.css":
-            return FileResponse(
-                status=200,
-                headers={"Content-Type": "text/css"},
-                path="html/whence/whence.css",
-            )
-
-        return Response(status=200, text=path)
+    async def handle_static(self, request: Request) -> Response:
+        return await self.assets.handle(request)
 
     async def handle_search(self, request: Request) -> Response:
         word = await request.text()
+        model, version = self.quotes.current, self.quotes.version
 
         output: dict[str, list[dict[str, str | list[str]]]] = {}
-        tokens = self.quotes.dictionary.keys()
+        tokens = model.dictionary.keys()
 
         for word in word.strip().split(" "):
             for token in tokens:
                 if word.lower() in token.lower():
-                    data = self.quotes.dictionary[token]
+                    data = model.dictionary[token]
                     output[token] = [
-                        {"source": fact.source, "text": fact.original, "tokens": fact.tokens}
+                        {
+                            "source": fact.source,
+                            "sources": fact.sources,
+                            "text": fact.original,
+                            "tokens": fact.tokens,
+                        }
                         for fact in data
                     ]
 
         return Response(
             status=200,
+            headers={"X-Model-Version": version},
+            content_type="application/json",
+            text=json.dumps(output, cls=SetEncoder),
+        )
+
+    async def handle_phrase(self, request: Request) -> Response:
+        phrase = await request.text()
+        model, version = self.quotes.current, self.quotes.version
+
+        output = [
+            {
+                "source": fact.source,
+                "sources": fact.sources,
+                "text": fact.original,
+                "tokens": fact.tokens,
+                "positions": positions,
+            }
+            for fact, positions in model.find_phrase(phrase)
+        ]
+
+        return Response(
+            status=200,
+            headers={"X-Model-Version": version},
             content_type="application/json",
             text=json.dumps(output, cls=SetEncoder),
         )
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Tuple
+
+import asyncio
+import glob
+import hashlib
+import os
+import pickle
+import time
+
+from prosegen import ProseGen, misspell
+from prosegen.prosegen import TOKENIZER_VERSION
+from snerge import log
+
+
+# Bump this whenever the layout of a saved model changes.
+SNAPSHOT_FORMAT = 1
+
+
+def build_key(
+    model: ProseGen, files: Iterable[str], quotes: Iterable[Tuple[str, str]]
+) -> str:
+    """
+    Hashes everything that goes into building a model.
+
+    That is the settings of the (empty) model, the versions of the tokenizer
+    and the misspelling map, the contents of the given files, and the quotes
+    which did not come from those files, in the order they are taught.
+    """
+    digest = hashlib.sha256()
+    settings = [SNAPSHOT_FORMAT, TOKENIZER_VERSION, misspell.VERSION]
+    settings += [model.size, model.near_duplicates is not None]
+
+    digest.update(repr(settings).encode("utf-8"))
+
+    for path in files:
+        digest.update(path.encode("utf-8") + b"\0")
+
+        try:
+            with open(path, "rb") as handle:
+                digest.update(hashlib.sha256(handle.read()).digest())
+        except FileNotFoundError:
+            digest.update(b"missing")
+
+    for quote_id, quote in quotes:
+        digest.update(f"{quote_id}\0{quote}\n".encode("utf-8"))
+
+    return digest.hexdigest()[:32]
+
+
+class ModelSnapshots:
+    """
+    Built models saved on disk, named by the build key of what they were built from.
+
+    Only the `keep` most recently used snapshots are kept. Snapshots are read
+    and written in a worker thread, as (un)pickling a model takes seconds.
+    """
+
+    logger: log.Logger
+    directory: str
+    keep: int
+
+    def __init__(self, logger: log.Logger, directory: str, keep: int = 3) -> None:
+        self.logger = logger
+        self.directory = directory
+        self.keep = keep
+
+    async def load(self, key: str) -> ProseGen | None:
+        """Loads the model built with the given key, or None to build it again."""
+        path = self.path(key)
+        start = time.perf_counter()
+
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(None, _read, path)
+        except FileNotFoundError:
+            return None
+        except Exception:  # pylint: disable=broad-except
+            # A truncated snapshot, or one from older code, can fail in almost any way.
+            self.logger.warning("Discarding unreadable model snapshot %s", path, exc_info=True)
+            _discard(path)
+            return None
+
+        if not isinstance(data, ProseGen):
+            self.logger.warning("Discarding model snapshot %s of type %s", path, type(data))
+            _discard(path)
+            return None
+
+        # Marks the snapshot as recently used, so it is not pruned.
+        os.utime(path)
+
+        self.logger.info(
+            "Loaded model snapshot %s in %.2fs", key, time.perf_counter() - start
+        )
+
+        return data
+
+    async def save(self, key: str, model: ProseGen) -> None:
+        """Saves a model, which must not be changed until this returns."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+
+        await asyncio.get_running_loop().run_in_executor(None, _write, path, model)
+        self.logger.info("Saved model snapshot %s", key)
+
+        self._prune()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def _prune(self) -> None:
+        snapshots = sorted(
+            glob.glob(os.path.join(self.directory, "*.pickle")),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+
+        while len(snapshots) > self.keep:
+            os.remove(snapshots.pop())
+
+
+def _read(path: str) -> Any:
+    with open(path, "rb") as handle:
+        return pickle.load(handle)
+
+
+def _write(path: str, model: ProseGen) -> None:
+    # Written to one side and moved into place, so a snapshot is never half-written.
+    try:
+        with open(path + ".tmp", "wb") as handle:
+            pickle.dump(model, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(path + ".tmp", path)
+    finally:
+        _discard(path + ".tmp")
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Local stand-ins for the external services the bot talks to.
+
+The LRR quote pages are replayed from the HTTP cache directory, so any page
+that has been fetched once (by the bot, or `python -m snerge.quotes`) can be
+served again without the network. The parts of the Twitch OAuth and Helix
+APIs the bot uses are imitated, accepting any credentials, as is the EventSub
+WebSocket server. To use them, run
+
+    python -m snerge.standin [cache directory] [port]
+
+and point `lrr_host`, `twitch_id_host`, and `twitch_api_host` in the config
+at `http://127.0.0.1:<port>`, and `eventsub_ws_url` at `ws://127.0.0.1:<port>/ws`.
+
+Notifications are sent to every connected EventSub session by posting the
+event (as it appears in a notification's payload) to
+`/standin/eventsub/<subscription type>`, and posting to
+`/standin/eventsub-reconnect` asks each session to move to a new connection.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Set, Tuple
+from urllib.parse import urlsplit
+
+import asyncio
+import itertools
+import sys
+import uuid
+
+from aiohttp import web
+
+from snerge.httpcache import HttpCache
+from snerge.server.cached import CachedBody
+
+
+DEFAULT_PORT = 8889
+
+# What LRRbot shows for a page past the end of the search results.
+EMPTY_PAGE = CachedBody.build("text/html", b'<ol class="quotes"></ol>')
+
+# The user every stand-in token belongs to.
+STANDIN_USER_ID = "1234"
+STANDIN_USER = "sergeyager"
+
+
+def load_recordings(directory: str) -> Dict[str, CachedBody]:
+    """Loads the pages recorded in the cache, by their path (and query string)."""
+    pages: Dict[str, CachedBody] = {}
+
+    for entry in HttpCache.entries_in(directory):
+        url = urlsplit(entry["url"])
+        path = f"{url.path}?{url.query}" if url.query else url.path
+
+        pages[path] = CachedBody.build("text/html", entry["body"].encode("utf-8"))
+
+    return pages
+
+
+def create_lrr_app(pages: Dict[str, CachedBody]) -> web.Application:
+    """Creates an application which serves recorded LRR pages."""
+
+    async def replay(request: web.Request) -> web.StreamResponse:
+        return pages.get(request.path_qs, EMPTY_PAGE).respond(request)
+
+    app = web.Application()
+    app.router.add_route("GET", "/quotes/search", replay)
+
+    return app
+
+
+def create_twitch_app(
+    app: web.Application | None = None, *, delay: float = 0.0
+) -> web.Application:
+    """
+    Creates (or adds to `app`) an imitation of the Twitch APIs the bot uses.
+
+    Every request waits for `delay` seconds first, to stand in for the round
+    trip to Twitch.
+    """
+    app = app or web.Application()
+    tokens = itertools.count(1)
+    subscriptions: Set[Tuple[str, str, str]] = set()
+
+    async def oauth_token(request: web.Request) -> web.Response:
+        await asyncio.sleep(delay)
+        form = await request.post()
+
+        if not form.get("client_id") or not form.get("grant_type"):
+            return _json_error(400, "Bad Request", "missing client id or grant type")
+
+        number = next(tokens)
+
+        return web.json_response(
+            {
+                "access_token": f"standin-access-{number}",
+                "refresh_token": f"standin-refresh-{number}",
+                "expires_in": 3600,
+                "token_type": "bearer",
+            }
+        )
+
+    async def users(request: web.Request) -> web.Response:
+        await asyncio.sleep(delay)
+
+        if not _authorised(request):
+            return _json_error(401, "Unauthorized", "invalid access token")
+
+        return web.json_response({"data": [{"id": STANDIN_USER_ID, "login": STANDIN_USER}]})
+
+    async def subscribe(request: web.Request) -> web.Response:
+        await asyncio.sleep(delay)
+
+        if not _authorised(request):
+            return _json_error(401, "Unauthorized", "invalid access token")
+
+        body = await request.json()
+        transport = body["transport"]
+        key = (
+            body["type"],
+            body["condition"]["broadcaster_user_id"],
+            transport.get("session_id") or transport.get("callback", ""),
+        )
+
+        if key in subscriptions:
+            return _json_error(409, "Conflict", "subscription already exists")
+
+        subscriptions.add(key)
+        subscription = {
+            "id": str(uuid.uuid4()),
+            "status": (
+                "enabled"
+                if transport["method"] == "websocket"
+                else "webhook_callback_verification_pending"
+            ),
+            "type": body["type"],
+            "version": body["version"],
+            "condition": body["condition"],
+        }
+
+        return web.json_response({"data": [subscription], "total": 1}, status=202)
+
+    app.router.add_route("POST", "/oauth2/token", oauth_token)
+    app.router.add_route("GET", "/helix/users", users)
+    app.router.add_route("POST", "/helix/eventsub/subscriptions", subscribe)
+
+    return app
+
+
+class EventSubSessions:
+    """
+    An imitation of the EventSub WebSocket server.
+
+    Each connection is welcomed into a new session (or, when moving from an
+    old connection, the same session), and sent a keepalive every `keepalive`
+    seconds. Notifications, and requests to move to a new connection, are sent
+    to every open session when asked for.
+    """
+
+    keepalive: int
+    sockets: Dict[str, web.WebSocketResponse]
+
+    def __init__(self, keepalive: int = 10) -> None:
+        self.keepalive = keepalive
+        self.sockets = {}
+
+    async def connect(self, request: web.Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+
+        session_id = request.query.get("session") or str(uuid.uuid4())
+        old = self.sockets.get(session_id)
+        self.sockets[session_id] = socket
+
+        session = _session(session_id, "connected", self.keepalive)
+        await socket.send_json(_ws_message("session_welcome", {"session": session}))
+
+        # Twitch closes the old connection once the new one has been welcomed.
+        if old:
+            await old.close()
+
+        try:
+            await _serve_session(socket, self.keepalive)
+        finally:
+            if self.sockets.get(session_id) is socket:
+                del self.sockets[session_id]
+
+        return socket
+
+    async def notify(
+        self, subscription_type: str, event: Dict[str, Any], message_id: str | None = None
+    ) -> int:
+        """Sends an event to every session, returning how many it was sent to."""
+        sockets = list(self.sockets.items())
+
+        for session_id, socket in sockets:
+            transport = {"method": "websocket", "session_id": session_id}
+            subscription = {"type": subscription_type, "version": "1", "transport": transport}
+            message = _ws_message(
+                "notification",
+                {"subscription": subscription, "event": event},
+                subscription_type,
+            )
+
+            if message_id:
+                message["metadata"]["message_id"] = message_id
+
+            await socket.send_json(message)
+
+        return len(sockets)
+
+    async def reconnect(self, url: str) -> int:
+        """Asks every session to move to a new connection to `url`."""
+        sockets = list(self.sockets.items())
+
+        for session_id, socket in sockets:
+            reconnect_url = f"{url}?session={session_id}"
+            session = _session(session_id, "reconnecting", None, reconnect_url)
+
+            await socket.send_json(_ws_message("session_reconnect", {"session": session}))
+
+        return len(sockets)
+
+
+def create_eventsub_app(
+    app: web.Application | None = None, sessions: EventSubSessions | None = None
+) -> web.Application:
+    """Creates (or adds to `app`) the EventSub WebSocket server, and the hooks to drive it."""
+    app = app or web.Application()
+    sessions = sessions or EventSubSessions()
+
+    async def notify(request: web.Request) -> web.Response:
+        count = await sessions.notify(request.match_info["type"], await request.json())
+
+        return web.json_response({"sessions": count})
+
+    async def reconnect(request: web.Request) -> web.Response:
+        count = await sessions.reconnect(str(request.url.with_scheme("ws").with_path("/ws")))
+
+        return web.json_response({"sessions": count})
+
+    app.router.add_route("GET", "/ws", sessions.connect)
+    app.router.add_route("POST", "/standin/eventsub/{type}", notify)
+    app.router.add_route("POST", "/standin/eventsub-reconnect", reconnect)
+
+    return app
+
+
+async def _serve_session(socket: web.WebSocketResponse, keepalive: int) -> None:
+    """Sends keepalives until the connection is closed; nothing is expected from the bot."""
+    keepalives = asyncio.create_task(_send_keepalives(socket, keepalive))
+
+    try:
+        async for _ in socket:
+            pass
+    finally:
+        keepalives.cancel()
+
+
+async def _send_keepalives(socket: web.WebSocketResponse, interval: int) -> None:
+    while not socket.closed:
+        await asyncio.sleep(interval)
+        await socket.send_json(_ws_message("session_keepalive", {}))
+
+
+def _session(
+    session_id: str, status: str, keepalive: int | None, reconnect_url: str | None = None
+) -> Dict[str, Any]:
+    return {
+        "id": session_id,
+        "status": status,
+        "keepalive_timeout_seconds": keepalive,
+        "reconnect_url": reconnect_url,
+        "connected_at": _timestamp(),
+    }
+
+
+def _ws_message(
+    message_type: str, payload: Dict[str, Any], subscription_type: str | None = None
+) -> Dict[str, Any]:
+    metadata = {
+        "message_id": str(uuid.uuid4()),
+        "message_type": message_type,
+        "message_timestamp": _timestamp(),
+    }
+
+    if subscription_type:
+        metadata["subscription_type"] = subscription_type
+        metadata["subscription_version"] = "1"
+
+    return {"metadata": metadata, "payload": payload}
+
+
+def _timestamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _authorised(request: web.Request) -> bool:
+    return bool(request.headers.get("Client-ID")) and request.headers.get(
+        "Authorization", ""
+    ).startswith("Bearer standin-")
+
+
+def _json_error(status: int, error: str, message: str) -> web.Response:
+    body: Dict[str, Any] = {"error": error, "status": status, "message": message}
+
+    return web.json_response(body, status=status)
+
+
+def main() -> None:
+    directory = sys.argv[1] if len(sys.argv) > 1 else "http_cache"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+
+    pages = load_recordings(directory)
+    print(f"Replaying {len(pages)} recorded pages from {directory}")
+
+    app = create_eventsub_app(create_twitch_app(create_lrr_app(pages)))
+
+    web.run_app(app, host="127.0.0.1", port=port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict
+
+import asyncio
+import inspect
+import time
+
+from snerge import log, AsyncRunner
+
+
+class Startup:
+    """
+    The stages of starting the bot, and which other stages each one needs.
+
+    Each stage is started as soon as the stages it needs have finished, and is
+    called with their results (in the order they were listed), so anything
+    which does not depend on another stage runs alongside it. If any stage
+    fails, the loop is stopped.
+
+    A stage which starts something long-lived returns its task; the stage is
+    finished once the task is started, and the task (which is the stage's
+    result) has to be stopped by whoever shuts down.
+    """
+
+    logger: log.Logger
+    runner: AsyncRunner
+    started: float
+
+    _stages: Dict[str, asyncio.Task[Any]]
+
+    def __init__(self, logger: log.Logger, runner: AsyncRunner) -> None:
+        self.logger = logger
+        self.runner = runner
+        self.started = time.monotonic()
+        self._stages = {}
+
+    def stage(self, name: str, func: Callable[..., Any], *needs: str) -> asyncio.Task[Any]:
+        """
+        Adds a stage, which must be added after the stages it needs.
+
+        :param func: Called with the results of the needed stages; it may
+                     return a value, something to await for the value, or
+                     a task it has started, which is not waited for.
+        """
+        tasks = [self._stages[need] for need in needs]
+
+        async def run() -> Any:
+            results = [await task for task in tasks]
+            start = time.monotonic()
+
+            result = func(*results)
+
+            if inspect.isawaitable(result) and not isinstance(result, asyncio.Task):
+                result = await result
+
+            self.logger.info(
+                "Stage %s finished in %.2fs (%.2fs since startup)",
+                name,
+                time.monotonic() - start,
+                self.elapsed,
+            )
+
+            return result
+
+        task = self.runner.create_onetime_task(f"startup-{name}", run())
+        task.add_done_callback(self._finished)
+        self._stages[name] = task
+
+        return task
+
+    def result(self, name: str) -> Any:
+        """The result of a stage, or None if it has not finished (or failed)."""
+        task = self._stages.get(name)
+
+        if not task or not task.done() or task.cancelled() or task.exception():
+            return None
+
+        return task.result()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def _finished(self, task: asyncio.Task[Any]) -> None:
+        if not task.cancelled() and task.exception():
+            self.logger.error("Startup failed in %s", task.get_name())
+            self.runner.stop_loop()
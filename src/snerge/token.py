@@ -8,7 +8,7 @@ from __future__ import annotations
 import dataclasses
 import pickle
 
-import requests
+from snerge.twitch import TwitchClient
 
 
 @dataclasses.dataclass
@@ -46,20 +46,16 @@ class Token:
         with open(f"tokens/{self.user}.token", "wb") as handle:
             pickle.dump(self, handle)
 
-    def renew(self, app: App) -> bool:
-        token_request = requests.post(
-            "https://id.twitch.tv/oauth2/token",
+    async def renew(self, app: App, client: TwitchClient) -> bool:
+        token = await client.oauth_token(
             {
                 "client_id": app.client_id,
                 "client_secret": app.client_secret,
                 "grant_type": "refresh_token",
                 "refresh_token": self.refresh_token,
-            },
-            timeout=15,
+            }
         )
 
-        token = token_request.json()
-
         if "access_token" not in token:
             return False
 
@@ -81,21 +77,19 @@ class Token:
             return data
 
 
-def refresh_app_token() -> App:
+async def refresh_app_token(client: TwitchClient) -> App:
     app = App.load()
 
-    response = requests.post(
-        "https://id.twitch.tv/oauth2/token",
+    response = await client.oauth_token(
         {
             "client_id": app.client_id,
             "client_secret": app.client_secret,
             "grant_type": "client_credentials",
             "scope": "channel:read:redemptions",
-        },
-        timeout=15,
+        }
     )
 
-    app.app_token = response.json()["access_token"]
+    app.app_token = response["access_token"]
     app.store()
 
     return app
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from snerge.config import Config
+
+
+ID_HOST = "https://id.twitch.tv"
+API_HOST = "https://api.twitch.tv"
+
+# How long (in seconds) to wait for Twitch to answer a request.
+TIMEOUT = 15
+# How many connections to keep open to Twitch, and for how long (in seconds)
+# an idle one is kept for the next request.
+CONNECTIONS = 10
+KEEPALIVE = 60
+
+
+class TwitchClient:
+    """
+    Calls to the Twitch APIs, through a single session shared by the whole bot.
+
+    The session keeps its connections open between requests, so only the first
+    call to each host pays for the TLS handshake. It is created on first use,
+    so that it belongs to the loop that uses it.
+    """
+
+    id_host: str
+    api_host: str
+
+    _session: Optional[aiohttp.ClientSession] = None
+
+    def __init__(self, *, id_host: str = ID_HOST, api_host: str = API_HOST) -> None:
+        self.id_host = id_host
+        self.api_host = api_host
+
+    @classmethod
+    def from_config(cls, settings: Config) -> TwitchClient:
+        return cls(id_host=settings.twitch_id_host, api_host=settings.twitch_api_host)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if not self._session or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=CONNECTIONS, keepalive_timeout=KEEPALIVE
+                ),
+                timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+            )
+
+        return self._session
+
+    async def oauth_token(self, form: Dict[str, str]) -> Dict[str, Any]:
+        """Posts to the OAuth token endpoint, returning whatever Twitch replied with."""
+        async with self.session.post(f"{self.id_host}/oauth2/token", data=form) as response:
+            result = await response.json(content_type=None)
+
+        return result if isinstance(result, dict) else {"message": str(result)}
+
+    async def helix(  # pylint: disable=too-many-arguments
+        self,
+        method: str,
+        path: str,
+        client_id: str,
+        access_token: str,
+        body: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Calls a Helix API endpoint, returning whatever Twitch replied with."""
+        headers = {"Client-ID": client_id, "Authorization": "Bearer " + access_token}
+
+        async with self.session.request(
+            method, f"{self.api_host}/helix/{path}", json=body, headers=headers
+        ) as response:
+            result = await response.json(content_type=None)
+
+        return result if isinstance(result, dict) else {"message": str(result)}
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Awaitable, Callable, List
+
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from snerge import log
+from snerge.server import eventsocket
+from snerge.server.eventsocket import EventSubSocket
+from snerge.server.eventsub import TwitchEvent
+from snerge.standin import EventSubSessions, create_eventsub_app
+from snerge.twitch import TwitchClient
+
+
+class Handler:
+    """Stands in for the EventHandler, keeping what it is given."""
+
+    registrations: List[str | None]
+    events: List[TwitchEvent]
+    failures: int
+
+    def __init__(self, failures: int = 0) -> None:
+        self.registrations = []
+        self.events = []
+        self.failures = failures
+
+    async def register(self, _: str, session_id: str | None = None) -> None:
+        self.registrations.append(session_id)
+
+        if self.failures:
+            self.failures -= 1
+            raise FileNotFoundError("tokens/sergeyager.token")
+
+    async def submit(self, event: TwitchEvent) -> None:
+        self.events.append(event)
+
+
+async def run_socket(
+    handler: Handler, sessions: EventSubSessions, until: Callable[[str], Awaitable[None]]
+) -> None:
+    """Runs a socket connected to the stand-in server until `until(url)` finishes."""
+    async with TestServer(create_eventsub_app(sessions=sessions)) as server:
+        url = f"ws://{server.host}:{server.port}/ws"
+        client = TwitchClient()
+        socket = EventSubSocket(
+            log.get_logger("eventsub"),
+            handler,  # type: ignore
+            client,
+            "sergeyager",
+            url,
+        )
+        task = asyncio.create_task(socket.run())
+
+        try:
+            await asyncio.wait_for(until(url), 5)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await client.close()
+
+
+async def connected(sessions: EventSubSessions) -> None:
+    while not sessions.sockets:
+        await asyncio.sleep(0.01)
+
+
+def test_malformed_frames_are_skipped() -> None:
+    handler = Handler()
+    sessions = EventSubSessions()
+
+    async def scenario(_: str) -> None:
+        await connected(sessions)
+        socket = next(iter(sessions.sockets.values()))
+
+        await socket.send_str("not json")
+        await socket.send_json(["not", "a", "message"])
+        await socket.send_json({"metadata": {"message_type": "notification"}})
+        await sessions.notify("channel.follow", {"user_name": "someone"})
+
+        while not handler.events:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run_socket(handler, sessions, scenario))
+
+    assert [event.subscription_type for event in handler.events] == ["channel.follow"]
+    assert len(handler.registrations) == 1
+
+
+def test_failed_registration_reconnects(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(eventsocket, "RETRY_DELAY", 0.01)
+    handler = Handler(failures=2)
+    sessions = EventSubSessions()
+
+    async def scenario(_: str) -> None:
+        while len(handler.registrations) < 3:
+            await asyncio.sleep(0.01)
+
+        await sessions.notify("channel.follow", {"user_name": "someone"})
+
+        while not handler.events:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run_socket(handler, sessions, scenario))
+
+    # Each attempt is a new session.
+    assert len(set(handler.registrations)) == 3
+    assert len(handler.events) == 1
+
+
+def test_reconnect_keeps_the_session() -> None:
+    handler = Handler()
+    sessions = EventSubSessions()
+
+    async def scenario(url: str) -> None:
+        await connected(sessions)
+        old = next(iter(sessions.sockets.values()))
+
+        await sessions.reconnect(url)
+
+        while next(iter(sessions.sockets.values())) is old:
+            await asyncio.sleep(0.01)
+
+        await sessions.notify("channel.follow", {"user_name": "someone"})
+
+        while not handler.events:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run_socket(handler, sessions, scenario))
+
+    # The session, and so its subscriptions, carried over to the new connection.
+    assert len(handler.registrations) == 1
+    assert len(handler.events) == 1
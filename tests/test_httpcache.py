@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import AsyncIterator, List, Tuple
+
+import asyncio
+import contextlib
+import pathlib
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from snerge import log
+from snerge.httpcache import CacheMiss, HttpCache
+from snerge.standin import create_lrr_app, load_recordings
+
+
+PAGES = pathlib.Path(__file__).parent / "fixtures" / "lrr"
+SEARCH = "/quotes/search?q=serge&mode=name&page=1"
+
+
+class Recorder:  # pylint: disable=too-few-public-methods
+    """Keeps the status of every response the stand-in sends."""
+
+    statuses: List[int]
+
+    def __init__(self) -> None:
+        self.statuses = []
+
+    async def __call__(self, _: web.Request, response: web.StreamResponse) -> None:
+        self.statuses.append(response.status)
+
+
+@contextlib.asynccontextmanager
+async def standin(recordings: pathlib.Path) -> AsyncIterator[Tuple[str, Recorder]]:
+    """Serves the pages recorded in `recordings`, giving the search URL and a recorder."""
+    recorder = Recorder()
+    app = create_lrr_app(load_recordings(str(recordings)))
+    app.on_response_prepare.append(recorder)
+
+    async with TestServer(app) as server:
+        yield f"http://{server.host}:{server.port}{SEARCH}", recorder
+
+
+def make_cache(directory: pathlib.Path, **kwargs: float) -> HttpCache:
+    return HttpCache(
+        log.get_logger("httpcache"),
+        str(directory),
+        max_age=kwargs.get("max_age", 3600),
+        stale_while_revalidate=kwargs.get("stale_while_revalidate", 0),
+        offline=bool(kwargs.get("offline", False)),
+    )
+
+
+def record(directory: pathlib.Path, url: str) -> None:
+    """Records the first fixture page in a cache directory, as if it was fetched from `url`."""
+    make_cache(directory).store(
+        {
+            "url": url,
+            "etag": None,
+            "last_modified": None,
+            "fetched": time.time(),
+            "body": (PAGES / "search-page-1.html").read_text(encoding="utf-8"),
+        }
+    )
+
+
+def age(cache: HttpCache, url: str, seconds: float) -> None:
+    """Makes the cached copy of a page older."""
+    entry = cache.load(url)
+    assert entry
+
+    entry["fetched"] -= seconds
+    cache.store(entry)
+
+
+async def fetch_twice(
+    tmp_path: pathlib.Path, **kwargs: float
+) -> Tuple[HttpCache, str, Recorder]:
+    """Fetches the search page, ages it by a minute, and fetches it again."""
+    record(tmp_path / "recordings", "https://lrrbot.com" + SEARCH)
+    cache = make_cache(tmp_path / "cache", **kwargs)
+
+    async with standin(tmp_path / "recordings") as (url, recorder):
+        async with aiohttp.ClientSession() as session:
+            first = await cache.get(session, url)
+            age(cache, url, 60)
+            second = await cache.get(session, url)
+
+        await cache.wait()
+
+    assert first == second
+    assert "The kettle is a liar" in first
+
+    return cache, url, recorder
+
+
+def test_fresh_page_is_not_fetched_again(tmp_path: pathlib.Path) -> None:
+    _, _, recorder = asyncio.run(fetch_twice(tmp_path, max_age=3600))
+
+    assert recorder.statuses == [200]
+
+
+def test_stale_page_is_served_and_revalidated(tmp_path: pathlib.Path) -> None:
+    cache, url, recorder = asyncio.run(
+        fetch_twice(tmp_path, max_age=30, stale_while_revalidate=3600)
+    )
+    entry = cache.load(url)
+
+    assert recorder.statuses == [200, 304]
+    assert entry and time.time() - entry["fetched"] < 30
+
+
+def test_expired_page_is_revalidated_first(tmp_path: pathlib.Path) -> None:
+    cache, url, recorder = asyncio.run(
+        fetch_twice(tmp_path, max_age=30, stale_while_revalidate=0)
+    )
+    entry = cache.load(url)
+
+    assert recorder.statuses == [200, 304]
+    assert entry and entry["etag"]
+    assert time.time() - entry["fetched"] < 30
+
+
+def test_changed_page_replaces_the_stored_copy(tmp_path: pathlib.Path) -> None:
+    record(tmp_path / "recordings", "https://lrrbot.com" + SEARCH)
+    cache = make_cache(tmp_path / "cache", max_age=30)
+
+    async def fetch() -> Tuple[str, Recorder]:
+        async with standin(tmp_path / "recordings") as (url, recorder):
+            cache.store(
+                {
+                    "url": url,
+                    "etag": '"outdated"',
+                    "last_modified": None,
+                    "fetched": 0,
+                    "body": "",
+                }
+            )
+
+            async with aiohttp.ClientSession() as session:
+                return await cache.get(session, url), recorder
+
+    body, recorder = asyncio.run(fetch())
+
+    assert "The kettle is a liar" in body
+    assert recorder.statuses == [200]
+
+
+def test_offline_cache_only_serves_stored_pages(tmp_path: pathlib.Path) -> None:
+    record(tmp_path, "https://lrrbot.com" + SEARCH)
+    cache = make_cache(tmp_path, max_age=0, offline=True)
+
+    async def fetch(url: str) -> str:
+        async with aiohttp.ClientSession() as session:
+            return await cache.get(session, url)
+
+    assert "The kettle is a liar" in asyncio.run(fetch("https://lrrbot.com" + SEARCH))
+
+    with pytest.raises(CacheMiss):
+        asyncio.run(fetch("https://lrrbot.com/quotes/search?q=serge&mode=name&page=2"))
@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import List, Set, Tuple
+
+import asyncio
+import pathlib
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from prosegen import ProseGen
+from snerge import log
+from snerge.lrr import LrrScraper
+from snerge.quotes import load_data
+from snerge.snapshot import ModelSnapshots
+from snerge.standin import EMPTY_PAGE
+
+
+PAGES = pathlib.Path(__file__).parent / "fixtures" / "lrr"
+
+
+def search_app(missing: Set[int]) -> web.Application:
+    """Serves the recorded search pages, with the `missing` ones not found."""
+
+    async def search(request: web.Request) -> web.StreamResponse:
+        page = int(request.query.get("page", "1"))
+
+        if page in missing:
+            raise web.HTTPNotFound()
+
+        path = PAGES / f"search-page-{page}.html"
+
+        if not path.exists():
+            return EMPTY_PAGE.respond(request)
+
+        return web.Response(text=path.read_text(encoding="utf-8"), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_route("GET", "/quotes/search", search)
+
+    return app
+
+
+def scrape(missing: Set[int]) -> Tuple[List[str], bool]:
+    """Scrapes the recorded pages, giving the IDs found and whether the scrape was complete."""
+
+    async def run() -> Tuple[List[str], bool]:
+        async with TestServer(search_app(missing)) as server:
+            scraper = LrrScraper(
+                log.get_logger("lrr"), host=f"http://{server.host}:{server.port}"
+            )
+            found = [quote_id async for quote_id, _ in scraper.quotes()]
+
+            return sorted(found), scraper.complete
+
+    return asyncio.run(run())
+
+
+def test_every_page_is_scraped() -> None:
+    found, complete = scrape(set())
+
+    assert found == [
+        "LRR #4961",
+        "LRR #4970",
+        "LRR #4975",
+        "LRR #4981",
+        "LRR #4990",
+        "LRR #5003",
+        "LRR #5012",
+    ]
+    assert complete
+
+
+def test_missing_page_marks_the_scrape_incomplete() -> None:
+    found, complete = scrape({2})
+
+    assert found == ["LRR #4981", "LRR #4990", "LRR #5003", "LRR #5012"]
+    assert not complete
+
+
+def test_incomplete_build_is_not_snapshotted(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "moderate.txt").write_text("", encoding="utf-8")
+    (tmp_path / "sergisms.csv").write_text("id,quote\n", encoding="utf-8")
+    (tmp_path / "quotes.csv").write_text("id,date,author,quote\n", encoding="utf-8")
+
+    logger = log.get_logger("quotes")
+    snapshots = ModelSnapshots(logger, str(tmp_path / "model_cache"))
+
+    async def build(missing: Set[int]) -> None:
+        async with TestServer(search_app(missing)) as server:
+            scraper = LrrScraper(logger, host=f"http://{server.host}:{server.port}")
+            await load_data(logger, ProseGen(20), scraper=scraper, snapshots=snapshots)
+
+    asyncio.run(build({2}))
+    assert not list(tmp_path.glob("model_cache/*"))
+
+    asyncio.run(build(set()))
+    assert list(tmp_path.glob("model_cache/*"))
@@ -0,0 +1,54 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+import pathlib
+
+import pytest
+
+from snerge.lrrparse import PARSERS, parse_soup
+
+
+PAGES = pathlib.Path(__file__).parent / "fixtures" / "lrr"
+
+
+def read_page(number: int) -> str:
+    return (PAGES / f"search-page-{number}.html").read_text(encoding="utf-8")
+
+
+def test_soup_reads_the_quotes() -> None:
+    page = parse_soup(read_page(1))
+
+    assert page.quotes == [
+        ("#5012", "The kettle is a liar & I will not be taking questions."),
+        ("#5003", "Nobody tell the snack drawer."),
+        ("#4990", "It's fine, it's \"structural\"."),
+        ("#4981", "Line one,line two."),
+    ]
+    assert page.links == {2, 3}
+    assert page.items == 6
+
+
+def test_soup_reads_items_without_end_tags() -> None:
+    page = parse_soup(read_page(2))
+
+    assert [quote_id for quote_id, _ in page.quotes] == ["#4975", "#4970", "#4961"]
+    assert page.items == 4
+
+
+def test_soup_reads_an_empty_page() -> None:
+    page = parse_soup(read_page(3))
+
+    assert not page.quotes
+    assert page.links == {1, 2}
+    assert page.items == 0
+
+
+@pytest.mark.parametrize("number", [1, 2, 3])
+@pytest.mark.parametrize("name", sorted(PARSERS))
+def test_parsers_agree(name: str, number: int) -> None:
+    html = read_page(number)
+
+    assert PARSERS[name](html) == parse_soup(html)
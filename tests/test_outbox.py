@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import List
+
+import asyncio
+
+from snerge import log
+from snerge.outbox import Outbox, Priority
+
+
+class Channel:  # pylint: disable=too-few-public-methods
+    """Stands in for a twitchio Channel, keeping what is sent to it."""
+
+    name = "loadingreadyrun"
+    sent: List[str]
+    delay: float
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.sent = []
+        self.delay = delay
+
+    async def send(self, text: str) -> None:
+        await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+
+def make_outbox(channel: Channel) -> Outbox:
+    return Outbox(log.get_logger("outbox"), channel, (20, 30), 5)
+
+
+def test_drain_waits_for_everything_queued() -> None:
+    channel = Channel(delay=0.01)
+
+    async def run() -> bool:
+        outbox = make_outbox(channel)
+        outbox.start()
+
+        outbox.send("A fact", Priority.FACT)
+        outbox.mention("@someone", "Positive whole numbers only please", Priority.GUESS)
+        outbox.mention("@someone_else", "Positive whole numbers only please", Priority.GUESS)
+        outbox.send("sergeSnerge Sleepy time!")
+
+        drained = await outbox.drain(5)
+        await outbox.stop()
+
+        return drained
+
+    assert asyncio.run(run())
+    assert channel.sent == [
+        "sergeSnerge Sleepy time!",
+        "@someone @someone_else Positive whole numbers only please",
+        "A fact",
+    ]
+
+
+def test_drain_gives_up_after_the_timeout() -> None:
+    channel = Channel(delay=10)
+
+    async def run() -> bool:
+        outbox = make_outbox(channel)
+        outbox.start()
+        outbox.send("sergeSnerge Sleepy time!")
+
+        drained = await outbox.drain(0.05)
+        await outbox.stop()
+
+        return drained
+
+    assert not asyncio.run(run())
+    assert not channel.sent
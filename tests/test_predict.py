@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+import asyncio
+import json
+import pathlib
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from prosegen import ProseGen
+from snerge import log
+from snerge.blocklist import Blocklist
+from snerge.model import ModelRef
+from snerge.server import PredictHandler
+
+
+def stream(tmp_path: pathlib.Path, blocked: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Streams a prediction from a model which only knows one quote, giving the events."""
+    (tmp_path / "blocklist.txt").write_text(blocked + "\n", encoding="utf-8")
+
+    model = ProseGen(20)
+    model.add_knowledge("I don't like coffee.", source="#1")
+    quotes = ModelRef(ProseGen(20))
+    quotes.publish(model)
+
+    handler = PredictHandler(
+        quotes, Blocklist(log.get_logger("blocklist"), str(tmp_path / "blocklist.txt"))
+    )
+    app = web.Application()
+    app.router.add_route("GET", "/predict/stream", handler.stream_prediction)
+
+    async def run() -> str:
+        async with TestServer(app) as server:
+            async with aiohttp.ClientSession() as session:
+                url = f"http://{server.host}:{server.port}/predict/stream"
+
+                async with session.get(url, params={"prompt": "I"}) as response:
+                    return await response.text()
+
+    events = []
+
+    for block in asyncio.run(run()).strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append(
+            (event.removeprefix("event: "), json.loads(data.removeprefix("data: ")))
+        )
+
+    return events
+
+
+def test_tokens_are_streamed(tmp_path: pathlib.Path) -> None:
+    events = stream(tmp_path, "tea")
+    text = "".join(data["text"] for event, data in events if event == "token")
+
+    event, done = events[-1]
+
+    assert event == "done"
+    assert not done["blocked"]
+    assert done["text"] == text.strip() == "I don't like coffee."
+
+
+def test_blocked_text_is_never_sent(tmp_path: pathlib.Path) -> None:
+    events = stream(tmp_path, "coffee")
+
+    assert [event for event, _ in events] == ["input", "done"]
+    assert events[-1][1]["blocked"]
+    assert "coffee" not in json.dumps(events).lower()
@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+import asyncio
+import contextlib
+import csv
+import io
+import os
+import pathlib
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from snerge import quotes
+from snerge.quotes import UNO_FIELDS, QuoteListChanges, download_new_quote_list
+from snerge.server.cached import CachedBody
+
+
+def uno_list(*rows: Tuple[str, str]) -> bytes:
+    """Writes a quote list the way the upstream one is, with every field quoted twice."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(UNO_FIELDS)
+
+    for number, (author, quote) in enumerate(rows, 1):
+        fields = [str(number), "2021-01-01", author, f'"{quote}"']
+        writer.writerow([quoted(field) for field in fields])
+
+    return output.getvalue().encode("utf-8")
+
+
+def quoted(field: str) -> str:
+    output = io.StringIO()
+    csv.writer(output, quoting=csv.QUOTE_ALL).writerow([field])
+
+    return output.getvalue().strip()
+
+
+UNO_LIST = uno_list(
+    ("Serge", "Tea is a soup."),
+    ("Paul", "It is not."),
+    ("Serge", "Then what is it, Paul?"),
+)
+
+
+class UnoList:  # pylint: disable=too-few-public-methods
+    """Serves a quote list, keeping the status of each response."""
+
+    body: CachedBody
+    statuses: List[int]
+
+    def __init__(self, body: bytes) -> None:
+        self.body = CachedBody.build("text/csv", body)
+        self.statuses = []
+
+    async def serve(self, request: web.Request) -> web.StreamResponse:
+        response = self.body.respond(request)
+        self.statuses.append(response.status)
+
+        return response
+
+    async def cut_off(self, request: web.Request) -> web.StreamResponse:
+        """Sends half of the list, then drops the connection."""
+        response = web.StreamResponse(headers={"Content-Length": str(len(self.body.body))})
+        await response.prepare(request)
+        await response.write(self.body.body[: len(self.body.body) // 2])
+        self.statuses.append(response.status)
+
+        assert request.transport
+        request.transport.close()
+
+        return response
+
+
+@contextlib.asynccontextmanager
+async def serve_list(
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> AsyncIterator[aiohttp.ClientSession]:
+    """Serves the Uno quote list with `handler`, giving a session to download it with."""
+    app = web.Application()
+    app.router.add_route("GET", "/quotes.csv", handler)
+
+    async with TestServer(app) as server:
+        monkeypatch.setattr(
+            quotes, "UNO_QUOTES", f"http://{server.host}:{server.port}/quotes.csv"
+        )
+
+        async with aiohttp.ClientSession() as session:
+            yield session
+
+
+def test_unchanged_list_is_not_downloaded_again(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    uno = UnoList(UNO_LIST)
+    validators: Dict[str, str] = {}
+
+    async def download_twice() -> List[QuoteListChanges]:
+        async with serve_list(uno.serve, monkeypatch) as session:
+            return [
+                await download_new_quote_list(
+                    session, str(tmp_path / "quotes.csv"), validators
+                )
+                for _ in range(2)
+            ]
+
+    first, second = asyncio.run(download_twice())
+
+    assert first.added == ["Uno #1", "Uno #3"]
+    assert not second
+    assert uno.statuses == [200, 304]
+    assert "Then what is it" in (tmp_path / "quotes.csv").read_text(encoding="utf-8")
+
+
+def test_interrupted_download_leaves_the_list_alone(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "quotes.csv"
+    path.write_text("id,date,author,quote\n", encoding="utf-8")
+    uno = UnoList(UNO_LIST)
+
+    async def download() -> None:
+        async with serve_list(uno.cut_off, monkeypatch) as session:
+            await download_new_quote_list(session, str(path))
+
+    with pytest.raises(aiohttp.ClientPayloadError):
+        asyncio.run(download())
+
+    assert uno.statuses == [200]
+    assert path.read_text(encoding="utf-8") == "id,date,author,quote\n"
+    assert not os.path.exists(str(path) + ".tmp")
@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+import asyncio
+import csv
+import pathlib
+
+import pytest
+from test_quotes import UnoList, serve_list, uno_list
+
+from prosegen import ProseGen
+from snerge import log
+from snerge.lrr import LrrScraper
+from snerge.model import ModelRef
+from snerge.quotes import UNO_FIELDS
+from snerge.refresh import CorpusRefresher
+
+
+class Refresher(CorpusRefresher):
+    """Counts rebuilds, rather than building anything."""
+
+    rebuilds: int = 0
+
+    async def rebuild(self) -> str:
+        self.rebuilds += 1
+
+        return self.model.version
+
+
+def refresh_with(
+    upstream: bytes, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> Refresher:
+    """Refreshes the quotes once, with `upstream` as the Uno list."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "moderate.txt").write_text("", encoding="utf-8")
+    (tmp_path / "sergisms.csv").write_text("id,quote\n", encoding="utf-8")
+
+    with open(tmp_path / "quotes.csv", "w", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(UNO_FIELDS)
+        writer.writerow(["1", "2021-01-01", "Serge", '"Tea is a soup."'])
+
+    logger = log.get_logger("refresh")
+    # Nothing listens here, so the LRR search finds nothing new.
+    scraper = LrrScraper(logger, host="http://127.0.0.1:9", retries=0)
+    uno = UnoList(upstream)
+
+    async def refresh() -> Refresher:
+        refresher = Refresher(logger, ModelRef(ProseGen(20)), scraper)
+
+        async with serve_list(uno.serve, monkeypatch):
+            try:
+                await refresher.refresh()
+            finally:
+                await refresher.close()
+
+        return refresher
+
+    return asyncio.run(refresh())
+
+
+def test_new_quote_is_taught_without_a_rebuild(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    upstream = uno_list(("Serge", "Tea is a soup."), ("Serge", "Coffee is a bean soup."))
+    refresher = refresh_with(upstream, tmp_path, monkeypatch)
+
+    assert refresher.rebuilds == 0
+    assert refresher.marks["Uno"] == 2
+
+
+def test_tracked_quote_list_is_not_rewritten(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    upstream = uno_list(("Serge", "Tea is a soup."), ("Serge", "Coffee is a bean soup."))
+    refresher = refresh_with(upstream, tmp_path, monkeypatch)
+    download = tmp_path / "model_cache" / "quotes.csv"
+
+    assert "Coffee" not in (tmp_path / "quotes.csv").read_text(encoding="utf-8")
+    assert "Coffee" in download.read_text(encoding="utf-8")
+    assert refresher.sources["Uno"] == str(pathlib.Path("model_cache", "quotes.csv"))
+
+
+def test_edited_quote_rebuilds_the_model(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    refresher = refresh_with(uno_list(("Serge", "Tea is a broth.")), tmp_path, monkeypatch)
+
+    assert refresher.rebuilds == 1
+
+
+def test_removed_quote_rebuilds_the_model(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    refresher = refresh_with(uno_list(), tmp_path, monkeypatch)
+
+    assert refresher.rebuilds == 1
@@ -0,0 +1,58 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+import asyncio
+import os
+import pathlib
+import pickle
+
+from prosegen import ProseGen
+from snerge import log
+from snerge.snapshot import ModelSnapshots
+
+
+def build_model() -> ProseGen:
+    model = ProseGen(20)
+    model.add_knowledge("I don't like coffee.", source="#1")
+
+    return model
+
+
+def test_saved_model_loads_again(tmp_path: pathlib.Path) -> None:
+    snapshots = ModelSnapshots(log.get_logger("snapshot"), str(tmp_path))
+
+    asyncio.run(snapshots.save("key", build_model()))
+    loaded = asyncio.run(snapshots.load("key"))
+
+    assert isinstance(loaded, ProseGen)
+    assert not os.path.exists(snapshots.path("key") + ".tmp")
+
+
+def test_missing_snapshot_loads_nothing(tmp_path: pathlib.Path) -> None:
+    snapshots = ModelSnapshots(log.get_logger("snapshot"), str(tmp_path))
+
+    assert asyncio.run(snapshots.load("key")) is None
+
+
+def test_truncated_snapshot_is_discarded(tmp_path: pathlib.Path) -> None:
+    snapshots = ModelSnapshots(log.get_logger("snapshot"), str(tmp_path))
+    asyncio.run(snapshots.save("key", build_model()))
+
+    with open(snapshots.path("key"), "r+b") as handle:
+        handle.truncate(os.path.getsize(snapshots.path("key")) // 2)
+
+    assert asyncio.run(snapshots.load("key")) is None
+    assert not os.path.exists(snapshots.path("key"))
+
+
+def test_snapshot_of_something_else_is_discarded(tmp_path: pathlib.Path) -> None:
+    snapshots = ModelSnapshots(log.get_logger("snapshot"), str(tmp_path))
+
+    with open(snapshots.path("key"), "wb") as handle:
+        pickle.dump(["not", "a", "model"], handle)
+
+    assert asyncio.run(snapshots.load("key")) is None
+    assert not os.path.exists(snapshots.path("key"))
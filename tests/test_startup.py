@@ -0,0 +1,81 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, List
+
+import asyncio
+
+from snerge import log, AsyncRunner
+from snerge.startup import Startup
+
+
+async def forever() -> None:
+    while True:
+        await asyncio.sleep(1)
+
+
+def run_briefly(runner: AsyncRunner) -> None:
+    runner.loop.call_later(0.1, runner.stop_loop)
+    runner.run_forever()
+
+
+def test_stages_run_with_the_results_of_what_they_need() -> None:
+    runner = AsyncRunner(log.get_logger("runner"))
+    startup = Startup(log.get_logger("startup"), runner)
+    seen: List[Any] = []
+
+    async def slow() -> int:
+        await asyncio.sleep(0.01)
+        return 2
+
+    startup.stage("one", lambda: 1)
+    startup.stage("two", slow)
+    startup.stage("sum", lambda one, two: seen.append(one + two), "one", "two")
+
+    run_briefly(runner)
+
+    assert seen == [3]
+    assert startup.result("one") == 1
+    assert startup.result("two") == 2
+
+
+def test_shutdown_stops_a_task_returned_by_a_stage() -> None:
+    runner = AsyncRunner(log.get_logger("runner"))
+    startup = Startup(log.get_logger("startup"), runner)
+    seen: List[Any] = []
+
+    startup.stage("loop", lambda: runner.create_onetime_task("loop", forever()))
+    startup.stage("after", seen.append, "loop")
+
+    run_briefly(runner)
+
+    # The stage finished as soon as it started the task, and gave the task as its result.
+    task = startup.result("loop")
+    assert isinstance(task, asyncio.Task)
+    assert not task.done()
+    assert seen == [task]
+
+    task.cancel()
+    runner.gather(asyncio.gather(task, return_exceptions=True))
+
+    assert task.cancelled()
+
+
+def test_a_failed_stage_stops_the_loop() -> None:
+    runner = AsyncRunner(log.get_logger("runner"))
+    startup = Startup(log.get_logger("startup"), runner)
+
+    def fail() -> None:
+        raise RuntimeError("stage failed")
+
+    startup.stage("fail", fail)
+    startup.stage("after", lambda _: None, "fail")
+
+    # If the failure did not stop the loop, this would never return.
+    runner.run_forever()
+
+    assert startup.result("fail") is None
+    assert startup.result("after") is None
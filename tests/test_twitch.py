@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: 2021 Benedict Harcourt <ben.harcourt@harcourtprogramming.co.uk>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+from __future__ import annotations
+
+from typing import Any, List
+
+import asyncio
+import pathlib
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from snerge.standin import STANDIN_USER, STANDIN_USER_ID, create_twitch_app
+from snerge.token import App, Token, refresh_app_token
+from snerge.twitch import TwitchClient
+
+
+class Connections:  # pylint: disable=too-few-public-methods
+    """Keeps which client connection each request to the stand-in arrived on."""
+
+    peers: List[Any]
+
+    def __init__(self) -> None:
+        self.peers = []
+
+    async def __call__(self, request: web.Request, _: web.StreamResponse) -> None:
+        assert request.transport
+        self.peers.append(request.transport.get_extra_info("peername"))
+
+
+async def call_everything(client: TwitchClient) -> None:
+    """Makes each call the bot makes to Twitch, checking the stand-in's answers."""
+    app = await refresh_app_token(client)
+    assert app.app_token.startswith("standin-access-")
+
+    users = await client.helix("GET", "users", app.client_id, app.app_token)
+    assert users["data"] == [{"id": STANDIN_USER_ID, "login": STANDIN_USER}]
+
+    token = Token(int(STANDIN_USER_ID), STANDIN_USER, "expired", "standin-refresh-0")
+    assert await token.renew(app, client)
+
+    subscription = await client.helix(
+        "POST",
+        "eventsub/subscriptions",
+        app.client_id,
+        token.access_token,
+        {
+            "type": "channel.channel_points_custom_reward_redemption.add",
+            "version": "1",
+            "condition": {"broadcaster_user_id": STANDIN_USER_ID},
+            "transport": {"method": "websocket", "session_id": "session"},
+        },
+    )
+    assert subscription["data"][0]["status"] == "enabled"
+
+
+def test_calls_share_one_session(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "tokens").mkdir()
+    App("client", "secret", "irc", "", "https://localhost/", b"secret").store()
+
+    connections = Connections()
+    app = create_twitch_app()
+    app.on_response_prepare.append(connections)
+
+    async def run() -> None:
+        async with TestServer(app) as server:
+            host = f"http://{server.host}:{server.port}"
+            client = TwitchClient(id_host=host, api_host=host)
+            session = client.session
+            connector = session.connector
+
+            try:
+                await call_everything(client)
+
+                assert client.session is session
+                assert session.connector is connector
+            finally:
+                await client.close()
+
+    asyncio.run(run())
+
+    # Every request went over the same kept-alive connection.
+    assert len(connections.peers) == 4
+    assert len(set(connections.peers)) == 1
+
+
+def test_closed_session_is_replaced() -> None:
+    async def run() -> None:
+        client = TwitchClient()
+        session = client.session
+        await client.close()
+
+        assert session.closed
+        assert client.session is not session
+        await client.close()
+
+    asyncio.run(run())